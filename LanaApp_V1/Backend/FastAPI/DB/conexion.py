@@ -1,20 +1,120 @@
 import os
-from sqlalchemy import create_engine
-from sqlalchemy.orm.session import sessionmaker 
+import logging
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm.session import sessionmaker
 from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from sqlalchemy.pool import QueuePool, AsyncAdaptedQueuePool
+from config import settings
+from DB.instrumentacion import instrumentar_motor
+
+logger = logging.getLogger("lana.db")
 
 dbName = "bd_LanaApp.sqlite"
 base_dir = os.path.dirname(os.path.realpath(__file__))
-dbURL = f"sqlite:///{os.path.join(base_dir, dbName)}"
+dbPath = settings.DB_PATH or os.path.join(base_dir, dbName)
+dbURL = f"sqlite:///{dbPath}"
+asyncDbURL = f"sqlite+aiosqlite:///{dbPath}"
+# Lecturas: URI en modo solo lectura, opcionalmente sobre un archivo réplica
+dbLecturaPath = settings.DB_LECTURA_PATH or dbPath
+asyncDbLecturaURL = f"sqlite+aiosqlite:///file:{dbLecturaPath}?mode=ro&uri=true"
+
+PRODUCCION = settings.DB_PERFIL == "produccion"
+
+# PRAGMAs que se aplican a cada conexión nueva en producción.
+# WAL permite lectores concurrentes mientras hay un escritor activo.
+PRAGMAS_PRODUCCION = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "busy_timeout": settings.DB_BUSY_TIMEOUT_MS,
+    "cache_size": -settings.DB_CACHE_SIZE_KB,  # negativo = KiB en lugar de páginas
+    "mmap_size": settings.DB_MMAP_SIZE,
+    "temp_store": "MEMORY",
+    "foreign_keys": "ON",
+}
+
+# Las conexiones de lectura no pueden cambiar el journal_mode y nunca escriben
+PRAGMAS_LECTURA = {
+    pragma: valor for pragma, valor in PRAGMAS_PRODUCCION.items()
+    if pragma != "journal_mode"
+}
+
+
+def _opciones_motor(poolclass):
+    # Sin echo: el SQL se observa con DB.instrumentacion (Server-Timing y log de lentas)
+    if not PRODUCCION:
+        return {}
+    return {
+        "poolclass": poolclass,
+        "pool_size": settings.DB_POOL_SIZE,
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "pool_timeout": settings.DB_POOL_TIMEOUT,
+        "pool_recycle": settings.DB_POOL_RECYCLE,
+        "pool_pre_ping": True,
+    }
+
+
+def _aplicar_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    for pragma, valor in PRAGMAS_PRODUCCION.items():
+        cursor.execute(f"PRAGMA {pragma}={valor}")
+    cursor.close()
+
+
+def _aplicar_pragmas_lectura(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    if PRODUCCION:
+        for pragma, valor in PRAGMAS_LECTURA.items():
+            cursor.execute(f"PRAGMA {pragma}={valor}")
+    cursor.execute("PRAGMA query_only=ON")
+    cursor.close()
 
-engine = create_engine(dbURL, echo=True)
+
+# Motor síncrono: solo para create_all y scripts de mantenimiento
+engine = create_engine(dbURL, **_opciones_motor(QueuePool))
 Session = sessionmaker (bind=engine)
 Base = declarative_base()
 
+# Motor asíncrono: el que usan los endpoints para no bloquear el event loop
+async_engine = create_async_engine(asyncDbURL, **_opciones_motor(AsyncAdaptedQueuePool))
+AsyncSessionLocal = async_sessionmaker(async_engine, expire_on_commit=False)
+
+# Motor de solo lectura: muchos lectores concurrentes junto al único escritor
+read_async_engine = create_async_engine(asyncDbLecturaURL, **_opciones_motor(AsyncAdaptedQueuePool))
+AsyncSessionLectura = async_sessionmaker(read_async_engine, expire_on_commit=False)
+event.listen(read_async_engine.sync_engine, "connect", _aplicar_pragmas_lectura)
+
+if PRODUCCION:
+    event.listen(engine, "connect", _aplicar_pragmas)
+    event.listen(async_engine.sync_engine, "connect", _aplicar_pragmas)
+
+for _motor in (engine, async_engine.sync_engine, read_async_engine.sync_engine):
+    instrumentar_motor(_motor)
+
 
-def get_db():
-    db = Session()
-    try:
+async def get_db():
+    async with AsyncSessionLocal() as db:
         yield db
-    finally:
-        db.close()
\ No newline at end of file
+
+
+async def get_read_db():
+    async with AsyncSessionLectura() as db:
+        yield db
+
+
+async def reporte_pragmas() -> dict:
+    """
+    Lee los PRAGMAs efectivos de una conexión del pool y los registra en el log.
+    """
+    efectivos = {}
+    async with async_engine.connect() as conn:
+        for pragma in PRAGMAS_PRODUCCION:
+            resultado = await conn.exec_driver_sql(f"PRAGMA {pragma}")
+            efectivos[pragma] = resultado.scalar()
+    logger.info(
+        "Base de datos (perfil %s, pool %s): %s",
+        settings.DB_PERFIL,
+        async_engine.pool.status(),
+        ", ".join(f"{k}={v}" for k, v in efectivos.items())
+    )
+    return efectivos
@@ -0,0 +1,201 @@
+import json
+import logging
+import time
+from collections import Counter
+from contextvars import ContextVar
+from typing import Optional
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from config import settings
+
+logger_lentas = logging.getLogger("lana.sql.lentas")
+logger_n1 = logging.getLogger("lana.sql.n1")
+
+# Detector de N+1: "off", "warn" (desarrollo) o "raise" (pruebas)
+DETECTOR_N1 = settings.SQL_DETECTOR_N1
+DETECTOR_ACTIVO = DETECTOR_N1 in ("warn", "raise")
+
+
+class MetricasPeticion:
+    """
+    Acumulado de consultas SQL de una petición HTTP.
+    """
+    __slots__ = ("ruta", "consultas", "tiempo_db", "formas", "cargas_perezosas", "presupuesto")
+
+    def __init__(self, ruta: str):
+        self.ruta = ruta
+        self.consultas = 0
+        self.tiempo_db = 0.0
+        # Solo se llenan con el detector de N+1 activo
+        self.formas = Counter()
+        self.cargas_perezosas = Counter()
+        self.presupuesto = settings.SQL_PRESUPUESTO_CONSULTAS
+
+    def reporte_n1(self) -> Optional[dict]:
+        """
+        Devuelve el reporte si la petición excedió su presupuesto de consultas
+        o repitió la misma sentencia más de SQL_MAX_REPETICIONES veces.
+        """
+        repetidas = [
+            {"sql": sql[:200], "veces": veces}
+            for sql, veces in self.formas.most_common(3)
+            if veces > settings.SQL_MAX_REPETICIONES
+        ]
+        if self.consultas <= self.presupuesto and not repetidas:
+            return None
+        return {
+            "ruta": self.ruta,
+            "consultas": self.consultas,
+            "presupuesto": self.presupuesto,
+            "repetidas": repetidas,
+            "relaciones_perezosas": dict(self.cargas_perezosas.most_common()),
+        }
+
+
+_metricas: ContextVar[Optional[MetricasPeticion]] = ContextVar("metricas_sql", default=None)
+
+
+def metricas_actuales() -> Optional[MetricasPeticion]:
+    return _metricas.get()
+
+
+def _redactar(parametros):
+    # Nunca se registran valores (emails, hashes, montos): solo su tipo
+    if parametros is None:
+        return None
+    if isinstance(parametros, dict):
+        return {k: type(v).__name__ for k, v in parametros.items()}
+    if isinstance(parametros, (list, tuple)):
+        if parametros and isinstance(parametros[0], (list, tuple, dict)):
+            return f"executemany({len(parametros)})"
+        return [type(v).__name__ for v in parametros]
+    return type(parametros).__name__
+
+
+def _antes_de_ejecutar(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("inicio_consulta", []).append(time.perf_counter())
+
+
+def _despues_de_ejecutar(conn, cursor, statement, parameters, context, executemany):
+    duracion = time.perf_counter() - conn.info["inicio_consulta"].pop()
+
+    metricas = _metricas.get()
+    if metricas is not None:
+        metricas.consultas += 1
+        metricas.tiempo_db += duracion
+        if DETECTOR_ACTIVO:
+            # La sentencia lleva parámetros enlazados: el texto es la "forma" de la consulta
+            metricas.formas[statement] += 1
+
+    duracion_ms = duracion * 1000
+    if duracion_ms >= settings.SQL_UMBRAL_LENTA_MS:
+        logger_lentas.warning(json.dumps({
+            "evento": "consulta_lenta",
+            "duracion_ms": round(duracion_ms, 2),
+            "ruta": metricas.ruta if metricas else None,
+            "sql": " ".join(statement.split()),
+            "parametros": _redactar(parameters),
+        }, ensure_ascii=False))
+
+
+def _registrar_carga_relacion(estado_orm):
+    # Cargas perezosas (lazy) disparadas al acceder a un atributo de relación
+    if not estado_orm.is_relationship_load or estado_orm.lazy_loaded_from is None:
+        return
+    metricas = _metricas.get()
+    if metricas is not None:
+        metricas.cargas_perezosas[str(estado_orm.loader_strategy_path.path[-1])] += 1
+
+
+def presupuesto_consultas(maximo: int):
+    """
+    Dependencia que fija el presupuesto de consultas de una ruta:
+    dependencies=[Depends(presupuesto_consultas(3))]
+    """
+    def _fijar_presupuesto():
+        metricas = _metricas.get()
+        if metricas is not None:
+            metricas.presupuesto = maximo
+    return _fijar_presupuesto
+
+
+def instrumentar_motor(engine):
+    """
+    Registra los hooks de medición en un Engine síncrono
+    (para motores asíncronos se pasa `async_engine.sync_engine`).
+    """
+    if not settings.SQL_INSTRUMENTACION:
+        return
+    event.listen(engine, "before_cursor_execute", _antes_de_ejecutar)
+    event.listen(engine, "after_cursor_execute", _despues_de_ejecutar)
+
+
+if settings.SQL_INSTRUMENTACION and DETECTOR_ACTIVO:
+    # AsyncSession delega en Session, así que basta con escuchar la clase base
+    event.listen(Session, "do_orm_execute", _registrar_carga_relacion)
+
+
+class InstrumentacionMiddleware:
+    """
+    Middleware ASGI que mide cada petición y añade la cabecera Server-Timing:
+    db (tiempo en SQL), app (tiempo total hasta la respuesta) y queries (número de consultas).
+    Con el detector de N+1 activo también revisa el presupuesto de consultas.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not settings.SQL_INSTRUMENTACION:
+            await self.app(scope, receive, send)
+            return
+
+        metricas = MetricasPeticion(f'{scope.get("method", "")} {scope.get("path", "")}')
+        token = _metricas.set(metricas)
+        inicio = time.perf_counter()
+
+        respuesta_reemplazada = False
+
+        async def send_con_tiempos(message):
+            nonlocal respuesta_reemplazada
+            if respuesta_reemplazada:
+                return
+            if message["type"] == "http.response.start":
+                reporte = metricas.reporte_n1() if DETECTOR_ACTIVO else None
+                if reporte is not None:
+                    if DETECTOR_N1 == "raise":
+                        respuesta_reemplazada = True
+                        await _enviar_reporte_n1(send, reporte)
+                        return
+                    logger_n1.warning(json.dumps(reporte, ensure_ascii=False))
+                total_ms = (time.perf_counter() - inicio) * 1000
+                server_timing = (
+                    f"db;dur={metricas.tiempo_db * 1000:.2f}, "
+                    f"app;dur={total_ms:.2f}, "
+                    f'queries;desc="{metricas.consultas}"'
+                )
+                headers = list(message.get("headers", []))
+                headers.append((b"server-timing", server_timing.encode()))
+                message["headers"] = headers
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_con_tiempos)
+        finally:
+            _metricas.reset(token)
+
+
+async def _enviar_reporte_n1(send, reporte: dict):
+    cuerpo = json.dumps({
+        "detail": "Presupuesto de consultas SQL excedido",
+        "reporte": reporte,
+    }, ensure_ascii=False).encode()
+    await send({
+        "type": "http.response.start",
+        "status": 500,
+        "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(cuerpo)).encode()),
+        ],
+    })
+    await send({"type": "http.response.body", "body": cuerpo})
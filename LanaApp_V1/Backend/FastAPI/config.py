@@ -3,9 +3,117 @@ from pydantic_settings import BaseSettings
 class Settings(BaseSettings):
     SECRET_KEY: str = "tu_super_secreto_aqui"
     ALGORITHM: str = "HS256"
-    ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
+    ACCESS_TOKEN_EXPIRE_MINUTES: int = 15
+    # Refresh tokens rotativos (auth_tokens) y purga de caducados/revocados
+    REFRESH_TOKEN_EXPIRE_DAYS: int = 30
+    AUTH_PURGA_INTERVALO_S: float = 300.0
+    AUTH_BLOOM_BITS: int = 1 << 20
+    AUTH_BLOOM_FUNCIONES: int = 4
+    # Cache de tokens ya verificados (hasta su exp) y de usuarios por id, por worker
+    AUTH_CACHE_TOKENS_MAX: int = 10000
+    AUTH_CACHE_USUARIOS_MAX: int = 5000
+    # Otros workers ven un cambio de /usuarios/me a lo sumo tras este tiempo
+    AUTH_CACHE_USUARIOS_TTL_S: float = 60.0
+    # bcrypt en un pool de procesos; BCRYPT_ROUNDS=0 calibra el costo al arrancar
+    BCRYPT_ROUNDS: int = 0
+    BCRYPT_ROUNDS_MIN: int = 10
+    BCRYPT_ROUNDS_MAX: int = 14
+    BCRYPT_OBJETIVO_MS: float = 250.0
+    BCRYPT_WORKERS: int = 2
+    # Peticiones esperando un proceso libre antes de responder 503
+    BCRYPT_COLA_MAX: int = 32
+    # Worker de alertas de presupuesto: espera para juntar una ráfaga y tamaño máximo del lote
+    ALERTAS_ESPERA_LOTE_S: float = 0.05
+    ALERTAS_LOTE_MAX: int = 200
+    # Reintento de una evaluación fallida: espera base, que se duplica en cada fallo hasta el máximo
+    ALERTAS_REINTENTO_BASE_S: float = 5.0
+    ALERTAS_REINTENTO_MAX_S: float = 300.0
+    # False: sin evaluación por transacción, solo el barrido (utils/barrido_presupuestos.py)
+    ALERTAS_POR_TRANSACCION: bool = True
+    # Intervalo del barrido periódico de todos los presupuestos del mes; 0 = desactivado
+    ALERTAS_BARRIDO_INTERVALO_S: float = 0.0
+    # Despacho de notificaciones (utils/despacho.py)
+    NOTIF_DESPACHO_ACTIVO: bool = True
+    NOTIF_LOTE: int = 100
+    # Sondeo de respaldo (reintentos, filas de otros procesos): las notificaciones
+    # nuevas y las programadas que vencen despiertan al worker antes
+    NOTIF_INTERVALO_S: float = 30.0
+    NOTIF_LEASE_S: float = 120.0
+    NOTIF_MAX_INTENTOS: int = 5
+    NOTIF_BACKOFF_BASE_S: float = 30.0
+    # Envíos simultáneos por canal y conexiones reutilizables por pasarela
+    NOTIF_CONCURRENCIA: int = 20
+    NOTIF_HTTP_CONEXIONES: int = 8
+    NOTIF_TIMEOUT_S: float = 10.0
+    NOTIF_CACHE_CONTACTOS_MAX: int = 10000
+    NOTIF_CACHE_CONTACTOS_TTL_S: float = 300.0
+    # Programador de programada_para (utils/programador.py): horas cargadas en memoria y tope de entradas
+    NOTIF_VENTANA_HORAS: float = 6.0
+    NOTIF_PROGRAMADAS_MAX: int = 100000
+    # Canales: vacío = solo se registran en el log
+    SMTP_HOST: str = ""
+    SMTP_PORT: int = 25
+    SMTP_USUARIO: str = ""
+    SMTP_PASSWORD: str = ""
+    SMTP_STARTTLS: bool = False
+    SMTP_REMITENTE: str = "no-reply@lanaapp.local"
+    SMTP_CONEXIONES: int = 4
+    SMS_URL: str = ""
+    PUSH_URL: str = ""
+    # Límite de intentos (ventana deslizante) en login y olvide-contrasena, por IP y por email
+    LIMITE_ACTIVO: bool = True
+    # "memoria" (por worker) o "sqlite" (compartido entre workers de la máquina)
+    LIMITE_BACKEND: str = "memoria"
+    # Archivo del backend sqlite; vacío = DB/limites.sqlite
+    LIMITE_SQLITE_PATH: str = ""
+    # Claves del backend memoria; al superarlo se descartan las usadas hace más tiempo
+    LIMITE_MAX_CLAVES: int = 100000
+    # Detrás de un proxy: IPs o redes (separadas por comas) cuya cabecera LIMITE_CABECERA_IP
+    # se acepta para conocer la IP del cliente. Vacío = se usa la IP de la conexión
+    LIMITE_PROXIES_CONFIABLES: str = ""
+    LIMITE_CABECERA_IP: str = "X-Forwarded-For"
+    LIMITE_LOGIN_POR_IP: int = 20
+    LIMITE_LOGIN_POR_EMAIL: int = 5
+    LIMITE_LOGIN_VENTANA_S: float = 60.0
+    LIMITE_OLVIDE_POR_IP: int = 10
+    LIMITE_OLVIDE_POR_EMAIL: int = 3
+    LIMITE_OLVIDE_VENTANA_S: float = 900.0
+
+    # Perfil de la base de datos: "desarrollo" o "produccion"
+    DB_PERFIL: str = "desarrollo"
+    # PRAGMAs del perfil de producción (se aplican en cada conexión nueva)
+    DB_BUSY_TIMEOUT_MS: int = 5000
+    DB_CACHE_SIZE_KB: int = 65536
+    DB_MMAP_SIZE: int = 268435456
+    # Pool de conexiones del perfil de producción
+    DB_POOL_SIZE: int = 10
+    DB_MAX_OVERFLOW: int = 20
+    DB_POOL_TIMEOUT: int = 30
+    DB_POOL_RECYCLE: int = 3600
+    # Archivo de la base; vacío = DB/bd_LanaApp.sqlite (las pruebas usan uno temporal)
+    DB_PATH: str = ""
+    # Archivo para el motor de solo lectura (réplica); vacío = misma base principal
+    DB_LECTURA_PATH: str = ""
+
+    # Instrumentación SQL (Server-Timing y log de consultas lentas)
+    SQL_INSTRUMENTACION: bool = True
+    # Umbral del log de consultas lentas; 0 registra todas (equivale al antiguo echo)
+    SQL_UMBRAL_LENTA_MS: float = 200.0
+    # Detector de N+1: "off", "warn" (log) o "raise" (la petición falla, para pruebas)
+    SQL_DETECTOR_N1: str = "off"
+    # Presupuesto de consultas por petición (cada ruta puede fijar el suyo)
+    SQL_PRESUPUESTO_CONSULTAS: int = 20
+    # Veces que puede repetirse la misma sentencia en una petición
+    SQL_MAX_REPETICIONES: int = 5
+
+    # Cache en memoria de los endpoints de gráficas (LRU + TTL, invalidada por versión de datos)
+    CACHE_ANALITICA: bool = True
+    CACHE_ANALITICA_MAX_ENTRADAS: int = 2000
+    CACHE_ANALITICA_TTL_S: float = 300.0
+    # Años que puede abarcar /transacciones/historico (ano_fin - ano + 1)
+    HISTORICO_MAX_ANOS: int = 50
 
     class Config:
         env_file = ".env"
 
-settings = Settings()
\ No newline at end of file
+settings = Settings()
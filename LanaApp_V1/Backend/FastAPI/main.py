@@ -1,6 +1,18 @@
+import asyncio
+import logging
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from DB.conexion import Base, engine
+from DB.conexion import Base, engine, async_engine, read_async_engine, reporte_pragmas
+from DB.instrumentacion import InstrumentacionMiddleware
+from config import settings
+from utils.cache import cache_analitica
+from utils.hashing import iniciar_pool, cerrar_pool
+from utils.revocacion import purgar_periodicamente
+from utils.alertas import iniciar_alertas, detener_alertas
+from utils.barrido_presupuestos import barrer_periodicamente
+from utils.despacho import despachar_periodicamente, estadisticas as estadisticas_despacho
+from utils.programador import programar_periodicamente
 
 # Importar todos los routers
 from routers import (
@@ -14,7 +26,46 @@ from routers import (
     categorias    
 )
 
+# Logger de la aplicación (uvicorn solo configura sus propios loggers)
+logger = logging.getLogger("lana")
+if not logger.handlers:
+    _handler = logging.StreamHandler()
+    _handler.setFormatter(logging.Formatter("%(levelname)s:     %(name)s - %(message)s"))
+    logger.addHandler(_handler)
+    logger.setLevel(logging.INFO)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await reporte_pragmas()
+    await iniciar_pool()
+    # Purga de auth_tokens caducados y recarga de revocaciones
+    purga_tokens = asyncio.create_task(purgar_periodicamente())
+    await iniciar_alertas()
+    barrido = asyncio.create_task(barrer_periodicamente()) if settings.ALERTAS_BARRIDO_INTERVALO_S > 0 else None
+    despacho = programador = None
+    if settings.NOTIF_DESPACHO_ACTIVO:
+        despacho = asyncio.create_task(despachar_periodicamente())
+        # Despierta al despacho cuando vence cada notificación programada
+        programador = asyncio.create_task(programar_periodicamente())
+    yield
+    if barrido is not None:
+        barrido.cancel()
+    # Un lote a medias vuelve a estar disponible al vencer su lease
+    if despacho is not None:
+        despacho.cancel()
+        programador.cancel()
+        await asyncio.gather(despacho, programador, return_exceptions=True)
+    # Antes de cerrar los motores: el worker termina lo encolado
+    await detener_alertas()
+    purga_tokens.cancel()
+    cerrar_pool()
+    await async_engine.dispose()
+    await read_async_engine.dispose()
+
+
 app = FastAPI(
+    lifespan=lifespan,
     title="Lana App API",
     description="API para el sistema de gestión financiera Lana App",
     version="1.0.0",
@@ -31,7 +82,11 @@ app.add_middleware(
     allow_credentials=True,
 )
 
+# Server-Timing (db, app, queries) y log de consultas lentas
+app.add_middleware(InstrumentacionMiddleware)
+
 # Crear tablas en la base de datos (solo para desarrollo)
+# En bases existentes/producción el esquema se actualiza con: alembic upgrade head
 Base.metadata.create_all(bind=engine)
 
 # Incluir routers
@@ -59,4 +114,16 @@ async def root():
             "pagos_programados": "/api/pagos-programados",
             "notificaciones": "/api/notificaciones"
         }
-    }
\ No newline at end of file
+    }
+
+
+@app.get("/estadisticas/cache", tags=["Root"])
+async def estadisticas_cache():
+    # Aciertos, fallos y expulsiones de la cache de gráficas de este proceso
+    return cache_analitica.estadisticas()
+
+
+@app.get("/estadisticas/despacho", tags=["Root"])
+async def estadisticas_notificaciones():
+    # Notificaciones enviadas por este proceso y su ritmo (por segundo de envío)
+    return estadisticas_despacho()
\ No newline at end of file
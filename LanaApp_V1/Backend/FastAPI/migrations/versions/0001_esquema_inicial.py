@@ -0,0 +1,155 @@
+"""esquema inicial
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-17 10:00:00
+
+Tablas tal como las creaba Base.metadata.create_all antes de usar migraciones.
+En bases existentes las tablas ya están y se omiten.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "0001"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def _timestamps():
+    return [
+        sa.Column("created_at", sa.DateTime(), nullable=False),
+        sa.Column("updated_at", sa.DateTime(), nullable=False),
+    ]
+
+
+def upgrade() -> None:
+    existentes = set(sa.inspect(op.get_bind()).get_table_names())
+
+    if "usuarios" not in existentes:
+        op.create_table(
+            "usuarios",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("nombre", sa.String(100)),
+            sa.Column("email", sa.String(255), unique=True),
+            sa.Column("password", sa.String(255)),
+            sa.Column("telefono", sa.String(20)),
+            sa.Column("reset_token", sa.String(255)),
+            sa.Column("reset_token_expiry", sa.DateTime()),
+            *_timestamps(),
+        )
+
+    if "categorias" not in existentes:
+        op.create_table(
+            "categorias",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("nombre", sa.String(50)),
+            sa.Column("tipo", sa.Enum("ingreso", "gasto", name="tipo_categoria")),
+            sa.Column("created_at", sa.DateTime(), nullable=False),
+        )
+
+    if "auth_tokens" not in existentes:
+        op.create_table(
+            "auth_tokens",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("usuario_id", sa.Integer(), sa.ForeignKey("usuarios.id")),
+            sa.Column("token", sa.String(512)),
+            sa.Column("expires_at", sa.DateTime()),
+            sa.Column("created_at", sa.DateTime(), nullable=False),
+        )
+
+    if "cuentas" not in existentes:
+        op.create_table(
+            "cuentas",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("usuario_id", sa.Integer(), sa.ForeignKey("usuarios.id")),
+            sa.Column("nombre", sa.String(100)),
+            sa.Column("tipo", sa.Enum("banco", "tarjeta", "efectivo", "otro", name="tipo_cuenta")),
+            sa.Column("saldo_inicial", sa.Numeric(12, 2)),
+            *_timestamps(),
+        )
+
+    if "transacciones" not in existentes:
+        op.create_table(
+            "transacciones",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("usuario_id", sa.Integer(), sa.ForeignKey("usuarios.id")),
+            sa.Column("cuenta_id", sa.Integer(), sa.ForeignKey("cuentas.id")),
+            sa.Column("categoria_id", sa.Integer(), sa.ForeignKey("categorias.id")),
+            sa.Column("monto", sa.Numeric(12, 2)),
+            sa.Column("fecha", sa.Date()),
+            sa.Column("descripcion", sa.Text()),
+            *_timestamps(),
+        )
+
+    if "presupuestos" not in existentes:
+        op.create_table(
+            "presupuestos",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("usuario_id", sa.Integer(), sa.ForeignKey("usuarios.id")),
+            sa.Column("categoria_id", sa.Integer(), sa.ForeignKey("categorias.id")),
+            sa.Column("mes", sa.Integer()),
+            sa.Column("ano", sa.Integer()),
+            sa.Column("limite", sa.Numeric(12, 2)),
+            sa.Column("alerta_80", sa.Boolean()),
+            sa.Column("alerta_100", sa.Boolean()),
+            *_timestamps(),
+        )
+
+    if "pagos_programados" not in existentes:
+        op.create_table(
+            "pagos_programados",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("usuario_id", sa.Integer(), sa.ForeignKey("usuarios.id")),
+            sa.Column("cuenta_id", sa.Integer(), sa.ForeignKey("cuentas.id")),
+            sa.Column("categoria_id", sa.Integer(), sa.ForeignKey("categorias.id")),
+            sa.Column("descripcion", sa.String(100)),
+            sa.Column("monto", sa.Numeric(12, 2)),
+            sa.Column("frecuencia", sa.Enum("mensual", "semanal", "anual", "unica", name="frecuencia_pago")),
+            sa.Column("proxima_fecha", sa.Date()),
+            sa.Column("activo", sa.Boolean()),
+            sa.Column("notificar_antes", sa.Integer()),
+            *_timestamps(),
+        )
+
+    if "preferencias_notificacion" not in existentes:
+        op.create_table(
+            "preferencias_notificacion",
+            sa.Column("usuario_id", sa.Integer(), sa.ForeignKey("usuarios.id"), primary_key=True),
+            sa.Column("por_email", sa.Boolean()),
+            sa.Column("por_sms", sa.Boolean()),
+            sa.Column("por_push", sa.Boolean()),
+            *_timestamps(),
+        )
+
+    if "notificaciones" not in existentes:
+        op.create_table(
+            "notificaciones",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("usuario_id", sa.Integer(), sa.ForeignKey("usuarios.id")),
+            sa.Column("tipo", sa.Enum("presupuesto_excedido", "pago_programado", "saldo_bajo", "recuperacion", name="tipo_notificacion")),
+            sa.Column("medio", sa.Enum("email", "sms", "push", name="medio_notificacion")),
+            sa.Column("mensaje", sa.Text()),
+            sa.Column("programada_para", sa.DateTime()),
+            sa.Column("enviada_en", sa.DateTime(), nullable=False),
+            sa.Column("estado", sa.Enum("pendiente", "enviada", "fallida", "leida", name="estado_notificacion")),
+            sa.Column("datos_extra", sa.JSON()),
+            sa.Column("created_at", sa.DateTime(), nullable=False),
+        )
+
+
+def downgrade() -> None:
+    for tabla in (
+        "notificaciones",
+        "preferencias_notificacion",
+        "pagos_programados",
+        "presupuestos",
+        "transacciones",
+        "cuentas",
+        "auth_tokens",
+        "categorias",
+        "usuarios",
+    ):
+        op.drop_table(tabla)
@@ -0,0 +1,74 @@
+"""indices para las consultas frecuentes
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-17 10:30:00
+
+Índices compuestos/cubrientes para los filtros de los endpoints y
+restricción única de presupuesto por (usuario, periodo, categoría).
+Los presupuestos duplicados que impedirían la restricción se mueven a
+presupuestos_duplicados (el downgrade los devuelve).
+"""
+import logging
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "0002"
+down_revision = "0001"
+branch_labels = None
+depends_on = None
+
+logger = logging.getLogger("alembic.runtime.migration")
+
+# Todos menos el más antiguo de cada (usuario, periodo, categoría)
+DUPLICADOS = (
+    "id NOT IN (SELECT MIN(id) FROM presupuestos GROUP BY usuario_id, ano, mes, categoria_id)"
+)
+
+INDICES = [
+    ("ix_transacciones_usuario_fecha", "transacciones", ["usuario_id", "fecha", "categoria_id", "monto"], False),
+    ("ix_transacciones_usuario_categoria_fecha", "transacciones", ["usuario_id", "categoria_id", "fecha", "monto"], False),
+    ("ix_transacciones_cuenta", "transacciones", ["cuenta_id"], False),
+    ("ix_notificaciones_usuario_estado_programada", "notificaciones", ["usuario_id", "estado", "programada_para"], False),
+    ("ix_notificaciones_usuario_programada", "notificaciones", ["usuario_id", "programada_para"], False),
+    ("ix_pagos_programados_activo_fecha", "pagos_programados", ["activo", "proxima_fecha"], False),
+    ("ix_pagos_programados_usuario_activo_fecha", "pagos_programados", ["usuario_id", "activo", "proxima_fecha"], False),
+    ("uq_presupuestos_periodo", "presupuestos", ["usuario_id", "ano", "mes", "categoria_id"], True),
+]
+
+
+def _indices_existentes(tabla):
+    return {i["name"] for i in sa.inspect(op.get_bind()).get_indexes(tabla)}
+
+
+def upgrade() -> None:
+    # Antes de la restricción única se apartan los presupuestos duplicados (se conserva el más antiguo)
+    bind = op.get_bind()
+    duplicados = bind.execute(sa.text(f"SELECT COUNT(*) FROM presupuestos WHERE {DUPLICADOS}")).scalar()
+    if duplicados:
+        op.execute("CREATE TABLE IF NOT EXISTS presupuestos_duplicados AS SELECT * FROM presupuestos WHERE 0")
+        op.execute(f"INSERT INTO presupuestos_duplicados SELECT * FROM presupuestos WHERE {DUPLICADOS}")
+        op.execute(f"DELETE FROM presupuestos WHERE {DUPLICADOS}")
+        logger.warning(
+            "%s presupuestos duplicados movidos a presupuestos_duplicados antes de crear uq_presupuestos_periodo",
+            duplicados
+        )
+
+    for nombre, tabla, columnas, unico in INDICES:
+        # create_all ya pudo haberlos creado en bases nuevas
+        if nombre not in _indices_existentes(tabla):
+            op.create_index(nombre, tabla, columnas, unique=unico)
+
+    op.execute("ANALYZE")
+
+
+def downgrade() -> None:
+    for nombre, tabla, _, _ in reversed(INDICES):
+        if nombre in _indices_existentes(tabla):
+            op.drop_index(nombre, table_name=tabla)
+
+    if "presupuestos_duplicados" in sa.inspect(op.get_bind()).get_table_names():
+        op.execute("INSERT INTO presupuestos SELECT * FROM presupuestos_duplicados")
+        op.drop_table("presupuestos_duplicados")
@@ -0,0 +1,48 @@
+"""tabla resumen_mensual
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-17 12:00:00
+
+Suma y conteo de transacciones por (usuario, año, mes, categoría) para los
+endpoints de gráficas. Se llena desde las transacciones existentes; si
+create_all ya creó la tabla vacía, también se recalcula.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "0003"
+down_revision = "0002"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    if "resumen_mensual" not in sa.inspect(op.get_bind()).get_table_names():
+        op.create_table(
+            "resumen_mensual",
+            sa.Column("usuario_id", sa.Integer(), sa.ForeignKey("usuarios.id"), primary_key=True),
+            sa.Column("ano", sa.Integer(), primary_key=True),
+            sa.Column("mes", sa.Integer(), primary_key=True),
+            sa.Column("categoria_id", sa.Integer(), sa.ForeignKey("categorias.id"), primary_key=True),
+            sa.Column("total", sa.Numeric(14, 2), nullable=False),
+            sa.Column("cantidad", sa.Integer(), nullable=False),
+        )
+
+    # Equivale a `python -m utils.resumen_mensual reconstruir`
+    op.execute("DELETE FROM resumen_mensual")
+    op.execute(
+        "INSERT INTO resumen_mensual (usuario_id, ano, mes, categoria_id, total, cantidad) "
+        "SELECT usuario_id, CAST(strftime('%Y', fecha) AS INTEGER), CAST(strftime('%m', fecha) AS INTEGER), "
+        "categoria_id, SUM(monto), COUNT(id) "
+        "FROM transacciones "
+        "WHERE usuario_id IS NOT NULL AND categoria_id IS NOT NULL AND fecha IS NOT NULL "
+        "GROUP BY 1, 2, 3, 4"
+    )
+
+
+def downgrade() -> None:
+    if "resumen_mensual" in sa.inspect(op.get_bind()).get_table_names():
+        op.drop_table("resumen_mensual")
@@ -0,0 +1,42 @@
+"""saldo_actual en cuentas
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-17 13:00:00
+
+Saldo mantenido por cuenta (saldo_inicial + ingresos - gastos), calculado
+aquí desde las transacciones existentes.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "0004"
+down_revision = "0003"
+branch_labels = None
+depends_on = None
+
+
+def _columnas(tabla):
+    return {c["name"] for c in sa.inspect(op.get_bind()).get_columns(tabla)}
+
+
+def upgrade() -> None:
+    if "saldo_actual" not in _columnas("cuentas"):
+        with op.batch_alter_table("cuentas") as batch_op:
+            batch_op.add_column(sa.Column("saldo_actual", sa.Numeric(12, 2), nullable=False, server_default="0"))
+
+    # Equivale a `python -m utils.saldos reconstruir`
+    op.execute(
+        "UPDATE cuentas SET saldo_actual = COALESCE(saldo_inicial, 0) + COALESCE(("
+        "SELECT SUM(CASE WHEN categorias.tipo = 'ingreso' THEN t.monto ELSE -t.monto END) "
+        "FROM transacciones AS t LEFT OUTER JOIN categorias ON t.categoria_id = categorias.id "
+        "WHERE t.cuenta_id = cuentas.id), 0)"
+    )
+
+
+def downgrade() -> None:
+    if "saldo_actual" in _columnas("cuentas"):
+        with op.batch_alter_table("cuentas") as batch_op:
+            batch_op.drop_column("saldo_actual")
@@ -0,0 +1,58 @@
+"""refresh tokens y revocación en auth_tokens
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-17 15:00:00
+
+auth_tokens pasa a guardar el hash de los refresh tokens y los jti de access
+tokens revocados (columna tipo), con índices para buscarlos y purgarlos.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "0005"
+down_revision = "0004"
+branch_labels = None
+depends_on = None
+
+
+INDICES = [
+    ("uq_auth_tokens_token", ["token"], True),
+    ("ix_auth_tokens_expires", ["expires_at"], False),
+    ("ix_auth_tokens_usuario", ["usuario_id"], False),
+]
+
+
+def _columnas(tabla):
+    return {c["name"] for c in sa.inspect(op.get_bind()).get_columns(tabla)}
+
+
+def _indices_existentes(tabla):
+    return {i["name"] for i in sa.inspect(op.get_bind()).get_indexes(tabla)}
+
+
+def upgrade() -> None:
+    if "tipo" not in _columnas("auth_tokens"):
+        # Las filas anteriores no guardaban hashes de refresh token: no sirven para /refresh
+        op.execute("DELETE FROM auth_tokens")
+        with op.batch_alter_table("auth_tokens") as batch_op:
+            batch_op.add_column(sa.Column(
+                "tipo", sa.Enum("refresh", "revocado", name="tipo_token"),
+                nullable=False, server_default="refresh"
+            ))
+
+    for nombre, columnas, unico in INDICES:
+        if nombre not in _indices_existentes("auth_tokens"):
+            op.create_index(nombre, "auth_tokens", columnas, unique=unico)
+
+
+def downgrade() -> None:
+    for nombre, _, _ in reversed(INDICES):
+        if nombre in _indices_existentes("auth_tokens"):
+            op.drop_index(nombre, table_name="auth_tokens")
+
+    if "tipo" in _columnas("auth_tokens"):
+        with op.batch_alter_table("auth_tokens") as batch_op:
+            batch_op.drop_column("tipo")
@@ -0,0 +1,35 @@
+"""tabla alertas_pendientes
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-17 16:00:00
+
+Outbox de evaluaciones de presupuesto para el worker de alertas
+(utils/alertas.py).
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "0006"
+down_revision = "0005"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    if "alertas_pendientes" not in sa.inspect(op.get_bind()).get_table_names():
+        op.create_table(
+            "alertas_pendientes",
+            sa.Column("usuario_id", sa.Integer(), sa.ForeignKey("usuarios.id"), primary_key=True),
+            sa.Column("categoria_id", sa.Integer(), sa.ForeignKey("categorias.id"), primary_key=True),
+            sa.Column("ano", sa.Integer(), primary_key=True),
+            sa.Column("mes", sa.Integer(), primary_key=True),
+            sa.Column("created_at", sa.DateTime()),
+        )
+
+
+def downgrade() -> None:
+    if "alertas_pendientes" in sa.inspect(op.get_bind()).get_table_names():
+        op.drop_table("alertas_pendientes")
@@ -0,0 +1,57 @@
+"""gastado y nivel_alertado en presupuestos
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-17 17:00:00
+
+Gasto del periodo mantenido por presupuesto, calculado aquí desde
+resumen_mensual. Los presupuestos que ya superan un umbral quedan marcados
+como alertados para no repetir avisos ya enviados.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "0007"
+down_revision = "0006"
+branch_labels = None
+depends_on = None
+
+
+def _columnas(tabla):
+    return {c["name"] for c in sa.inspect(op.get_bind()).get_columns(tabla)}
+
+
+def upgrade() -> None:
+    columnas = _columnas("presupuestos")
+    if "gastado" not in columnas or "nivel_alertado" not in columnas:
+        with op.batch_alter_table("presupuestos") as batch_op:
+            if "gastado" not in columnas:
+                batch_op.add_column(sa.Column("gastado", sa.Numeric(12, 2), nullable=False, server_default="0"))
+            if "nivel_alertado" not in columnas:
+                batch_op.add_column(sa.Column("nivel_alertado", sa.Integer(), nullable=False, server_default="0"))
+
+    # Equivale a `python -m utils.presupuestos reconstruir`
+    op.execute(
+        "UPDATE presupuestos SET gastado = COALESCE(("
+        "SELECT r.total FROM resumen_mensual AS r JOIN categorias ON r.categoria_id = categorias.id "
+        "WHERE r.usuario_id = presupuestos.usuario_id AND r.ano = presupuestos.ano "
+        "AND r.mes = presupuestos.mes AND r.categoria_id = presupuestos.categoria_id "
+        "AND categorias.tipo = 'gasto'), 0)"
+    )
+    op.execute(
+        "UPDATE presupuestos SET nivel_alertado = CASE "
+        "WHEN limite > 0 AND gastado >= limite THEN 100 "
+        "WHEN limite > 0 AND gastado >= limite * 0.8 THEN 80 "
+        "ELSE 0 END"
+    )
+
+
+def downgrade() -> None:
+    columnas = _columnas("presupuestos")
+    with op.batch_alter_table("presupuestos") as batch_op:
+        if "nivel_alertado" in columnas:
+            batch_op.drop_column("nivel_alertado")
+        if "gastado" in columnas:
+            batch_op.drop_column("gastado")
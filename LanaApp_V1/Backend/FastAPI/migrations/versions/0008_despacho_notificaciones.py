@@ -0,0 +1,51 @@
+"""despacho de notificaciones
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2026-10-17 18:00:00
+
+Intentos y lease (bloqueada_hasta) por notificación, e índice por
+(estado, programada_para) para reclamar las pendientes vencidas.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "0008"
+down_revision = "0007"
+branch_labels = None
+depends_on = None
+
+
+def _columnas(tabla):
+    return {c["name"] for c in sa.inspect(op.get_bind()).get_columns(tabla)}
+
+
+def _indices_existentes(tabla):
+    return {i["name"] for i in sa.inspect(op.get_bind()).get_indexes(tabla)}
+
+
+def upgrade() -> None:
+    columnas = _columnas("notificaciones")
+    if "intentos" not in columnas or "bloqueada_hasta" not in columnas:
+        with op.batch_alter_table("notificaciones") as batch_op:
+            if "intentos" not in columnas:
+                batch_op.add_column(sa.Column("intentos", sa.Integer(), nullable=False, server_default="0"))
+            if "bloqueada_hasta" not in columnas:
+                batch_op.add_column(sa.Column("bloqueada_hasta", sa.DateTime()))
+
+    if "ix_notificaciones_estado_programada" not in _indices_existentes("notificaciones"):
+        op.create_index("ix_notificaciones_estado_programada", "notificaciones", ["estado", "programada_para"])
+
+
+def downgrade() -> None:
+    if "ix_notificaciones_estado_programada" in _indices_existentes("notificaciones"):
+        op.drop_index("ix_notificaciones_estado_programada", table_name="notificaciones")
+
+    columnas = _columnas("notificaciones")
+    with op.batch_alter_table("notificaciones") as batch_op:
+        if "bloqueada_hasta" in columnas:
+            batch_op.drop_column("bloqueada_hasta")
+        if "intentos" in columnas:
+            batch_op.drop_column("intentos")
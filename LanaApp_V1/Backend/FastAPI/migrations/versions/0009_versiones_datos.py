@@ -0,0 +1,33 @@
+"""tabla versiones_datos
+
+Revision ID: 0009
+Revises: 0008
+Create Date: 2026-10-18 10:00:00
+
+Versión de los datos por usuario y dominio, guardada en la base para que los
+ETags y la cache de gráficas coincidan entre workers (utils/versiones.py).
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "0009"
+down_revision = "0008"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    if "versiones_datos" not in sa.inspect(op.get_bind()).get_table_names():
+        op.create_table(
+            "versiones_datos",
+            sa.Column("dominio", sa.String(30), primary_key=True),
+            sa.Column("usuario_id", sa.Integer(), primary_key=True),
+            sa.Column("version", sa.Integer(), nullable=False, server_default="0"),
+        )
+
+
+def downgrade() -> None:
+    if "versiones_datos" in sa.inspect(op.get_bind()).get_table_names():
+        op.drop_table("versiones_datos")
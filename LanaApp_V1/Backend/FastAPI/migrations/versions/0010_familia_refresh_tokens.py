@@ -0,0 +1,65 @@
+"""familias de refresh tokens
+
+Revision ID: 0010
+Revises: 0009
+Create Date: 2026-10-18 11:00:00
+
+auth_tokens.familia agrupa los refresh tokens rotados desde un mismo login; los
+ya usados quedan con tipo "usado" hasta su expiración para detectar su
+reutilización y revocar la familia completa, así que tipo_token suma ese valor.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "0010"
+down_revision = "0009"
+branch_labels = None
+depends_on = None
+
+
+def _columnas(tabla):
+    return {c["name"] for c in sa.inspect(op.get_bind()).get_columns(tabla)}
+
+
+def _indices_existentes(tabla):
+    return {i["name"] for i in sa.inspect(op.get_bind()).get_indexes(tabla)}
+
+
+TIPO_ANTERIOR = sa.Enum("refresh", "revocado", name="tipo_token")
+TIPO_NUEVO = sa.Enum("refresh", "usado", "revocado", name="tipo_token")
+
+
+def _cambiar_tipo(anterior, nuevo):
+    with op.batch_alter_table("auth_tokens") as batch_op:
+        batch_op.alter_column(
+            "tipo", existing_type=anterior, type_=nuevo,
+            existing_nullable=False, existing_server_default="refresh"
+        )
+
+
+def upgrade() -> None:
+    _cambiar_tipo(TIPO_ANTERIOR, TIPO_NUEVO)
+
+    if "familia" not in _columnas("auth_tokens"):
+        with op.batch_alter_table("auth_tokens") as batch_op:
+            batch_op.add_column(sa.Column("familia", sa.String(32)))
+        # Cada refresh token vigente inicia su propia familia
+        op.execute("UPDATE auth_tokens SET familia = substr(token, 1, 32) WHERE tipo = 'refresh'")
+
+    if "ix_auth_tokens_familia" not in _indices_existentes("auth_tokens"):
+        op.create_index("ix_auth_tokens_familia", "auth_tokens", ["familia"])
+
+
+def downgrade() -> None:
+    if "ix_auth_tokens_familia" in _indices_existentes("auth_tokens"):
+        op.drop_index("ix_auth_tokens_familia", table_name="auth_tokens")
+
+    if "familia" in _columnas("auth_tokens"):
+        with op.batch_alter_table("auth_tokens") as batch_op:
+            batch_op.drop_column("familia")
+
+    # Los usados no existen antes de esta revisión
+    op.execute("DELETE FROM auth_tokens WHERE tipo = 'usado'")
+    _cambiar_tipo(TIPO_NUEVO, TIPO_ANTERIOR)
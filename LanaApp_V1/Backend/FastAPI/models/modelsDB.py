@@ -1,5 +1,5 @@
 from sqlalchemy import Column, Integer, String, Boolean, Date, DateTime, Float, ForeignKey, Text
-from sqlalchemy import Enum, Numeric, JSON
+from sqlalchemy import Enum, Numeric, JSON, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime, timezone
 from DB.conexion import Base
@@ -21,25 +21,42 @@ class Usuario(Base):
                       nullable=False)
     
     # Relaciones
-    cuentas = relationship("Cuenta", back_populates="usuario")
-    transacciones = relationship("Transaccion", back_populates="usuario")
-    presupuestos = relationship("Presupuesto", back_populates="usuario")
-    pagos_programados = relationship("PagoProgramado", back_populates="usuario")
-    preferencias_notificacion = relationship("PreferenciaNotificacion", back_populates="usuario", uselist=False)
-    notificaciones = relationship("Notificacion", back_populates="usuario")
-    auth_tokens = relationship("AuthToken", back_populates="usuario")
+    # lazy="raise": ninguna relación se carga sola; cada consulta declara sus
+    # selectinload/joinedload. passive_deletes: el ORM no carga colecciones
+    # completas para borrar (ver routers/usuarios.py eliminar_usuario)
+    cuentas = relationship("Cuenta", back_populates="usuario", lazy="raise", passive_deletes=True)
+    transacciones = relationship("Transaccion", back_populates="usuario", lazy="raise", passive_deletes=True)
+    presupuestos = relationship("Presupuesto", back_populates="usuario", lazy="raise", passive_deletes=True)
+    pagos_programados = relationship("PagoProgramado", back_populates="usuario", lazy="raise", passive_deletes=True)
+    preferencias_notificacion = relationship("PreferenciaNotificacion", back_populates="usuario", uselist=False, lazy="raise", passive_deletes=True)
+    notificaciones = relationship("Notificacion", back_populates="usuario", lazy="raise", passive_deletes=True)
+    auth_tokens = relationship("AuthToken", back_populates="usuario", lazy="raise", passive_deletes=True)
 
 
 class AuthToken(Base):
     __tablename__ = "auth_tokens"
+    __table_args__ = (
+        # /api/auth/refresh busca por el hash del token
+        Index("uq_auth_tokens_token", "token", unique=True),
+        # Purga de caducados y cierre de sesiones de un usuario
+        Index("ix_auth_tokens_expires", "expires_at"),
+        Index("ix_auth_tokens_usuario", "usuario_id"),
+        # Reutilización de un refresh token rotado: se revoca toda su familia
+        Index("ix_auth_tokens_familia", "familia"),
+    )
     
     id = Column(Integer, primary_key=True, autoincrement="auto")
     usuario_id = Column(Integer, ForeignKey("usuarios.id"))
+    # refresh/usado: SHA-256 del refresh token (nunca el token en claro); revocado: jti del access token
     token = Column(String(512))
+    # usado: refresh token ya rotado, se guarda hasta su expiración para detectar reutilización
+    tipo = Column(Enum("refresh", "usado", "revocado", name="tipo_token"), default="refresh", nullable=False)
+    # Cadena de refresh tokens de un mismo login
+    familia = Column(String(32))
     expires_at = Column(DateTime)
     created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc), nullable=False)
     
-    usuario = relationship("Usuario", back_populates="auth_tokens")
+    usuario = relationship("Usuario", back_populates="auth_tokens", lazy="raise")
 
 
 class Cuenta(Base):
@@ -50,15 +67,17 @@ class Cuenta(Base):
     nombre = Column(String(100))
     tipo = Column(Enum("banco", "tarjeta", "efectivo", "otro", name="tipo_cuenta"))
     saldo_inicial = Column(Numeric(12, 2), default=0.00)
+    # saldo_inicial + ingresos - gastos; lo mantiene utils/saldos.py en cada alta/baja
+    saldo_actual = Column(Numeric(12, 2), default=0.00, nullable=False)
     created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc), nullable=False)
     updated_at = Column(DateTime, 
                       default=lambda: datetime.now(timezone.utc),
                       onupdate=lambda: datetime.now(timezone.utc),
                       nullable=False)
     
-    usuario = relationship("Usuario", back_populates="cuentas")
-    transacciones = relationship("Transaccion", back_populates="cuenta")
-    pagos_programados = relationship("PagoProgramado", back_populates="cuenta")
+    usuario = relationship("Usuario", back_populates="cuentas", lazy="raise")
+    transacciones = relationship("Transaccion", back_populates="cuenta", lazy="raise", passive_deletes=True)
+    pagos_programados = relationship("PagoProgramado", back_populates="cuenta", lazy="raise", passive_deletes=True)
 
 
 class Categoria(Base):
@@ -69,13 +88,20 @@ class Categoria(Base):
     tipo = Column(Enum("ingreso", "gasto", name="tipo_categoria"))
     created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc), nullable=False)
     
-    transacciones = relationship("Transaccion", back_populates="categoria")
-    presupuestos = relationship("Presupuesto", back_populates="categoria")
-    pagos_programados = relationship("PagoProgramado", back_populates="categoria")
+    transacciones = relationship("Transaccion", back_populates="categoria", lazy="raise", passive_deletes=True)
+    presupuestos = relationship("Presupuesto", back_populates="categoria", lazy="raise", passive_deletes=True)
+    pagos_programados = relationship("PagoProgramado", back_populates="categoria", lazy="raise", passive_deletes=True)
 
 
 class Transaccion(Base):
     __tablename__ = "transacciones"
+    __table_args__ = (
+        # Listados y gráficas por periodo (cubre categoria_id y monto para los SUM)
+        Index("ix_transacciones_usuario_fecha", "usuario_id", "fecha", "categoria_id", "monto"),
+        # Detalle de categoría y consumo de presupuestos
+        Index("ix_transacciones_usuario_categoria_fecha", "usuario_id", "categoria_id", "fecha", "monto"),
+        Index("ix_transacciones_cuenta", "cuenta_id"),
+    )
     
     id = Column(Integer, primary_key=True, autoincrement="auto")
     usuario_id = Column(Integer, ForeignKey("usuarios.id"))
@@ -90,13 +116,62 @@ class Transaccion(Base):
                       onupdate=lambda: datetime.now(timezone.utc),
                       nullable=False)
     
-    usuario = relationship("Usuario", back_populates="transacciones")
-    cuenta = relationship("Cuenta", back_populates="transacciones")
-    categoria = relationship("Categoria", back_populates="transacciones")
+    # Las respuestas anidan cuenta y categoria: los routers las cargan con joinedload
+    usuario = relationship("Usuario", back_populates="transacciones", lazy="raise")
+    cuenta = relationship("Cuenta", back_populates="transacciones", lazy="raise")
+    categoria = relationship("Categoria", back_populates="transacciones", lazy="raise")
+
+
+class ResumenMensual(Base):
+    """
+    Suma y conteo de transacciones por usuario, categoría y mes.
+    Se mantiene en la misma transacción que cada alta/baja (utils/resumen_mensual.py)
+    y lo leen los endpoints de gráficas en lugar de agregar todas las transacciones.
+    """
+    __tablename__ = "resumen_mensual"
+
+    # Clave primaria en este orden: los endpoints filtran por usuario y periodo
+    usuario_id = Column(Integer, ForeignKey("usuarios.id"), primary_key=True)
+    ano = Column(Integer, primary_key=True)
+    mes = Column(Integer, primary_key=True)
+    categoria_id = Column(Integer, ForeignKey("categorias.id"), primary_key=True)
+    total = Column(Numeric(14, 2), nullable=False, default=0)
+    cantidad = Column(Integer, nullable=False, default=0)
+
+
+class AlertaPendiente(Base):
+    """
+    Outbox de evaluaciones de presupuesto: una fila por (usuario, categoría, mes)
+    con transacciones aún no evaluadas. Se inserta en la misma transacción que el
+    alta y la borra el worker de utils/alertas.py al evaluar.
+    """
+    __tablename__ = "alertas_pendientes"
+
+    usuario_id = Column(Integer, ForeignKey("usuarios.id"), primary_key=True)
+    categoria_id = Column(Integer, ForeignKey("categorias.id"), primary_key=True)
+    ano = Column(Integer, primary_key=True)
+    mes = Column(Integer, primary_key=True)
+    created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+
+
+class VersionDatos(Base):
+    """
+    Versión de cada dominio de datos por usuario (utils/versiones.py). Sube en la
+    misma transacción que el cambio; usuario_id 0 es el contador global del dominio.
+    """
+    __tablename__ = "versiones_datos"
+
+    dominio = Column(String(30), primary_key=True)
+    usuario_id = Column(Integer, primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
 
 
 class Presupuesto(Base):
     __tablename__ = "presupuestos"
+    __table_args__ = (
+        # Un solo presupuesto por categoría y periodo
+        Index("uq_presupuestos_periodo", "usuario_id", "ano", "mes", "categoria_id", unique=True),
+    )
     
     id = Column(Integer, primary_key=True, autoincrement="auto")
     usuario_id = Column(Integer, ForeignKey("usuarios.id"))
@@ -106,18 +181,27 @@ class Presupuesto(Base):
     limite = Column(Numeric(12, 2))
     alerta_80 = Column(Boolean, default=True)
     alerta_100 = Column(Boolean, default=True)
+    # Gasto del periodo, mantenido en cada alta/baja (utils/presupuestos.py)
+    gastado = Column(Numeric(12, 2), default=0, nullable=False)
+    # Mayor alerta ya enviada en el periodo: 0, 80 o 100
+    nivel_alertado = Column(Integer, default=0, nullable=False)
     created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc), nullable=False)
     updated_at = Column(DateTime, 
                       default=lambda: datetime.now(timezone.utc),
                       onupdate=lambda: datetime.now(timezone.utc),
                       nullable=False)
     
-    usuario = relationship("Usuario", back_populates="presupuestos")
-    categoria = relationship("Categoria", back_populates="presupuestos")
+    usuario = relationship("Usuario", back_populates="presupuestos", lazy="raise")
+    categoria = relationship("Categoria", back_populates="presupuestos", lazy="raise")
 
 
 class PagoProgramado(Base):
     __tablename__ = "pagos_programados"
+    __table_args__ = (
+        # procesar_pagos_pendientes
+        Index("ix_pagos_programados_activo_fecha", "activo", "proxima_fecha"),
+        Index("ix_pagos_programados_usuario_activo_fecha", "usuario_id", "activo", "proxima_fecha"),
+    )
     
     id = Column(Integer, primary_key=True, autoincrement="auto")
     usuario_id = Column(Integer, ForeignKey("usuarios.id"))
@@ -135,9 +219,9 @@ class PagoProgramado(Base):
                       onupdate=lambda: datetime.now(timezone.utc),
                       nullable=False)
     
-    usuario = relationship("Usuario", back_populates="pagos_programados")
-    cuenta = relationship("Cuenta", back_populates="pagos_programados")
-    categoria = relationship("Categoria", back_populates="pagos_programados")
+    usuario = relationship("Usuario", back_populates="pagos_programados", lazy="raise")
+    cuenta = relationship("Cuenta", back_populates="pagos_programados", lazy="raise")
+    categoria = relationship("Categoria", back_populates="pagos_programados", lazy="raise")
 
 
 class PreferenciaNotificacion(Base):
@@ -153,11 +237,17 @@ class PreferenciaNotificacion(Base):
                       onupdate=lambda: datetime.now(timezone.utc),
                       nullable=False)
     
-    usuario = relationship("Usuario", back_populates="preferencias_notificacion")
+    usuario = relationship("Usuario", back_populates="preferencias_notificacion", lazy="raise")
 
 
 class Notificacion(Base):
     __tablename__ = "notificaciones"
+    __table_args__ = (
+        Index("ix_notificaciones_usuario_estado_programada", "usuario_id", "estado", "programada_para"),
+        Index("ix_notificaciones_usuario_programada", "usuario_id", "programada_para"),
+        # Despacho: pendientes vencidas de todos los usuarios
+        Index("ix_notificaciones_estado_programada", "estado", "programada_para"),
+    )
     
     id = Column(Integer, primary_key=True, autoincrement="auto")
     usuario_id = Column(Integer, ForeignKey("usuarios.id"))
@@ -168,6 +258,9 @@ class Notificacion(Base):
     enviada_en = Column(DateTime, default=lambda: datetime.now(timezone.utc), nullable=False)
     estado = Column(Enum("pendiente", "enviada", "fallida", "leida", name="estado_notificacion"), default="pendiente")
     datos_extra = Column(JSON)
+    # Envíos fallidos y fin del lease o de la espera antes del próximo intento (utils/despacho.py)
+    intentos = Column(Integer, default=0, nullable=False)
+    bloqueada_hasta = Column(DateTime)
     created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc), nullable=False)
     
-    usuario = relationship("Usuario", back_populates="notificaciones")
\ No newline at end of file
+    usuario = relationship("Usuario", back_populates="notificaciones", lazy="raise")
\ No newline at end of file
@@ -1,6 +1,6 @@
 from pydantic import BaseModel, Field, EmailStr, field_validator
 from datetime import date, datetime
-from typing import Optional
+from typing import Optional, List
 from enum import Enum
 
 # --------------------------
@@ -182,6 +182,7 @@ class UsuarioResponse(UsuarioBase):
 class CuentaResponse(CuentaBase):
     id: int
     usuario_id: int
+    saldo_actual: Optional[float] = None
     created_at: datetime
     updated_at: datetime
     
@@ -212,6 +213,8 @@ class PresupuestoResponse(PresupuestoBase):
     id: int
     usuario_id: int
     categoria_id: int
+    gastado: Optional[float] = None
+    nivel_alertado: Optional[int] = None
     created_at: datetime
     updated_at: datetime
     categoria: Optional[CategoriaResponse]
@@ -241,6 +244,31 @@ class NotificacionResponse(NotificacionBase):
     class Config:
         from_attributes = True
 
+class SaldoCuenta(BaseModel):
+    cuenta_id: int
+    saldo_inicial: float
+    saldo_actual: float
+
+# --------------------------
+# MODELOS DE PAGINACIÓN (cursor por clave)
+# --------------------------
+
+class PaginaBase(BaseModel):
+    next_cursor: Optional[str] = Field(None, description="Cursor para pedir la siguiente página; null si no hay más")
+    total_aproximado: Optional[int] = Field(None, description="Total acotado (solo si se pide incluir_total)")
+
+class TransaccionPagina(PaginaBase):
+    items: List[TransaccionResponse]
+
+class PresupuestoPagina(PaginaBase):
+    items: List[PresupuestoResponse]
+
+class PagoProgramadoPagina(PaginaBase):
+    items: List[PagoProgramadoResponse]
+
+class NotificacionPagina(PaginaBase):
+    items: List[NotificacionResponse]
+
 # --------------------------
 # MODELOS PARA AUTENTICACIÓN
 # --------------------------
@@ -248,6 +276,11 @@ class NotificacionResponse(NotificacionBase):
 class Token(BaseModel):
     access_token: str
     token_type: str
+    refresh_token: Optional[str] = None
+    expires_in: Optional[int] = Field(None, description="Segundos de vida del access token")
+
+class RefreshRequest(BaseModel):
+    refresh_token: str
 
 class TokenData(BaseModel):
     email: Optional[str] = None
@@ -273,6 +306,7 @@ class CategoriaResumen(BaseModel):
     color: Optional[str] = None
 
 class HistoricoMensual(BaseModel):
+    ano: Optional[int] = None
     mes: str
     ingresos: float
     gastos: float
@@ -1,53 +1,153 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, status
 from fastapi.security import OAuth2PasswordRequestForm
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+import logging
+from sqlalchemy import select, update, delete
 from datetime import timedelta, datetime, timezone
 from DB.conexion import get_db
-from models.modelsDB import Usuario
-from modelsPydantic import Token, UsuarioCreate, PasswordResetRequest, PasswordResetConfirm
+from models.modelsDB import Usuario, AuthToken
+from modelsPydantic import Token, RefreshRequest, UsuarioCreate, PasswordResetRequest, PasswordResetConfirm
+from utils.hashing import hash_password
 from utils.security import (
-    get_password_hash,
     create_access_token,
+    create_refresh_token,
+    hash_refresh_token,
+    verify_token_cached,
     authenticate_user,
     verify_password_reset_token
 )
+from utils.revocacion import revocar_access_token
+from utils.limitador import comprobar_limite, reiniciar_limite, ip_cliente
+from routers.dependencies import invalidar_identidad, oauth2_scheme
 from config import settings
 
 router = APIRouter(tags=["Autenticación"], prefix="/api/auth")
 
+logger = logging.getLogger("lana.auth")
+
+async def _emitir_tokens(db: AsyncSession, user: Usuario, familia: str = None) -> dict:
+    """
+    Access token corto + refresh token nuevo. Hace commit.
+    """
+    access_token = create_access_token(
+        # uid permite resolver el usuario sin buscarlo por email
+        data={"sub": user.email, "uid": user.id},
+        expires_delta=timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
+    )
+    refresh_token = await create_refresh_token(db, user.id, familia)
+    await db.commit()
+    return {
+        "access_token": access_token,
+        "token_type": "bearer",
+        "refresh_token": refresh_token,
+        "expires_in": settings.ACCESS_TOKEN_EXPIRE_MINUTES * 60,
+    }
+
 @router.post("/login", response_model=Token)
 async def login(
+    peticion: Request,
     form_data: OAuth2PasswordRequestForm = Depends(),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
-    user = authenticate_user(db, form_data.username, form_data.password)
+    # Antes de bcrypt: un intento rechazado aquí no consume CPU
+    await comprobar_limite(
+        "login", ip_cliente(peticion), form_data.username,
+        settings.LIMITE_LOGIN_POR_IP, settings.LIMITE_LOGIN_POR_EMAIL, settings.LIMITE_LOGIN_VENTANA_S
+    )
+    user = await authenticate_user(db, form_data.username, form_data.password)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Credenciales incorrectas",
             headers={"WWW-Authenticate": "Bearer"},
         )
-    access_token_expires = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
-    access_token = create_access_token(
-        data={"sub": user.email},
-        expires_delta=access_token_expires
+    await reiniciar_limite("login", form_data.username)
+    return await _emitir_tokens(db, user)
+
+@router.post("/refresh", response_model=Token)
+async def refresh(
+    request: RefreshRequest,
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Cambia un refresh token vigente por un par nuevo (rotación: el usado deja de
+    valer). No verifica la contraseña, así que no pasa por bcrypt.
+    """
+    invalido = HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Refresh token inválido o expirado",
+        headers={"WWW-Authenticate": "Bearer"},
     )
-    return {"access_token": access_token, "token_type": "bearer"}
+    token = hash_refresh_token(request.refresh_token)
+    # Reclamo atómico: de dos peticiones con el mismo token solo una cambia la fila
+    reclamado = (await db.execute(update(AuthToken).where(
+        AuthToken.token == token,
+        AuthToken.tipo == "refresh",
+        AuthToken.expires_at > datetime.utcnow()
+    ).values(tipo="usado").returning(
+        AuthToken.usuario_id, AuthToken.familia
+    ).execution_options(synchronize_session=False))).first()
+
+    if reclamado is None:
+        familia = await db.scalar(select(AuthToken.familia).filter(
+            AuthToken.token == token,
+            AuthToken.tipo == "usado"
+        ))
+        if familia is not None:
+            # Un token ya rotado vuelve a usarse: pudo filtrarse, se cierra toda la sesión
+            await db.execute(delete(AuthToken).where(AuthToken.familia == familia))
+            await db.commit()
+            logger.warning("Refresh token reutilizado: familia %s revocada", familia)
+        raise invalido
+
+    user = await db.get(Usuario, reclamado.usuario_id) if reclamado.usuario_id else None
+    if user is None:
+        raise invalido
+    return await _emitir_tokens(db, user, reclamado.familia)
+
+@router.post("/logout", status_code=status.HTTP_204_NO_CONTENT)
+async def logout(
+    request: RefreshRequest = None,
+    token: str = Depends(oauth2_scheme),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Revoca el access token actual y, si se envía, el refresh token de la sesión.
+    """
+    payload = verify_token_cached(token)
+    if payload is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="No se pudieron validar las credenciales",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    if request is not None:
+        # Toda la familia del token: el vigente y los ya rotados
+        familia = select(AuthToken.familia).where(
+            AuthToken.token == hash_refresh_token(request.refresh_token),
+            AuthToken.tipo.in_(("refresh", "usado")),
+            AuthToken.usuario_id == payload.get("uid")
+        ).scalar_subquery()
+        await db.execute(delete(AuthToken).where(AuthToken.familia == familia))
+    if payload.get("jti"):
+        await revocar_access_token(db, payload["jti"], datetime.utcfromtimestamp(payload["exp"]))
+    else:
+        await db.commit()
 
 
 @router.post("/registro", status_code=status.HTTP_201_CREATED)
 async def registro(
     usuario: UsuarioCreate,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
-    db_user = db.query(Usuario).filter(Usuario.email == usuario.email).first()
+    db_user = await db.scalar(select(Usuario).filter(Usuario.email == usuario.email))
     if db_user:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="El email ya está registrado"
         )
     
-    hashed_password = get_password_hash(usuario.password)
+    hashed_password = await hash_password(usuario.password)
     db_user = Usuario(
         nombre=usuario.nombre,
         email=usuario.email,
@@ -57,16 +157,20 @@ async def registro(
         updated_at=datetime.now(timezone.utc) 
     )
     db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
+    await db.commit()
     return {"message": "Usuario creado exitosamente"}
 
 @router.post("/olvide-contrasena")
 async def olvide_contrasena(
     request: PasswordResetRequest,
-    db: Session = Depends(get_db)
+    peticion: Request,
+    db: AsyncSession = Depends(get_db)
 ):
-    user = db.query(Usuario).filter(Usuario.email == request.email).first()
+    await comprobar_limite(
+        "olvide", ip_cliente(peticion), request.email,
+        settings.LIMITE_OLVIDE_POR_IP, settings.LIMITE_OLVIDE_POR_EMAIL, settings.LIMITE_OLVIDE_VENTANA_S
+    )
+    user = await db.scalar(select(Usuario).filter(Usuario.email == request.email))
     if user:
         # En producción, enviar email con token de recuperación
         reset_token = create_access_token(data={"sub": user.email})
@@ -76,7 +180,7 @@ async def olvide_contrasena(
 @router.post("/restablecer-contrasena")
 async def restablecer_contrasena(
     confirm: PasswordResetConfirm,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     email = verify_password_reset_token(confirm.token)
     if not email:
@@ -85,14 +189,20 @@ async def restablecer_contrasena(
             detail="Token inválido o expirado"
         )
     
-    user = db.query(Usuario).filter(Usuario.email == email).first()
+    user = await db.scalar(select(Usuario).filter(Usuario.email == email))
     if not user:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Usuario no encontrado"
         )
     
-    hashed_password = get_password_hash(confirm.new_password)
+    hashed_password = await hash_password(confirm.new_password)
     user.password = hashed_password
-    db.commit()
+    # Cierra las sesiones abiertas: los refresh tokens emitidos dejan de valer
+    await db.execute(delete(AuthToken).where(
+        AuthToken.usuario_id == user.id,
+        AuthToken.tipo.in_(("refresh", "usado"))
+    ))
+    await db.commit()
+    invalidar_identidad(user.id)
     return {"message": "Contraseña actualizada exitosamente"}
\ No newline at end of file
@@ -1,7 +1,8 @@
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, func
 from typing import List
-from DB.conexion import get_db
+from DB.conexion import get_db, get_read_db
 from models.modelsDB import Categoria, Usuario, Transaccion, Presupuesto, PagoProgramado
 from modelsPydantic import CategoriaCreate, CategoriaResponse, CategoriaUpdate
 from routers.dependencies import get_current_user
@@ -14,14 +15,14 @@ router = APIRouter(
 @router.post("/", response_model=CategoriaResponse, status_code=status.HTTP_201_CREATED)
 async def crear_categoria(
     categoria: CategoriaCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: Usuario = Depends(get_current_user)
 ):
     # Verificar si ya existe una categoría con el mismo nombre y tipo
-    existente = db.query(Categoria).filter(
+    existente = await db.scalar(select(Categoria).filter(
         Categoria.nombre == categoria.nombre,
         Categoria.tipo == categoria.tipo
-    ).first()
+    ))
     
     if existente:
         raise HTTPException(
@@ -34,30 +35,31 @@ async def crear_categoria(
         tipo=categoria.tipo
     )
     db.add(db_categoria)
-    db.commit()
-    db.refresh(db_categoria)
+    await db.commit()
+    await db.refresh(db_categoria)
     return db_categoria
 
 @router.get("/", response_model=List[CategoriaResponse])
 async def listar_categorias(
     tipo: str = None,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_read_db)
 ):
-    query = db.query(Categoria)
+    query = select(Categoria)
     
     if tipo:
         query = query.filter(Categoria.tipo == tipo)
     
-    return query.order_by(Categoria.tipo, Categoria.nombre).all()
+    resultado = await db.scalars(query.order_by(Categoria.tipo, Categoria.nombre))
+    return resultado.all()
 
 @router.get("/{categoria_id}", response_model=CategoriaResponse)
 async def obtener_categoria(
     categoria_id: int,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_read_db)
 ):
-    categoria = db.query(Categoria).filter(
+    categoria = await db.scalar(select(Categoria).filter(
         Categoria.id == categoria_id
-    ).first()
+    ))
     
     if not categoria:
         raise HTTPException(
@@ -70,11 +72,11 @@ async def obtener_categoria(
 async def actualizar_categoria(
     categoria_id: int,
     categoria: CategoriaUpdate,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
-    db_categoria = db.query(Categoria).filter(
+    db_categoria = await db.scalar(select(Categoria).filter(
         Categoria.id == categoria_id
-    ).first()
+    ))
     
     if not db_categoria:
         raise HTTPException(
@@ -84,10 +86,10 @@ async def actualizar_categoria(
     
     # Verificar si el nuevo nombre ya existe (si se está actualizando)
     if categoria.nombre and categoria.nombre != db_categoria.nombre:
-        existente = db.query(Categoria).filter(
+        existente = await db.scalar(select(Categoria).filter(
             Categoria.nombre == categoria.nombre,
             Categoria.tipo == (categoria.tipo or db_categoria.tipo)
-        ).first()
+        ))
         if existente:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
@@ -98,18 +100,18 @@ async def actualizar_categoria(
     for field, value in update_data.items():
         setattr(db_categoria, field, value)
     
-    db.commit()
-    db.refresh(db_categoria)
+    await db.commit()
+    await db.refresh(db_categoria)
     return db_categoria
 
 @router.delete("/{categoria_id}")
 async def eliminar_categoria(
     categoria_id: int,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
-    categoria = db.query(Categoria).filter(
+    categoria = await db.scalar(select(Categoria).filter(
         Categoria.id == categoria_id
-    ).first()
+    ))
     
     if not categoria:
         raise HTTPException(
@@ -118,17 +120,17 @@ async def eliminar_categoria(
         )
     
     # Verificar si hay transacciones, presupuestos o pagos programados asociados
-    transacciones = db.query(Transaccion).filter(
+    transacciones = await db.scalar(select(func.count(Transaccion.id)).filter(
         Transaccion.categoria_id == categoria_id
-    ).count()
+    ))
     
-    presupuestos = db.query(Presupuesto).filter(
+    presupuestos = await db.scalar(select(func.count(Presupuesto.id)).filter(
         Presupuesto.categoria_id == categoria_id
-    ).count()
+    ))
     
-    pagos = db.query(PagoProgramado).filter(
+    pagos = await db.scalar(select(func.count(PagoProgramado.id)).filter(
         PagoProgramado.categoria_id == categoria_id
-    ).count()
+    ))
     
     if transacciones > 0 or presupuestos > 0 or pagos > 0:
         raise HTTPException(
@@ -136,6 +138,6 @@ async def eliminar_categoria(
             detail="No se puede eliminar una categoría con transacciones, presupuestos o pagos programados asociados"
         )
     
-    db.delete(categoria)
-    db.commit()
+    await db.delete(categoria)
+    await db.commit()
     return {"message": "Categoría eliminada exitosamente"}
\ No newline at end of file
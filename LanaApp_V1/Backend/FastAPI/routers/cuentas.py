@@ -1,10 +1,11 @@
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, func, update
 from typing import List
-from DB.conexion import get_db
-from models.modelsDB import Cuenta, Usuario, Transaccion
-from modelsPydantic import CuentaCreate, CuentaResponse, CuentaUpdate
-from routers.dependencies import get_current_user
+from DB.conexion import get_db, get_read_db
+from models.modelsDB import Cuenta, Usuario, Transaccion, PagoProgramado
+from modelsPydantic import CuentaCreate, CuentaResponse, CuentaUpdate, SaldoCuenta
+from routers.dependencies import get_current_user, etag_datos
 
 router = APIRouter(
     prefix="/cuentas",
@@ -14,14 +15,14 @@ router = APIRouter(
 @router.post("/", response_model=CuentaResponse, status_code=status.HTTP_201_CREATED)
 async def crear_cuenta(
     cuenta: CuentaCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: Usuario = Depends(get_current_user)
 ):
     # Verificar si ya existe una cuenta con el mismo nombre para este usuario
-    existente = db.query(Cuenta).filter(
+    existente = await db.scalar(select(Cuenta).filter(
         Cuenta.usuario_id == current_user.id,
         Cuenta.nombre == cuenta.nombre
-    ).first()
+    ))
     
     if existente:
         raise HTTPException(
@@ -33,32 +34,59 @@ async def crear_cuenta(
         usuario_id=current_user.id,
         nombre=cuenta.nombre,
         tipo=cuenta.tipo,
-        saldo_inicial=cuenta.saldo_inicial
+        saldo_inicial=cuenta.saldo_inicial,
+        saldo_actual=cuenta.saldo_inicial or 0
     )
     db.add(db_cuenta)
-    db.commit()
-    db.refresh(db_cuenta)
+    await db.commit()
+    await db.refresh(db_cuenta)
     return db_cuenta
 
-@router.get("/", response_model=List[CuentaResponse])
+@router.get("/", response_model=List[CuentaResponse], dependencies=[Depends(etag_datos("finanzas"))])
 async def listar_cuentas(
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
     current_user: Usuario = Depends(get_current_user)
 ):
-    return db.query(Cuenta).filter(
+    resultado = await db.scalars(select(Cuenta).filter(
         Cuenta.usuario_id == current_user.id
-    ).order_by(Cuenta.nombre).all()
+    ).order_by(Cuenta.nombre))
+    return resultado.all()
+
+@router.get("/{cuenta_id}/saldo", response_model=SaldoCuenta)
+async def obtener_saldo(
+    cuenta_id: int,
+    db: AsyncSession = Depends(get_read_db),
+    current_user: Usuario = Depends(get_current_user)
+):
+    # saldo_actual se mantiene en cada movimiento: no se suman transacciones
+    fila = (await db.execute(select(
+        Cuenta.id, Cuenta.saldo_inicial, Cuenta.saldo_actual
+    ).filter(
+        Cuenta.id == cuenta_id,
+        Cuenta.usuario_id == current_user.id
+    ))).first()
+
+    if not fila:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Cuenta no encontrada"
+        )
+    return {
+        "cuenta_id": fila.id,
+        "saldo_inicial": float(fila.saldo_inicial or 0),
+        "saldo_actual": float(fila.saldo_actual or 0)
+    }
 
 @router.get("/{cuenta_id}", response_model=CuentaResponse)
 async def obtener_cuenta(
     cuenta_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
     current_user: Usuario = Depends(get_current_user)
 ):
-    cuenta = db.query(Cuenta).filter(
+    cuenta = await db.scalar(select(Cuenta).filter(
         Cuenta.id == cuenta_id,
         Cuenta.usuario_id == current_user.id
-    ).first()
+    ))
     
     if not cuenta:
         raise HTTPException(
@@ -71,13 +99,13 @@ async def obtener_cuenta(
 async def actualizar_cuenta(
     cuenta_id: int,
     cuenta: CuentaUpdate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: Usuario = Depends(get_current_user)
 ):
-    db_cuenta = db.query(Cuenta).filter(
+    db_cuenta = await db.scalar(select(Cuenta).filter(
         Cuenta.id == cuenta_id,
         Cuenta.usuario_id == current_user.id
-    ).first()
+    ))
     
     if not db_cuenta:
         raise HTTPException(
@@ -87,10 +115,10 @@ async def actualizar_cuenta(
     
     # Verificar si el nuevo nombre ya existe (si se está actualizando)
     if cuenta.nombre and cuenta.nombre != db_cuenta.nombre:
-        existente = db.query(Cuenta).filter(
+        existente = await db.scalar(select(Cuenta).filter(
             Cuenta.usuario_id == current_user.id,
             Cuenta.nombre == cuenta.nombre
-        ).first()
+        ))
         if existente:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
@@ -98,23 +126,27 @@ async def actualizar_cuenta(
             )
     
     update_data = cuenta.dict(exclude_unset=True)
+    if update_data.get("saldo_inicial") is not None:
+        # El saldo actual se desplaza lo mismo que el inicial, en el mismo UPDATE
+        diferencia = update_data["saldo_inicial"] - float(db_cuenta.saldo_inicial or 0)
+        db_cuenta.saldo_actual = Cuenta.saldo_actual + diferencia
     for field, value in update_data.items():
         setattr(db_cuenta, field, value)
     
-    db.commit()
-    db.refresh(db_cuenta)
+    await db.commit()
+    await db.refresh(db_cuenta)
     return db_cuenta
 
 @router.delete("/{cuenta_id}")
 async def eliminar_cuenta(
     cuenta_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: Usuario = Depends(get_current_user)
 ):
-    cuenta = db.query(Cuenta).filter(
+    cuenta = await db.scalar(select(Cuenta).filter(
         Cuenta.id == cuenta_id,
         Cuenta.usuario_id == current_user.id
-    ).first()
+    ))
     
     if not cuenta:
         raise HTTPException(
@@ -123,9 +155,9 @@ async def eliminar_cuenta(
         )
     
     # Verificar si hay transacciones asociadas
-    transacciones = db.query(Transaccion).filter(
+    transacciones = await db.scalar(select(func.count(Transaccion.id)).filter(
         Transaccion.cuenta_id == cuenta_id
-    ).count()
+    ))
     
     if transacciones > 0:
         raise HTTPException(
@@ -133,6 +165,10 @@ async def eliminar_cuenta(
             detail="No se puede eliminar una cuenta con transacciones asociadas"
         )
     
-    db.delete(cuenta)
-    db.commit()
+    # Las colecciones no se cargan al borrar (passive_deletes): se desvinculan en bloque
+    await db.execute(update(PagoProgramado).where(
+        PagoProgramado.cuenta_id == cuenta_id
+    ).values(cuenta_id=None))
+    await db.delete(cuenta)
+    await db.commit()
     return {"message": "Cuenta eliminada exitosamente"}
\ No newline at end of file
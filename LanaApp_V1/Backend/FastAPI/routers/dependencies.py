@@ -1,17 +1,39 @@
-from fastapi import Depends, HTTPException, status
+import hashlib
+from fastapi import Depends, HTTPException, Request, Response, status
 from fastapi.security import OAuth2PasswordBearer
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select
+from sqlalchemy.orm import make_transient_to_detached
 from jose import JWTError
-from DB.conexion import get_db
-from models.modelsDB import Usuario
+from DB.conexion import get_read_db
+from models.modelsDB import Usuario, Cuenta, Categoria
 from modelsPydantic import TokenData
-from utils.security import verify_token
+from utils.cache import CacheLRU
+from utils.security import verify_token_cached
+from utils.revocacion import esta_revocado
+from config import settings
+from utils.versiones import version_datos
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="api/auth/login")
 
+# Usuarios por id, por worker: evita la consulta a la base en cada petición autenticada.
+# Se guardan las columnas y cada petición recibe su propia instancia (desligada de sesiones).
+_identidades = CacheLRU(settings.AUTH_CACHE_USUARIOS_MAX, settings.AUTH_CACHE_USUARIOS_TTL_S)
+
+def invalidar_identidad(usuario_id: int):
+    """
+    Llamar después del commit que modifica o elimina al usuario.
+    """
+    _identidades.invalidar(usuario_id)
+
+def _instancia_usuario(columnas: dict) -> Usuario:
+    user = Usuario(**columnas)
+    make_transient_to_detached(user)
+    return user
+
 async def get_current_user(
     token: str = Depends(oauth2_scheme),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_read_db)
 ) -> Usuario:
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
@@ -19,9 +41,12 @@ async def get_current_user(
         headers={"WWW-Authenticate": "Bearer"},
     )
     try:
-        payload = verify_token(token)
+        payload = verify_token_cached(token)
         if payload is None:
             raise credentials_exception
+        # Sin consulta: filtro de Bloom en memoria (utils/revocacion.py)
+        if payload.get("jti") and esta_revocado(payload["jti"]):
+            raise credentials_exception
             
         email: str = payload.get("sub")
         if email is None:
@@ -29,8 +54,71 @@ async def get_current_user(
         token_data = TokenData(email=email)
     except JWTError:
         raise credentials_exception
-    
-    user = db.query(Usuario).filter(Usuario.email == token_data.email).first()
+
+    usuario_id = payload.get("uid")
+    if usuario_id is not None:
+        columnas = _identidades.obtener(usuario_id)
+        if columnas is not None:
+            return _instancia_usuario(columnas)
+        user = await db.get(Usuario, usuario_id)
+    else:
+        # Tokens emitidos antes de incluir uid
+        user = await db.scalar(select(Usuario).filter(Usuario.email == token_data.email))
     if user is None:
         raise credentials_exception
-    return user
\ No newline at end of file
+
+    _identidades.guardar(user.id, {
+        columna.key: getattr(user, columna.key) for columna in Usuario.__table__.columns
+    })
+    return user
+
+
+async def verificar_referencias(db: AsyncSession, usuario_id: int, cuenta_id: int, categoria_id: int):
+    """
+    404 si la cuenta no es del usuario o la categoría no existe (las categorías son globales).
+    """
+    cuenta = await db.scalar(select(Cuenta.id).filter(
+        Cuenta.id == cuenta_id,
+        Cuenta.usuario_id == usuario_id
+    ))
+    if cuenta is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Cuenta no encontrada"
+        )
+    if categoria_id is not None and await db.scalar(select(Categoria.id).filter(Categoria.id == categoria_id)) is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Categoría no encontrada"
+        )
+
+
+def etag_datos(*dominios: str):
+    """
+    Dependencia para GETs condicionales. El ETag sale de la URL, el usuario y la
+    versión de los dominios de datos (utils/versiones.py); si coincide con
+    If-None-Match se responde 304 sin ejecutar la consulta ni serializar.
+    """
+    async def _etag(
+        request: Request,
+        response: Response,
+        db: AsyncSession = Depends(get_read_db),
+        current_user: Usuario = Depends(get_current_user)
+    ):
+        huella = repr((
+            request.url.path,
+            request.url.query,
+            current_user.id,
+            await version_datos(db, current_user.id, *dominios)
+        ))
+        etag = '"' + hashlib.sha1(huella.encode()).hexdigest() + '"'
+        cabeceras = {"ETag": etag, "Cache-Control": "private, no-cache"}
+
+        if_none_match = request.headers.get("if-none-match")
+        if if_none_match:
+            candidatos = {c.strip().removeprefix("W/") for c in if_none_match.split(",")}
+            if etag in candidatos or "*" in candidatos:
+                raise HTTPException(status_code=status.HTTP_304_NOT_MODIFIED, headers=cabeceras)
+
+        response.headers.update(cabeceras)
+    return _etag
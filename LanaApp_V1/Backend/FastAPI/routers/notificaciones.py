@@ -1,12 +1,18 @@
 from fastapi import APIRouter, Depends, HTTPException, status, Query
-from sqlalchemy.orm import Session
-from sqlalchemy import func, extract
-from datetime import date  
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, update, func, or_, and_
+from sqlalchemy.orm import joinedload
+from datetime import date, datetime
 from typing import List, Optional
-from DB.conexion import get_db
-from models.modelsDB import Notificacion, Usuario, Categoria, Presupuesto, Transaccion
-from modelsPydantic import NotificacionResponse, TipoNotificacion
-from routers.dependencies import get_current_user
+from DB.conexion import get_db, get_read_db
+from models.modelsDB import Notificacion, Usuario, Categoria, Presupuesto
+from modelsPydantic import NotificacionCreate, NotificacionResponse, NotificacionPagina, TipoNotificacion
+from routers.dependencies import get_current_user, etag_datos
+from utils.paginacion import codificar_cursor, decodificar_cursor, filtro_cursor, contar_aproximado
+from utils.presupuestos import nivel_alcanzado, NIVELES
+from utils.versiones import registrar_cambio
+from utils.despacho import despertar
+from utils.programador import hora_utc
 
 router = APIRouter(
     prefix="/notificaciones",
@@ -17,16 +23,16 @@ router = APIRouter(
 #     tags=["Notificaciones"]
 # )
 
-@router.get("/", response_model=List[NotificacionResponse])
+@router.get("/", response_model=List[NotificacionResponse], dependencies=[Depends(etag_datos("notificaciones"))])
 async def listar_notificaciones(
     leidas: bool = None,
     tipo: Optional[TipoNotificacion] = None,
     limit: int = Query(50, ge=1, le=1000),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
     current_user: Usuario = Depends(get_current_user)
 ):
 
-    query = db.query(Notificacion).filter(
+    query = select(Notificacion).filter(
         Notificacion.usuario_id == current_user.id
     )
     
@@ -42,9 +48,9 @@ async def listar_notificaciones(
         query = query.filter(Notificacion.tipo == tipo)
     
     # Orden y límite
-    notificaciones = query.order_by(
+    notificaciones = (await db.scalars(query.order_by(
         Notificacion.programada_para.desc()
-    ).limit(limit).all()
+    ).limit(limit))).all()
     
     # Asegurar que datos_extra sea un diccionario válido
     for notif in notificaciones:
@@ -53,26 +59,82 @@ async def listar_notificaciones(
     
     return notificaciones
 
-@router.get("/pendientes", response_model=List[NotificacionResponse])
+@router.get("/pendientes", response_model=NotificacionPagina)
 async def listar_notificaciones_pendientes(
-    db: Session = Depends(get_db),
+    limit: int = Query(50, ge=1, le=1000),
+    cursor: str = Query(None, description="next_cursor de la página anterior"),
+    incluir_total: bool = False,
+    db: AsyncSession = Depends(get_read_db),
     current_user: Usuario = Depends(get_current_user)
 ):
-    return db.query(Notificacion).filter(
+    query = select(Notificacion).filter(
         Notificacion.usuario_id == current_user.id,
         Notificacion.estado == "pendiente"
-    ).order_by(Notificacion.programada_para.asc()).all()
+    )
+
+    total_aproximado = await contar_aproximado(db, query) if incluir_total else None
+
+    if cursor:
+        cursor_programada, cursor_id = decodificar_cursor(cursor, datetime.fromisoformat, int)
+        if cursor_programada is None:
+            # En SQLite los NULL van primero en orden ascendente
+            query = query.filter(or_(
+                and_(Notificacion.programada_para.is_(None), Notificacion.id > cursor_id),
+                Notificacion.programada_para.isnot(None)
+            ))
+        else:
+            query = query.filter(filtro_cursor(
+                (Notificacion.programada_para, Notificacion.id), (cursor_programada, cursor_id)
+            ))
+
+    notificaciones = (await db.scalars(query.order_by(
+        Notificacion.programada_para.asc(), Notificacion.id.asc()
+    ).limit(limit + 1))).all()
+
+    next_cursor = None
+    if len(notificaciones) > limit:
+        notificaciones = notificaciones[:limit]
+        next_cursor = codificar_cursor(notificaciones[-1].programada_para, notificaciones[-1].id)
+
+    return {
+        "items": notificaciones,
+        "next_cursor": next_cursor,
+        "total_aproximado": total_aproximado
+    }
+
+@router.post("/", response_model=NotificacionResponse, status_code=status.HTTP_201_CREATED)
+async def programar_notificacion(
+    notificacion: NotificacionCreate,
+    db: AsyncSession = Depends(get_db),
+    current_user: Usuario = Depends(get_current_user)
+):
+    # Recordatorio del usuario: el despacho la envía al llegar programada_para
+    # (utils/programador.py la toma al hacer commit)
+    db_notificacion = Notificacion(
+        usuario_id=current_user.id,
+        tipo=notificacion.tipo,
+        medio=notificacion.medio,
+        mensaje=notificacion.mensaje,
+        programada_para=hora_utc(notificacion.programada_para),
+        datos_extra=notificacion.datos_extra or {},
+        estado="pendiente"
+    )
+    db.add(db_notificacion)
+    await db.commit()
+    despertar()
+    return db_notificacion
 
 @router.get("/{notificacion_id}", response_model=NotificacionResponse)
 async def obtener_notificacion(
     notificacion_id: int,
-    db: Session = Depends(get_db),
+    # Sesión de escritura: al abrirla se marca como leída
+    db: AsyncSession = Depends(get_db),
     current_user: Usuario = Depends(get_current_user)
 ):
-    notificacion = db.query(Notificacion).filter(
+    notificacion = await db.scalar(select(Notificacion).filter(
         Notificacion.id == notificacion_id,
         Notificacion.usuario_id == current_user.id
-    ).first()
+    ))
     
     if not notificacion:
         raise HTTPException(
@@ -80,23 +142,23 @@ async def obtener_notificacion(
             detail="Notificación no encontrada"
         )
     
-    if notificacion.estado == "pendiente":
+    if notificacion.estado in ("pendiente", "enviada"):
         notificacion.estado = "leida"
-        db.commit()
-        db.refresh(notificacion)
+        await db.commit()
+        await db.refresh(notificacion)
     
     return notificacion
 
 @router.post("/{notificacion_id}/marcar-leida")
 async def marcar_notificacion_leida(
     notificacion_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: Usuario = Depends(get_current_user)
 ):
-    notificacion = db.query(Notificacion).filter(
+    notificacion = await db.scalar(select(Notificacion).filter(
         Notificacion.id == notificacion_id,
         Notificacion.usuario_id == current_user.id
-    ).first()
+    ))
     
     if not notificacion:
         raise HTTPException(
@@ -106,20 +168,20 @@ async def marcar_notificacion_leida(
     
     if notificacion.estado != "leida":
         notificacion.estado = "leida"
-        db.commit()
+        await db.commit()
     
     return {"message": "Notificación marcada como leída"}
 
 @router.delete("/{notificacion_id}")
 async def eliminar_notificacion(
     notificacion_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: Usuario = Depends(get_current_user)
 ):
-    notificacion = db.query(Notificacion).filter(
+    notificacion = await db.scalar(select(Notificacion).filter(
         Notificacion.id == notificacion_id,
         Notificacion.usuario_id == current_user.id
-    ).first()
+    ))
     
     if not notificacion:
         raise HTTPException(
@@ -127,63 +189,63 @@ async def eliminar_notificacion(
             detail="Notificación no encontrada"
         )
     
-    db.delete(notificacion)
-    db.commit()
+    await db.delete(notificacion)
+    await db.commit()
     return {"message": "Notificación eliminada correctamente"}
 
 async def verificar_presupuestos(
-    db: Session, 
+    db: AsyncSession, 
     usuario_id: int, 
     categoria_id: int, 
-    fecha: date, 
-    monto: float
+    ano: int, 
+    mes: int
 ):
-    # Obtener presupuesto del mes actual para esta categoría
-    presupuesto = db.query(Presupuesto).filter(
+    # Lo llama el worker de utils/alertas.py, fuera de la petición que creó la transacción.
+    # gastado ya está al día: sin agregados, una fila de presupuestos.
+    # La categoria se usa en el mensaje de la alerta
+    presupuesto = await db.scalar(select(Presupuesto).options(
+        joinedload(Presupuesto.categoria)
+    ).filter(
         Presupuesto.usuario_id == usuario_id,
         Presupuesto.categoria_id == categoria_id,
-        Presupuesto.mes == fecha.month,
-        Presupuesto.ano == fecha.year
-    ).first()
+        Presupuesto.mes == mes,
+        Presupuesto.ano == ano
+    ))
 
     if not presupuesto:
         return
 
-    # Calcular gasto acumulado
-    gasto_total = db.query(
-        func.sum(Transaccion.monto)
-    ).join(
-        Categoria, Transaccion.categoria_id == Categoria.id
-    ).filter(
-        Transaccion.usuario_id == usuario_id,
-        Transaccion.categoria_id == categoria_id,
-        extract('month', Transaccion.fecha) == fecha.month,
-        extract('year', Transaccion.fecha) == fecha.year,
-        Categoria.tipo == 'gasto'
-    ).scalar() or 0
-
-    porcentaje_utilizado = (gasto_total / presupuesto.limite) * 100
-
-    # Verificar alertas
-    if porcentaje_utilizado >= 100 and presupuesto.alerta_100:
-        await crear_notificacion(
-            db=db,
-            usuario_id=usuario_id,
-            tipo="presupuesto_excedido",
-            mensaje=f"Presupuesto excedido al 100% para {presupuesto.categoria.nombre}",
-            metadata={"nivel": "100%", "categoria_id": categoria_id}
-        )
-    elif porcentaje_utilizado >= 80 and presupuesto.alerta_80:
-        await crear_notificacion(
-            db=db,
-            usuario_id=usuario_id,
-            tipo="presupuesto_excedido",
-            mensaje=f"Presupuesto alcanzó el 80% para {presupuesto.categoria.nombre}",
-            metadata={"nivel": "80%", "categoria_id": categoria_id}
-        )
+    # Mayor umbral alcanzado, con alerta activa y aún no enviado
+    alcanzado = nivel_alcanzado(presupuesto.gastado, presupuesto.limite)
+    activas = {100: presupuesto.alerta_100, 80: presupuesto.alerta_80}
+    nivel = next((n for n in NIVELES if n <= alcanzado and activas[n] and n > presupuesto.nivel_alertado), None)
+    if nivel is None:
+        return
+
+    # Se reclama el nivel con un UPDATE condicional: si otra evaluación ya lo
+    # envió, no afecta filas y no se repite la notificación
+    reclamado = await db.execute(update(Presupuesto).where(
+        Presupuesto.id == presupuesto.id,
+        Presupuesto.nivel_alertado < nivel
+    ).values(nivel_alertado=nivel))
+    if not reclamado.rowcount:
+        return
+    registrar_cambio(db, "presupuestos", usuario_id)
+
+    if nivel == 100:
+        mensaje = f"Presupuesto excedido al 100% para {presupuesto.categoria.nombre}"
+    else:
+        mensaje = f"Presupuesto alcanzó el 80% para {presupuesto.categoria.nombre}"
+    await crear_notificacion(
+        db=db,
+        usuario_id=usuario_id,
+        tipo="presupuesto_excedido",
+        mensaje=mensaje,
+        metadata={"nivel": f"{nivel}%", "categoria_id": categoria_id}
+    )
 
 async def crear_notificacion(
-    db: Session,
+    db: AsyncSession,
     usuario_id: int,
     tipo: str,
     mensaje: str,
@@ -197,4 +259,5 @@ async def crear_notificacion(
         estado="pendiente"
     )
     db.add(db_notificacion)
-    db.commit()
\ No newline at end of file
+    await db.commit()
+    despertar()
\ No newline at end of file
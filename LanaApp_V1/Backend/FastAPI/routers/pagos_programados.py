@@ -1,11 +1,18 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, status, Query
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select
+from sqlalchemy.orm import joinedload
 from typing import List
 from datetime import date, timedelta
-from DB.conexion import get_db
+from DB.conexion import get_db, get_read_db
 from models.modelsDB import PagoProgramado, Usuario, Transaccion
-from modelsPydantic import PagoProgramadoCreate, PagoProgramadoResponse, PagoProgramadoUpdate
-from routers.dependencies import get_current_user
+from modelsPydantic import PagoProgramadoCreate, PagoProgramadoResponse, PagoProgramadoUpdate, PagoProgramadoPagina
+from routers.dependencies import get_current_user, verificar_referencias
+from utils.paginacion import codificar_cursor, decodificar_cursor, filtro_cursor, contar_aproximado
+from utils.resumen_mensual import acumular_transacciones
+from utils.saldos import aplicar_transacciones
+from utils.presupuestos import acumular_gastos
+from utils.alertas import registrar_alerta, encolar_alerta
 
 router = APIRouter(
     prefix="/pagos-programados",
@@ -16,12 +23,17 @@ router = APIRouter(
 #     tags=["Pagos Programados"]
 # )
 
+# PagoProgramadoResponse anida cuenta y categoria
+CARGA_PAGO = (joinedload(PagoProgramado.cuenta), joinedload(PagoProgramado.categoria))
+RELACIONES_PAGO = ["cuenta", "categoria"]
+
 @router.post("/", response_model=PagoProgramadoResponse, status_code=status.HTTP_201_CREATED)
 async def crear_pago_programado(
     pago: PagoProgramadoCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: Usuario = Depends(get_current_user)
 ):
+    await verificar_referencias(db, current_user.id, pago.cuenta_id, pago.categoria_id)
     db_pago = PagoProgramado(
         usuario_id=current_user.id,
         cuenta_id=pago.cuenta_id,
@@ -34,47 +46,74 @@ async def crear_pago_programado(
         notificar_antes=pago.notificar_antes
     )
     db.add(db_pago)
-    db.commit()
-    db.refresh(db_pago)
+    await db.commit()
+    await db.refresh(db_pago, attribute_names=RELACIONES_PAGO)
     return db_pago
 
-@router.get("/", response_model=List[PagoProgramadoResponse])
+@router.get("/", response_model=PagoProgramadoPagina)
 async def listar_pagos_programados(
     activos: bool = True,
-    db: Session = Depends(get_db),
+    limit: int = Query(100, ge=1, le=500),
+    cursor: str = Query(None, description="next_cursor de la página anterior"),
+    incluir_total: bool = False,
+    db: AsyncSession = Depends(get_read_db),
     current_user: Usuario = Depends(get_current_user)
 ):
-    return db.query(PagoProgramado).filter(
+    query = select(PagoProgramado).filter(
         PagoProgramado.usuario_id == current_user.id,
         PagoProgramado.activo == activos
-    ).order_by(PagoProgramado.proxima_fecha).all()
+    )
+
+    total_aproximado = await contar_aproximado(db, query) if incluir_total else None
+
+    if cursor:
+        cursor_fecha, cursor_id = decodificar_cursor(cursor, date.fromisoformat, int)
+        query = query.filter(filtro_cursor(
+            (PagoProgramado.proxima_fecha, PagoProgramado.id), (cursor_fecha, cursor_id)
+        ))
+
+    pagos = (await db.scalars(query.options(*CARGA_PAGO).order_by(
+        PagoProgramado.proxima_fecha, PagoProgramado.id
+    ).limit(limit + 1))).all()
+
+    next_cursor = None
+    if len(pagos) > limit:
+        pagos = pagos[:limit]
+        next_cursor = codificar_cursor(pagos[-1].proxima_fecha, pagos[-1].id)
+
+    return {
+        "items": pagos,
+        "next_cursor": next_cursor,
+        "total_aproximado": total_aproximado
+    }
 
 @router.get("/proximos", response_model=List[PagoProgramadoResponse])
 async def listar_pagos_proximos(
     dias: int = 7,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
     current_user: Usuario = Depends(get_current_user)
 ):
     hoy = date.today()
     fecha_limite = hoy + timedelta(days=dias)
     
-    return db.query(PagoProgramado).filter(
+    resultado = await db.scalars(select(PagoProgramado).options(*CARGA_PAGO).filter(
         PagoProgramado.usuario_id == current_user.id,
         PagoProgramado.activo == True,
         PagoProgramado.proxima_fecha >= hoy,
         PagoProgramado.proxima_fecha <= fecha_limite
-    ).order_by(PagoProgramado.proxima_fecha).all()
+    ).order_by(PagoProgramado.proxima_fecha))
+    return resultado.all()
 
 @router.get("/{pago_id}", response_model=PagoProgramadoResponse)
 async def obtener_pago_programado(
     pago_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
     current_user: Usuario = Depends(get_current_user)
 ):
-    pago = db.query(PagoProgramado).filter(
+    pago = await db.scalar(select(PagoProgramado).options(*CARGA_PAGO).filter(
         PagoProgramado.id == pago_id,
         PagoProgramado.usuario_id == current_user.id
-    ).first()
+    ))
     
     if not pago:
         raise HTTPException(
@@ -87,13 +126,13 @@ async def obtener_pago_programado(
 async def actualizar_pago_programado(
     pago_id: int,
     pago_data: PagoProgramadoUpdate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: Usuario = Depends(get_current_user)
 ):
-    pago = db.query(PagoProgramado).filter(
+    pago = await db.scalar(select(PagoProgramado).filter(
         PagoProgramado.id == pago_id,
         PagoProgramado.usuario_id == current_user.id
-    ).first()
+    ))
     
     if not pago:
         raise HTTPException(
@@ -105,20 +144,20 @@ async def actualizar_pago_programado(
     for field, value in update_data.items():
         setattr(pago, field, value)
     
-    db.commit()
-    db.refresh(pago)
+    await db.commit()
+    await db.refresh(pago, attribute_names=RELACIONES_PAGO)
     return pago
 
 @router.delete("/{pago_id}")
 async def eliminar_pago_programado(
     pago_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: Usuario = Depends(get_current_user)
 ):
-    pago = db.query(PagoProgramado).filter(
+    pago = await db.scalar(select(PagoProgramado).filter(
         PagoProgramado.id == pago_id,
         PagoProgramado.usuario_id == current_user.id
-    ).first()
+    ))
     
     if not pago:
         raise HTTPException(
@@ -127,20 +166,21 @@ async def eliminar_pago_programado(
         )
     
     pago.activo = False
-    db.commit()
+    await db.commit()
     return {"message": "Pago programado desactivado correctamente"}
 
 @router.post("/procesar-pendientes")
 async def procesar_pagos_pendientes(
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     hoy = date.today()
-    pagos = db.query(PagoProgramado).filter(
+    pagos = (await db.scalars(select(PagoProgramado).filter(
         PagoProgramado.activo == True,
         PagoProgramado.proxima_fecha == hoy
-    ).all()
+    ))).all()
     
     resultados = []
+    transacciones = []
     
     for pago in pagos:
         # Crear transacción automática
@@ -153,6 +193,7 @@ async def procesar_pagos_pendientes(
             descripcion=f"Pago automático: {pago.descripcion}"
         )
         db.add(transaccion)
+        transacciones.append(transaccion)
         
         # Actualizar próxima fecha según frecuencia
         if pago.frecuencia == "mensual":
@@ -168,5 +209,14 @@ async def procesar_pagos_pendientes(
             "status": "procesado"
         })
     
-    db.commit()
+    await acumular_transacciones(db, transacciones)
+    await aplicar_transacciones(db, transacciones)
+    await acumular_gastos(db, transacciones)
+    # Una evaluación por (usuario, categoría, mes), como en crear_transaccion
+    alertas = {(t.usuario_id, t.categoria_id, t.fecha.replace(day=1)) for t in transacciones}
+    for usuario_id, categoria_id, fecha in alertas:
+        await registrar_alerta(db, usuario_id, categoria_id, fecha)
+    await db.commit()
+    for usuario_id, categoria_id, fecha in alertas:
+        encolar_alerta(usuario_id, categoria_id, fecha)
     return {"message": "Pagos procesados", "results": resultados}
\ No newline at end of file
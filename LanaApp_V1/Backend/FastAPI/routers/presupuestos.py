@@ -1,10 +1,15 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, status, Query
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select
+from sqlalchemy.orm import joinedload
+from sqlalchemy.exc import IntegrityError
 from typing import List
-from DB.conexion import get_db
+from DB.conexion import get_db, get_read_db
 from models.modelsDB import Presupuesto, Usuario
-from modelsPydantic import PresupuestoCreate, PresupuestoResponse, PresupuestoUpdate
-from routers.dependencies import get_current_user
+from modelsPydantic import PresupuestoCreate, PresupuestoResponse, PresupuestoUpdate, PresupuestoPagina
+from routers.dependencies import get_current_user, etag_datos
+from utils.paginacion import codificar_cursor, decodificar_cursor, filtro_cursor, contar_aproximado
+from utils.presupuestos import gasto_del_periodo, nivel_alcanzado
 
 router = APIRouter(
     prefix="/presupuestos",
@@ -15,19 +20,23 @@ router = APIRouter(
 #     tags=["Presupuestos"]
 # )
 
+# PresupuestoResponse anida la categoria
+CARGA_PRESUPUESTO = (joinedload(Presupuesto.categoria),)
+RELACIONES_PRESUPUESTO = ["categoria"]
+
 @router.post("/", response_model=PresupuestoResponse, status_code=status.HTTP_201_CREATED)
 async def crear_presupuesto(
     presupuesto: PresupuestoCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: Usuario = Depends(get_current_user)
 ):
     # Verificar si ya existe un presupuesto para esta categoría en el mes/año
-    existente = db.query(Presupuesto).filter(
+    existente = await db.scalar(select(Presupuesto).filter(
         Presupuesto.usuario_id == current_user.id,
         Presupuesto.categoria_id == presupuesto.categoria_id,
         Presupuesto.mes == presupuesto.mes,
         Presupuesto.ano == presupuesto.ano
-    ).first()
+    ))
     
     if existente:
         raise HTTPException(
@@ -42,21 +51,36 @@ async def crear_presupuesto(
         ano=presupuesto.ano,
         limite=presupuesto.limite,
         alerta_80=presupuesto.alerta_80,
-        alerta_100=presupuesto.alerta_100
+        alerta_100=presupuesto.alerta_100,
+        # Lo ya gastado en el periodo; después lo mantiene cada alta/baja
+        gastado=await gasto_del_periodo(
+            db, current_user.id, presupuesto.categoria_id, presupuesto.ano, presupuesto.mes
+        )
     )
     db.add(db_presupuesto)
-    db.commit()
-    db.refresh(db_presupuesto)
+    try:
+        await db.commit()
+    except IntegrityError:
+        # Otra petición creó el mismo periodo entre la verificación y el commit
+        await db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Ya existe un presupuesto para esta categoría en el periodo seleccionado"
+        )
+    await db.refresh(db_presupuesto, attribute_names=RELACIONES_PRESUPUESTO)
     return db_presupuesto
 
-@router.get("/", response_model=List[PresupuestoResponse])
+@router.get("/", response_model=PresupuestoPagina, dependencies=[Depends(etag_datos("presupuestos", "categorias"))])
 async def listar_presupuestos(
     mes: int = None,
     ano: int = None,
-    db: Session = Depends(get_db),
+    limit: int = Query(100, ge=1, le=500),
+    cursor: str = Query(None, description="next_cursor de la página anterior"),
+    incluir_total: bool = False,
+    db: AsyncSession = Depends(get_read_db),
     current_user: Usuario = Depends(get_current_user)
 ):
-    query = db.query(Presupuesto).filter(
+    query = select(Presupuesto).filter(
         Presupuesto.usuario_id == current_user.id
     )
     
@@ -65,31 +89,56 @@ async def listar_presupuestos(
     if ano:
         query = query.filter(Presupuesto.ano == ano)
     
-    return query.order_by(Presupuesto.ano.desc(), Presupuesto.mes.desc()).all()
+    total_aproximado = await contar_aproximado(db, query) if incluir_total else None
+
+    if cursor:
+        cursor_ano, cursor_mes, cursor_id = decodificar_cursor(cursor, int, int, int)
+        query = query.filter(filtro_cursor(
+            (Presupuesto.ano, Presupuesto.mes, Presupuesto.id),
+            (cursor_ano, cursor_mes, cursor_id),
+            descendente=True
+        ))
+
+    presupuestos = (await db.scalars(query.options(*CARGA_PRESUPUESTO).order_by(
+        Presupuesto.ano.desc(), Presupuesto.mes.desc(), Presupuesto.id.desc()
+    ).limit(limit + 1))).all()
+
+    next_cursor = None
+    if len(presupuestos) > limit:
+        presupuestos = presupuestos[:limit]
+        ultimo = presupuestos[-1]
+        next_cursor = codificar_cursor(ultimo.ano, ultimo.mes, ultimo.id)
+
+    return {
+        "items": presupuestos,
+        "next_cursor": next_cursor,
+        "total_aproximado": total_aproximado
+    }
 
 @router.get("/resumen", response_model=List[PresupuestoResponse])
 async def resumen_presupuestos(
     mes: int,
     ano: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
     current_user: Usuario = Depends(get_current_user)
 ):
-    return db.query(Presupuesto).filter(
+    resultado = await db.scalars(select(Presupuesto).options(*CARGA_PRESUPUESTO).filter(
         Presupuesto.usuario_id == current_user.id,
         Presupuesto.mes == mes,
         Presupuesto.ano == ano
-    ).all()
+    ))
+    return resultado.all()
 
 @router.get("/{presupuesto_id}", response_model=PresupuestoResponse)
 async def obtener_presupuesto(
     presupuesto_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
     current_user: Usuario = Depends(get_current_user)
 ):
-    presupuesto = db.query(Presupuesto).filter(
+    presupuesto = await db.scalar(select(Presupuesto).options(*CARGA_PRESUPUESTO).filter(
         Presupuesto.id == presupuesto_id,
         Presupuesto.usuario_id == current_user.id
-    ).first()
+    ))
     
     if not presupuesto:
         raise HTTPException(
@@ -102,13 +151,13 @@ async def obtener_presupuesto(
 async def actualizar_presupuesto(
     presupuesto_id: int,
     presupuesto: PresupuestoUpdate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: Usuario = Depends(get_current_user)
 ):
-    db_presupuesto = db.query(Presupuesto).filter(
+    db_presupuesto = await db.scalar(select(Presupuesto).filter(
         Presupuesto.id == presupuesto_id,
         Presupuesto.usuario_id == current_user.id
-    ).first()
+    ))
     
     if not db_presupuesto:
         raise HTTPException(
@@ -117,23 +166,44 @@ async def actualizar_presupuesto(
         )
     
     update_data = presupuesto.dict(exclude_unset=True)
+    if "mes" in update_data or "ano" in update_data:
+        # Otro periodo: su gasto y sus alertas empiezan de nuevo.
+        # Se consulta antes de modificar el objeto para no forzar un flush aquí
+        update_data["gastado"] = await gasto_del_periodo(
+            db, current_user.id, db_presupuesto.categoria_id,
+            update_data.get("ano", db_presupuesto.ano), update_data.get("mes", db_presupuesto.mes)
+        )
+        update_data["nivel_alertado"] = 0
     for field, value in update_data.items():
         setattr(db_presupuesto, field, value)
+
+    if "limite" in update_data and "nivel_alertado" not in update_data:
+        # Con un límite mayor, los umbrales que ya no se alcanzan pueden volver a avisar
+        db_presupuesto.nivel_alertado = min(
+            db_presupuesto.nivel_alertado, nivel_alcanzado(db_presupuesto.gastado, db_presupuesto.limite)
+        )
     
-    db.commit()
-    db.refresh(db_presupuesto)
+    try:
+        await db.commit()
+    except IntegrityError:
+        await db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Ya existe un presupuesto para esta categoría en el periodo seleccionado"
+        )
+    await db.refresh(db_presupuesto, attribute_names=RELACIONES_PRESUPUESTO)
     return db_presupuesto
 
 @router.delete("/{presupuesto_id}")
 async def eliminar_presupuesto(
     presupuesto_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: Usuario = Depends(get_current_user)
 ):
-    presupuesto = db.query(Presupuesto).filter(
+    presupuesto = await db.scalar(select(Presupuesto).filter(
         Presupuesto.id == presupuesto_id,
         Presupuesto.usuario_id == current_user.id
-    ).first()
+    ))
     
     if not presupuesto:
         raise HTTPException(
@@ -141,6 +211,6 @@ async def eliminar_presupuesto(
             detail="Presupuesto no encontrado"
         )
     
-    db.delete(presupuesto)
-    db.commit()
+    await db.delete(presupuesto)
+    await db.commit()
     return {"message": "Presupuesto eliminado exitosamente"}
\ No newline at end of file
@@ -1,20 +1,30 @@
 from fastapi import APIRouter, Depends, HTTPException, status, Query
-from routers.notificaciones import verificar_presupuestos
-from sqlalchemy.orm import Session
-from sqlalchemy import func, extract
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, func, extract, case
+from sqlalchemy.orm import joinedload
 from typing import List
 from datetime import date
-from DB.conexion import get_db
-from models.modelsDB import Transaccion, Usuario, Categoria
+from config import settings
+from DB.conexion import get_db, get_read_db
+from DB.instrumentacion import presupuesto_consultas
+from models.modelsDB import Transaccion, Usuario, Categoria, ResumenMensual
 from modelsPydantic import (
     TransaccionCreate, 
     TransaccionResponse, 
+    TransaccionPagina,
     TransaccionUpdate,
     CategoriaResumen,
     HistoricoMensual,
     TopCategorias,
 )
-from routers.dependencies import get_current_user
+from routers.dependencies import get_current_user, etag_datos, verificar_referencias
+from utils.periodos import rango_periodo, rango_fechas, filtro_periodo
+from utils.paginacion import codificar_cursor, decodificar_cursor, filtro_cursor, contar_aproximado
+from utils.resumen_mensual import acumular_resumen
+from utils.saldos import aplicar_movimiento
+from utils.presupuestos import acumular_gasto
+from utils.cache import cacheado
+from utils.alertas import registrar_alerta, encolar_alerta
 
 router = APIRouter(
     prefix="/transacciones",
@@ -25,12 +35,17 @@ router = APIRouter(
 #     tags=["Transacciones"]
 # )
 
+# TransaccionResponse anida cuenta y categoria (muchos a uno): un JOIN en la misma consulta
+CARGA_TRANSACCION = (joinedload(Transaccion.cuenta), joinedload(Transaccion.categoria))
+RELACIONES_TRANSACCION = ["cuenta", "categoria"]
+
 @router.post("/", response_model=TransaccionResponse, status_code=status.HTTP_201_CREATED)
 async def crear_transaccion(
     transaccion: TransaccionCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: Usuario = Depends(get_current_user)
 ):
+    await verificar_referencias(db, current_user.id, transaccion.cuenta_id, transaccion.categoria_id)
     db_transaccion = Transaccion(
         usuario_id=current_user.id,
         cuenta_id=transaccion.cuenta_id,
@@ -40,60 +55,88 @@ async def crear_transaccion(
         descripcion=transaccion.descripcion
     )
     db.add(db_transaccion)
-    db.commit()
-    db.refresh(db_transaccion)
+    await acumular_resumen(db, current_user.id, transaccion.categoria_id, transaccion.fecha, transaccion.monto)
+    await aplicar_movimiento(db, current_user.id, transaccion.cuenta_id, transaccion.categoria_id, transaccion.monto)
+    await acumular_gasto(db, current_user.id, transaccion.categoria_id, transaccion.fecha, transaccion.monto)
+    await registrar_alerta(db, current_user.id, transaccion.categoria_id, transaccion.fecha)
+    await db.commit()
+    await db.refresh(db_transaccion, attribute_names=RELACIONES_TRANSACCION)
 
-    await verificar_presupuestos(db, current_user.id, transaccion.categoria_id, transaccion.fecha, transaccion.monto)
+    # Las alertas de presupuesto se evalúan en segundo plano (utils/alertas.py)
+    encolar_alerta(current_user.id, transaccion.categoria_id, transaccion.fecha)
 
     return db_transaccion
 
-@router.get("/", response_model=List[TransaccionResponse])
+@router.get("/", response_model=TransaccionPagina, dependencies=[Depends(presupuesto_consultas(5)), Depends(etag_datos("finanzas", "categorias"))])
 async def listar_transacciones(
-    skip: int = 0,
-    limit: int = 100,
+    limit: int = Query(100, ge=1, le=500),
+    cursor: str = Query(None, description="next_cursor de la página anterior"),
+    incluir_total: bool = False,
     fecha_inicio: date = None,
     fecha_fin: date = None,
     categoria_id: int = None,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
     current_user: Usuario = Depends(get_current_user)
 ):
-    query = db.query(Transaccion).filter(Transaccion.usuario_id == current_user.id)
+    query = select(Transaccion).filter(Transaccion.usuario_id == current_user.id)
     
-    if fecha_inicio:
-        query = query.filter(Transaccion.fecha >= fecha_inicio)
-    if fecha_fin:
-        query = query.filter(Transaccion.fecha <= fecha_fin)
+    if fecha_inicio or fecha_fin:
+        query = query.filter(filtro_periodo(Transaccion.fecha, *rango_fechas(fecha_inicio, fecha_fin)))
     if categoria_id:
         query = query.filter(Transaccion.categoria_id == categoria_id)
-    
-    return query.offset(skip).limit(limit).all()
+
+    total_aproximado = await contar_aproximado(db, query) if incluir_total else None
+
+    # Más recientes primero, paginando por (fecha, id) en lugar de OFFSET
+    if cursor:
+        cursor_fecha, cursor_id = decodificar_cursor(cursor, date.fromisoformat, int)
+        query = query.filter(filtro_cursor(
+            (Transaccion.fecha, Transaccion.id), (cursor_fecha, cursor_id), descendente=True
+        ))
+
+    transacciones = (await db.scalars(query.options(*CARGA_TRANSACCION).order_by(
+        Transaccion.fecha.desc(), Transaccion.id.desc()
+    ).limit(limit + 1))).all()
+
+    next_cursor = None
+    if len(transacciones) > limit:
+        transacciones = transacciones[:limit]
+        next_cursor = codificar_cursor(transacciones[-1].fecha, transacciones[-1].id)
+
+    return {
+        "items": transacciones,
+        "next_cursor": next_cursor,
+        "total_aproximado": total_aproximado
+    }
 
 
 
 # Endpoints para gráficas
-@router.get("/resumen-categorias", response_model=dict)
+@router.get("/resumen-categorias", response_model=dict, dependencies=[Depends(etag_datos("finanzas", "categorias"))])
+@cacheado("resumen-categorias")
 async def resumen_categorias(
     mes: int = Query(..., ge=1, le=12),
     ano: int = Query(..., ge=2000),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
     current_user: Usuario = Depends(get_current_user)
 ):
     """
     Devuelve un resumen de ingresos y gastos agrupados por categoría para un mes/año específico.
+    Lee resumen_mensual: una fila por categoría del mes.
     """
-    resultados = db.query(
+    resultados = (await db.execute(select(
         Categoria.nombre,
         Categoria.tipo,
-        func.sum(Transaccion.monto).label('total')
+        func.sum(ResumenMensual.total).label('total')
     ).join(
-        Transaccion, Transaccion.categoria_id == Categoria.id
+        ResumenMensual, ResumenMensual.categoria_id == Categoria.id
     ).filter(
-        Transaccion.usuario_id == current_user.id,
-        extract('month', Transaccion.fecha) == mes,
-        extract('year', Transaccion.fecha) == ano
+        ResumenMensual.usuario_id == current_user.id,
+        ResumenMensual.ano == ano,
+        ResumenMensual.mes == mes
     ).group_by(
         Categoria.nombre, Categoria.tipo
-    ).all()
+    ))).all()
 
     ingresos = []
     gastos = []
@@ -117,57 +160,64 @@ async def resumen_categorias(
         }
     }
 
-@router.get("/historico", response_model=List[HistoricoMensual])
+@router.get("/historico", response_model=List[HistoricoMensual], dependencies=[Depends(etag_datos("finanzas", "categorias"))])
+@cacheado("historico")
 async def historico_mensual(
-    ano: int = Query(..., ge=2000),
-    db: Session = Depends(get_db),
+    ano: int = Query(..., ge=2000, le=9999),
+    ano_fin: int = Query(None, ge=2000, le=9999, description="Último año del rango (incluido)"),
+    incluir_vacios: bool = Query(False, description="Incluir meses sin movimientos"),
+    db: AsyncSession = Depends(get_read_db),
     current_user: Usuario = Depends(get_current_user)
 ):
-    # Primero obtenemos los meses con datos
-    meses_con_datos = db.query(
-        extract('month', Transaccion.fecha).label('mes')
+    """
+    Ingresos, gastos y balance por mes en una sola consulta agrupada sobre resumen_mensual.
+    Con ano_fin devuelve varios años consecutivos en la misma respuesta.
+    """
+    ano_fin = ano_fin or ano
+    if ano_fin < ano:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="ano_fin debe ser mayor o igual que ano"
+        )
+    if ano_fin - ano >= settings.HISTORICO_MAX_ANOS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"El rango no puede abarcar más de {settings.HISTORICO_MAX_ANOS} años"
+        )
+
+    filas = (await db.execute(select(
+        ResumenMensual.ano,
+        ResumenMensual.mes,
+        func.sum(case((Categoria.tipo == 'ingreso', ResumenMensual.total), else_=0)).label('ingresos'),
+        func.sum(case((Categoria.tipo == 'gasto', ResumenMensual.total), else_=0)).label('gastos')
+    ).join(
+        Categoria, ResumenMensual.categoria_id == Categoria.id
     ).filter(
-        Transaccion.usuario_id == current_user.id,
-        extract('year', Transaccion.fecha) == ano
+        ResumenMensual.usuario_id == current_user.id,
+        ResumenMensual.ano.between(ano, ano_fin)
     ).group_by(
-        extract('month', Transaccion.fecha)
-    ).all()
+        ResumenMensual.ano, ResumenMensual.mes
+    ).order_by(
+        ResumenMensual.ano, ResumenMensual.mes
+    ))).all()
 
-    resultados = []
     nombres_meses = [
         "Enero", "Febrero", "Marzo", "Abril", "Mayo", "Junio",
         "Julio", "Agosto", "Septiembre", "Octubre", "Noviembre", "Diciembre"
     ]
 
-    for mes_data in meses_con_datos:
-        mes = int(mes_data.mes)
-        
-        # Consulta separada para ingresos
-        ingresos = db.query(
-            func.sum(Transaccion.monto)
-        ).join(
-            Categoria, Transaccion.categoria_id == Categoria.id
-        ).filter(
-            Transaccion.usuario_id == current_user.id,
-            extract('year', Transaccion.fecha) == ano,
-            extract('month', Transaccion.fecha) == mes,
-            Categoria.tipo == 'ingreso'
-        ).scalar() or 0
-
-        # Consulta separada para gastos
-        gastos = db.query(
-            func.sum(Transaccion.monto)
-        ).join(
-            Categoria, Transaccion.categoria_id == Categoria.id
-        ).filter(
-            Transaccion.usuario_id == current_user.id,
-            extract('year', Transaccion.fecha) == ano,
-            extract('month', Transaccion.fecha) == mes,
-            Categoria.tipo == 'gasto'
-        ).scalar() or 0
+    por_mes = {(int(f.ano), int(f.mes)): (f.ingresos or 0, f.gastos or 0) for f in filas}
+    if incluir_vacios:
+        periodos = [(a, m) for a in range(ano, ano_fin + 1) for m in range(1, 13)]
+    else:
+        periodos = list(por_mes)
 
+    resultados = []
+    for a, m in periodos:
+        ingresos, gastos = por_mes.get((a, m), (0, 0))
         resultados.append({
-            "mes": nombres_meses[mes-1],
+            "ano": a,
+            "mes": nombres_meses[m-1],
             "ingresos": float(ingresos),
             "gastos": float(gastos),
             "balance": float(ingresos - gastos)
@@ -175,145 +225,189 @@ async def historico_mensual(
 
     return resultados
 
-@router.get("/top-categorias", response_model=List[TopCategorias])
+@router.get("/top-categorias", response_model=List[TopCategorias], dependencies=[Depends(etag_datos("finanzas", "categorias"))])
+@cacheado("top-categorias")
 async def top_categorias(
     tipo: str = Query(..., regex="^(ingreso|gasto)$"),
     limite: int = Query(5, ge=1),
     ano: int = Query(None, ge=2000),
     mes: int = Query(None, ge=1, le=12),
-    db: Session = Depends(get_db),
+    fecha_inicio: date = None,
+    fecha_fin: date = None,
+    incluir_otros: bool = Query(False, description="Agrupar el resto de categorías en \"Otros\""),
+    db: AsyncSession = Depends(get_read_db),
     current_user: Usuario = Depends(get_current_user)
 ):
     """
     Devuelve las categorías con más transacciones (por monto total) filtradas por tipo.
+    El total del tipo sale de la misma consulta con SUM() OVER ().
+    Por año/mes lee resumen_mensual; un rango de fechas arbitrario necesita las transacciones.
     """
-    query = db.query(
-        Categoria.nombre,
-        func.sum(Transaccion.monto).label('total')
-    ).join(
-        Transaccion, Transaccion.categoria_id == Categoria.id
-    ).filter(
-        Transaccion.usuario_id == current_user.id,
-        Categoria.tipo == tipo
-    )
-
-    if ano:
-        query = query.filter(extract('year', Transaccion.fecha) == ano)
-    if mes:
-        query = query.filter(extract('month', Transaccion.fecha) == mes)
+    if fecha_inicio or fecha_fin:
+        total_categoria = func.sum(Transaccion.monto)
+        query = select(
+            Categoria.nombre,
+            total_categoria.label('total'),
+            func.sum(total_categoria).over().label('total_tipo')
+        ).join(
+            Transaccion, Transaccion.categoria_id == Categoria.id
+        ).filter(
+            Transaccion.usuario_id == current_user.id,
+            Categoria.tipo == tipo,
+            filtro_periodo(Transaccion.fecha, *rango_fechas(fecha_inicio, fecha_fin))
+        )
+        periodo = rango_periodo(ano, mes)
+        if periodo:
+            query = query.filter(filtro_periodo(Transaccion.fecha, *periodo))
+        elif mes:
+            query = query.filter(extract('month', Transaccion.fecha) == mes)
+    else:
+        total_categoria = func.sum(ResumenMensual.total)
+        query = select(
+            Categoria.nombre,
+            total_categoria.label('total'),
+            func.sum(total_categoria).over().label('total_tipo')
+        ).join(
+            ResumenMensual, ResumenMensual.categoria_id == Categoria.id
+        ).filter(
+            ResumenMensual.usuario_id == current_user.id,
+            Categoria.tipo == tipo
+        )
+        if ano:
+            query = query.filter(ResumenMensual.ano == ano)
+        if mes:
+            query = query.filter(ResumenMensual.mes == mes)
 
-    resultados = query.group_by(
+    # La ventana se evalúa antes del LIMIT, así total_tipo incluye todas las categorías
+    resultados = (await db.execute(query.group_by(
         Categoria.nombre
     ).order_by(
-        func.sum(Transaccion.monto).desc()
-    ).limit(limite).all()
+        total_categoria.desc()
+    ).limit(limite))).all()
 
-    # Calcular porcentajes
-    total_tipo = db.query(
-        func.sum(Transaccion.monto)
-    ).join(
-        Categoria, Transaccion.categoria_id == Categoria.id
-    ).filter(
-        Transaccion.usuario_id == current_user.id,
-        Categoria.tipo == tipo
-    )
-    
-    if ano:
-        total_tipo = total_tipo.filter(extract('year', Transaccion.fecha) == ano)
-    if mes:
-        total_tipo = total_tipo.filter(extract('month', Transaccion.fecha) == mes)
+    if not resultados:
+        return []
 
-    total = total_tipo.scalar() or 1  # Evitar división por cero
+    total = float(resultados[0].total_tipo) or 1  # Evitar división por cero
 
-    return [
+    top = [
         {
             "categoria": nombre,
             "total": float(total_cat),
-            "porcentaje": round((total_cat / total) * 100, 2)
+            "porcentaje": round((float(total_cat) / total) * 100, 2)
         }
-        for nombre, total_cat in resultados
+        for nombre, total_cat, _ in resultados
     ]
 
-@router.get("/detalle-categoria/{categoria_id}", response_model=dict)
+    if incluir_otros:
+        resto = total - sum(item["total"] for item in top)
+        if resto > 0:
+            top.append({
+                "categoria": "Otros",
+                "total": round(resto, 2),
+                "porcentaje": round((resto / total) * 100, 2)
+            })
+
+    return top
+
+@router.get("/detalle-categoria/{categoria_id}", response_model=dict, dependencies=[Depends(etag_datos("finanzas", "categorias"))])
 async def detalle_categoria(
     categoria_id: int,
     mes: int = Query(None, ge=1, le=12),
     ano: int = Query(None, ge=2000),
-    db: Session = Depends(get_db),
+    incluir_transacciones: bool = Query(True, description="false = solo totales y promedios"),
+    limit: int = Query(50, ge=1, le=500),
+    cursor: str = Query(None, description="next_cursor de la página anterior"),
+    db: AsyncSession = Depends(get_read_db),
     current_user: Usuario = Depends(get_current_user)
 ):
     # Verificar que la categoría existe
-    categoria = db.query(Categoria).filter(Categoria.id == categoria_id).first()
+    categoria = await db.scalar(select(Categoria).filter(Categoria.id == categoria_id))
     if not categoria:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Categoría no encontrada"
         )
 
-    # Query para transacciones específicas
-    query = db.query(Transaccion).filter(
+    filtros = [
         Transaccion.usuario_id == current_user.id,
         Transaccion.categoria_id == categoria_id
-    )
+    ]
+    periodo = rango_periodo(ano, mes)
+    if periodo:
+        filtros.append(filtro_periodo(Transaccion.fecha, *periodo))
 
-    if ano and mes:
-        query = query.filter(
-            extract('year', Transaccion.fecha) == ano,
-            extract('month', Transaccion.fecha) == mes
-        )
-    elif ano:
-        query = query.filter(extract('year', Transaccion.fecha) == ano)
+    transacciones = []
+    next_cursor = None
+    if incluir_transacciones:
+        # Paginación por clave (fecha, id) descendente: cada página cuesta lo mismo
+        query = select(
+            Transaccion.id,
+            Transaccion.fecha,
+            Transaccion.monto,
+            Transaccion.descripcion
+        ).filter(*filtros)
+        if cursor:
+            cursor_fecha, cursor_id = decodificar_cursor(cursor, date.fromisoformat, int)
+            query = query.filter(filtro_cursor(
+                (Transaccion.fecha, Transaccion.id), (cursor_fecha, cursor_id), descendente=True
+            ))
 
-    transacciones = query.order_by(Transaccion.fecha.desc()).all()
+        filas = (await db.execute(query.order_by(
+            Transaccion.fecha.desc(), Transaccion.id.desc()
+        ).limit(limit + 1))).all()
 
-    # Calcular total del mes si se especificó mes
-    total_mes = sum(t.monto for t in transacciones) if (ano and mes) else None
-    
-    # Calcular promedio mensual (consulta separada para SQLite)
+        if len(filas) > limit:
+            filas = filas[:limit]
+            next_cursor = codificar_cursor(filas[-1].fecha, filas[-1].id)
+        transacciones = [
+            {
+                "fecha": t.fecha,
+                "monto": float(t.monto),
+                "descripcion": t.descripcion
+            }
+            for t in filas
+        ]
+
+    # Total del mes y promedio mensual desde resumen_mensual (una fila por mes)
+    total_mes = None
+    promedio_mensual = None
     if ano and mes:
-        # Para el promedio, primero obtenemos las sumas mensuales
-        sumas_mensuales = db.query(
-            func.sum(Transaccion.monto).label('total_mensual')
+        total_mes = await db.scalar(select(
+            func.coalesce(func.sum(ResumenMensual.total), 0)
         ).filter(
-            Transaccion.usuario_id == current_user.id,
-            Transaccion.categoria_id == categoria_id
-        ).group_by(
-            extract('year', Transaccion.fecha),
-            extract('month', Transaccion.fecha)
-        ).all()
-
-        # Luego calculamos el promedio manualmente
-        if sumas_mensuales:
-            promedio_mensual = sum(t.total_mensual for t in sumas_mensuales) / len(sumas_mensuales)
-        else:
-            promedio_mensual = 0
-    else:
-        promedio_mensual = None
+            ResumenMensual.usuario_id == current_user.id,
+            ResumenMensual.categoria_id == categoria_id,
+            ResumenMensual.ano == ano,
+            ResumenMensual.mes == mes
+        ))
+
+        # Promedio de las sumas mensuales de todo el historial de la categoría
+        promedio_mensual = await db.scalar(select(
+            func.coalesce(func.avg(ResumenMensual.total), 0)
+        ).filter(
+            ResumenMensual.usuario_id == current_user.id,
+            ResumenMensual.categoria_id == categoria_id
+        ))
 
     return {
         "categoria": categoria.nombre,
         "tipo": categoria.tipo,
-        "transacciones": [
-            {
-                "fecha": t.fecha,
-                "monto": float(t.monto),
-                "descripcion": t.descripcion
-            }
-            for t in transacciones
-        ],
+        "transacciones": transacciones,
+        "next_cursor": next_cursor,
         "total_mes": float(total_mes) if total_mes is not None else None,
         "promedio_mensual": float(promedio_mensual) if promedio_mensual is not None else None
     }
 @router.get("/{transaccion_id}", response_model=TransaccionResponse)
 async def obtener_transaccion(
     transaccion_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
     current_user: Usuario = Depends(get_current_user)
 ):
-    transaccion = db.query(Transaccion).filter(
+    transaccion = await db.scalar(select(Transaccion).options(*CARGA_TRANSACCION).filter(
         Transaccion.id == transaccion_id,
         Transaccion.usuario_id == current_user.id
-    ).first()
+    ))
     
     if not transaccion:
         raise HTTPException(
@@ -351,20 +445,27 @@ async def obtener_transaccion(
 @router.delete("/{transaccion_id}")
 async def eliminar_transaccion(
     transaccion_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: Usuario = Depends(get_current_user)
 ):
-    transaccion = db.query(Transaccion).filter(
+    transaccion = await db.scalar(select(Transaccion).filter(
         Transaccion.id == transaccion_id,
         Transaccion.usuario_id == current_user.id
-    ).first()
+    ))
     
     if not transaccion:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Transacción no encontrada"
         )
+    await verificar_referencias(db, current_user.id, transaccion.cuenta_id, transaccion.categoria_id)
     
-    db.delete(transaccion)
-    db.commit()
+    await db.delete(transaccion)
+    await acumular_resumen(
+        db, transaccion.usuario_id, transaccion.categoria_id, transaccion.fecha,
+        -transaccion.monto, cantidad=-1
+    )
+    await aplicar_movimiento(db, transaccion.usuario_id, transaccion.cuenta_id, transaccion.categoria_id, -transaccion.monto)
+    await acumular_gasto(db, transaccion.usuario_id, transaccion.categoria_id, transaccion.fecha, -transaccion.monto)
+    await db.commit()
     return {"message": "Transacción eliminada exitosamente"}
@@ -1,9 +1,15 @@
 from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import update, delete
 from DB.conexion import get_db
-from models.modelsDB import Usuario
+from models.modelsDB import (
+    Usuario, AuthToken, Cuenta, Transaccion, Presupuesto,
+    PagoProgramado, PreferenciaNotificacion, Notificacion, ResumenMensual, AlertaPendiente
+)
 from modelsPydantic import UsuarioResponse, UsuarioUpdate
-from routers.dependencies import get_current_user
+from routers.dependencies import get_current_user, invalidar_identidad
+from utils.hashing import hash_password
+from utils.despacho import invalidar_contacto
 
 router = APIRouter(
     prefix="/usuarios",
@@ -23,27 +29,42 @@ async def leer_usuario_actual(
 @router.put("/me", response_model=UsuarioResponse)
 async def actualizar_usuario(
     usuario: UsuarioUpdate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: Usuario = Depends(get_current_user)
 ):
+    # current_user viene de la sesión de lectura; se edita la copia de escritura
+    db_usuario = await db.get(Usuario, current_user.id)
     update_data = usuario.dict(exclude_unset=True)
     
     if "password" in update_data:
-        from utils.security import get_password_hash
-        update_data["password"] = get_password_hash(update_data["password"])
+        update_data["password"] = await hash_password(update_data["password"])
     
     for field, value in update_data.items():
-        setattr(current_user, field, value)
+        setattr(db_usuario, field, value)
     
-    db.commit()
-    db.refresh(current_user)
-    return current_user
+    await db.commit()
+    invalidar_identidad(current_user.id)
+    invalidar_contacto(current_user.id)
+    await db.refresh(db_usuario)
+    return db_usuario
 
 @router.delete("/me")
 async def eliminar_usuario(
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: Usuario = Depends(get_current_user)
 ):
-    db.delete(current_user)
-    db.commit()
+    # Sin cargar las colecciones del usuario: los hijos se desvinculan con un UPDATE por tabla
+    for modelo in (Cuenta, Transaccion, Presupuesto, PagoProgramado, Notificacion):
+        await db.execute(update(modelo).where(
+            modelo.usuario_id == current_user.id
+        ).values(usuario_id=None))
+    # usuario_id es parte de la clave primaria de preferencias, resúmenes y alertas: no se puede dejar en NULL.
+    # Los refresh tokens se borran para que no sigan emitiendo access tokens.
+    for modelo in (AuthToken, PreferenciaNotificacion, ResumenMensual, AlertaPendiente):
+        await db.execute(delete(modelo).where(
+            modelo.usuario_id == current_user.id
+        ))
+    await db.delete(await db.get(Usuario, current_user.id))
+    await db.commit()
+    invalidar_identidad(current_user.id)
     return {"message": "Usuario eliminado exitosamente"}
\ No newline at end of file
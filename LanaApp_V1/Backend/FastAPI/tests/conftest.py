@@ -0,0 +1,96 @@
+"""
+Configuración común de las pruebas.
+
+La app se importa una sola vez por sesión y sus motores quedan ligados a la base
+del arranque, así que el entorno se fija aquí, antes de cualquier import de la
+app: una base temporal (nunca DB/bd_LanaApp.sqlite), el detector de N+1 en modo
+"raise", bcrypt barato y sin workers en segundo plano que compitan con las pruebas.
+"""
+import os
+import shutil
+import tempfile
+import uuid
+
+_DIRECTORIO = tempfile.mkdtemp(prefix="lana-pruebas-")
+os.environ.update({
+    "DB_PATH": os.path.join(_DIRECTORIO, "lana.sqlite"),
+    "SQL_DETECTOR_N1": "raise",
+    "BCRYPT_ROUNDS": "4",
+    "LIMITE_ACTIVO": "false",
+    "NOTIF_DESPACHO_ACTIVO": "false",
+})
+
+import pytest
+from fastapi.testclient import TestClient
+
+
+def pytest_unconfigure(config):
+    shutil.rmtree(_DIRECTORIO, ignore_errors=True)
+
+
+@pytest.fixture(scope="session")
+def app():
+    from main import app
+    return app
+
+
+@pytest.fixture(scope="session")
+def cliente(app):
+    with TestClient(app) as cliente:
+        yield cliente
+
+
+def nombre_unico(prefijo: str) -> str:
+    return f"{prefijo}-{uuid.uuid4().hex[:10]}"
+
+
+def registrar(cliente, password: str = "clave-segura-1") -> dict:
+    """
+    Registra un usuario nuevo y devuelve su email, contraseña y cabeceras de autenticación.
+    """
+    email = f"{nombre_unico('usuario')}@ejemplo.com"
+    respuesta = cliente.post("/api/auth/registro", json={"nombre": "Prueba", "email": email, "password": password})
+    assert respuesta.status_code == 201, respuesta.text
+    tokens = cliente.post("/api/auth/login", data={"username": email, "password": password}).json()
+    return {
+        "email": email,
+        "password": password,
+        "tokens": tokens,
+        "cabeceras": {"Authorization": f"Bearer {tokens['access_token']}"},
+    }
+
+
+@pytest.fixture
+def usuario(cliente) -> dict:
+    return registrar(cliente)
+
+
+@pytest.fixture
+def cuenta_y_categoria(cliente, usuario) -> tuple:
+    """
+    (cuenta_id, categoria_id) del usuario: una cuenta de banco y una categoría de gasto nueva.
+    """
+    cabeceras = usuario["cabeceras"]
+    cuenta = cliente.post("/cuentas/", json={"nombre": "Banco", "tipo": "banco", "saldo_inicial": 1000}, headers=cabeceras)
+    categoria = cliente.post("/categorias/", json={"nombre": nombre_unico("gasto"), "tipo": "gasto"}, headers=cabeceras)
+    assert cuenta.status_code == 201 and categoria.status_code == 201
+    return cuenta.json()["id"], categoria.json()["id"]
+
+
+def crear_transacciones(cliente, cabeceras: dict, cuenta_id: int, categoria_id: int, cantidad: int, fecha: str = "2025-03-10"):
+    for i in range(cantidad):
+        respuesta = cliente.post("/transacciones/", json={
+            "cuenta_id": cuenta_id, "categoria_id": categoria_id, "monto": 1 + i, "fecha": fecha
+        }, headers=cabeceras)
+        assert respuesta.status_code == 201, respuesta.text
+
+
+def consultas(respuesta) -> int:
+    """
+    Número de consultas SQL de la petición, de la cabecera Server-Timing.
+    """
+    for metrica in respuesta.headers["server-timing"].split(","):
+        nombre, _, valor = metrica.strip().partition(";")
+        if nombre == "queries":
+            return int(valor.split("=", 1)[1].strip('"'))
+    raise AssertionError("Server-Timing sin queries")
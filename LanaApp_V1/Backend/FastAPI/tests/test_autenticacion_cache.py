@@ -0,0 +1,47 @@
+"""
+Coste de autenticar una petición: con el token y la identidad en cache,
+GET /usuarios/me no hace ninguna consulta; en frío (caches vaciadas antes de
+cada petición) decodifica el JWT y lee el usuario de la base.
+"""
+import time
+import pytest
+from routers.dependencies import _identidades
+from utils.security import _tokens_verificados
+from conftest import consultas
+
+PETICIONES = 300
+
+
+def _medir(cliente, cabeceras, antes_de_cada=None) -> dict:
+    duraciones, total_consultas = [], 0
+    for _ in range(PETICIONES):
+        if antes_de_cada:
+            antes_de_cada()
+        inicio = time.perf_counter()
+        respuesta = cliente.get("/usuarios/me", headers=cabeceras)
+        duraciones.append(time.perf_counter() - inicio)
+        assert respuesta.status_code == 200
+        total_consultas += consultas(respuesta)
+    duraciones.sort()
+    return {
+        "mediana_us": round(duraciones[len(duraciones) // 2] * 1e6),
+        "consultas_por_peticion": total_consultas / PETICIONES,
+    }
+
+
+@pytest.mark.benchmark
+def test_autenticacion_en_cache_sin_consultas(cliente, usuario):
+    cabeceras = usuario["cabeceras"]
+    token = usuario["tokens"]["access_token"]
+    usuario_id = cliente.get("/usuarios/me", headers=cabeceras).json()["id"]
+
+    def vaciar():
+        _tokens_verificados.invalidar(token)
+        _identidades.invalidar(usuario_id)
+
+    frio = _medir(cliente, cabeceras, vaciar)
+    caliente = _medir(cliente, cabeceras)
+
+    print(f"\nGET /usuarios/me x{PETICIONES}: frío {frio}, en cache {caliente}")
+    assert frio["consultas_por_peticion"] == 1
+    assert caliente["consultas_por_peticion"] == 0
@@ -0,0 +1,64 @@
+"""
+Consultas por endpoint de listado con cuenta y categoría anidadas: con las
+relaciones cargadas en bloque el número no crece con las filas devueltas.
+Con -s imprime la tabla de consultas por endpoint.
+"""
+from datetime import date, timedelta
+from conftest import registrar, nombre_unico, consultas
+
+ENDPOINTS = [
+    "/transacciones/?limit=100",
+    "/transacciones/{transaccion_id}",
+    "/presupuestos/?limit=100",
+    "/presupuestos/resumen?mes=3&ano=2025",
+    "/pagos-programados/?limit=100",
+    "/pagos-programados/proximos?dias=30",
+    "/cuentas/",
+]
+
+
+def _datos(cliente, filas: int) -> dict:
+    usuario = registrar(cliente)
+    cabeceras = usuario["cabeceras"]
+    cuentas = [
+        cliente.post("/cuentas/", json={"nombre": f"Cuenta {i}", "tipo": "banco", "saldo_inicial": 100}, headers=cabeceras).json()["id"]
+        for i in range(2)
+    ]
+    manana = (date.today() + timedelta(days=1)).isoformat()
+    transaccion_id = None
+    for i in range(filas):
+        categoria_id = cliente.post("/categorias/", json={"nombre": nombre_unico("cat"), "tipo": "gasto"}, headers=cabeceras).json()["id"]
+        cuenta_id = cuentas[i % 2]
+        transaccion_id = cliente.post("/transacciones/", json={
+            "cuenta_id": cuenta_id, "categoria_id": categoria_id, "monto": 10, "fecha": "2025-03-05"
+        }, headers=cabeceras).json()["id"]
+        cliente.post("/presupuestos/", json={"mes": 3, "ano": 2025, "limite": 100, "categoria_id": categoria_id}, headers=cabeceras)
+        cliente.post("/pagos-programados/", json={
+            "descripcion": f"Pago {i}", "monto": 5, "frecuencia": "mensual", "proxima_fecha": manana,
+            "cuenta_id": cuenta_id, "categoria_id": categoria_id
+        }, headers=cabeceras)
+    return {"cabeceras": cabeceras, "transaccion_id": transaccion_id}
+
+
+def _medir(cliente, datos: dict, filas: int) -> dict:
+    resultado = {}
+    for endpoint in ENDPOINTS:
+        respuesta = cliente.get(endpoint.format(**datos), headers=datos["cabeceras"])
+        assert respuesta.status_code == 200, (endpoint, respuesta.text)
+        cuerpo = respuesta.json()
+        items = cuerpo["items"] if isinstance(cuerpo, dict) and "items" in cuerpo else cuerpo
+        if isinstance(items, list) and endpoint != "/cuentas/":
+            assert len(items) == filas, endpoint
+        resultado[endpoint] = consultas(respuesta)
+    return resultado
+
+
+def test_consultas_no_crecen_con_las_filas(cliente):
+    pocas = _medir(cliente, _datos(cliente, 2), 2)
+    muchas = _medir(cliente, _datos(cliente, 12), 12)
+
+    print(f"\n{'endpoint':45} {'2 filas':>8} {'12 filas':>9}")
+    for endpoint in ENDPOINTS:
+        print(f"{endpoint:45} {pocas[endpoint]:>8} {muchas[endpoint]:>9}")
+
+    assert pocas == muchas
@@ -0,0 +1,89 @@
+"""
+Estado final de las notificaciones despachadas: el resultado del envío no pisa
+una notificación que el usuario leyó mientras se enviaba, y la que no tiene
+canal disponible conserva el medio con el que se creó.
+"""
+import httpx
+from sqlalchemy import insert, select
+from DB.conexion import AsyncSessionLocal
+from models.modelsDB import Notificacion, PreferenciaNotificacion
+from utils import despacho
+from utils.canales import Canal, CanalRegistro
+
+
+class _CanalAlEnviar(Canal):
+    """
+    Canal push que ejecuta `al_enviar` (si hay) en mitad de cada envío.
+    """
+    nombre = "push"
+
+    def __init__(self, al_enviar=None):
+        super().__init__(10)
+        self._al_enviar = al_enviar
+
+    async def _enviar(self, destino, notificacion: dict):
+        if self._al_enviar:
+            await self._al_enviar(notificacion)
+
+
+async def _crear_notificacion(usuario_id: int, medio: str) -> int:
+    async with AsyncSessionLocal() as db:
+        notificacion_id = (await db.execute(insert(Notificacion).values(
+            usuario_id=usuario_id, tipo="recuperacion", medio=medio, mensaje="prueba", estado="pendiente"
+        ).returning(Notificacion.id))).scalar_one()
+        await db.commit()
+    return notificacion_id
+
+
+async def _despachar_todo(canal_push: Canal):
+    anterior = despacho._canales
+    despacho._canales = {
+        "push": canal_push,
+        "email": CanalRegistro("email", 10),
+        "sms": CanalRegistro("sms", 10),
+    }
+    try:
+        while await despacho.despachar_lote():
+            pass
+    finally:
+        despacho._canales = anterior
+
+
+async def _fila(notificacion_id: int):
+    async with AsyncSessionLocal() as db:
+        return (await db.execute(select(
+            Notificacion.estado, Notificacion.medio
+        ).filter(Notificacion.id == notificacion_id))).one()
+
+
+def test_leida_durante_el_envio_sigue_leida(cliente, app, usuario):
+    usuario_id = cliente.get("/usuarios/me", headers=usuario["cabeceras"]).json()["id"]
+
+    async def escenario():
+        notificacion_id = await _crear_notificacion(usuario_id, "push")
+        transporte = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transporte, base_url="http://pruebas") as http:
+            async def leer(notificacion):
+                respuesta = await http.post(f"/notificaciones/{notificacion_id}/marcar-leida", headers=usuario["cabeceras"])
+                assert respuesta.status_code == 200
+
+            await _despachar_todo(_CanalAlEnviar(leer))
+        return await _fila(notificacion_id)
+
+    assert cliente.portal.call(escenario).estado == "leida"
+
+
+def test_sin_canal_conserva_el_medio(cliente, usuario):
+    usuario_id = cliente.get("/usuarios/me", headers=usuario["cabeceras"]).json()["id"]
+
+    async def escenario():
+        async with AsyncSessionLocal() as db:
+            db.add(PreferenciaNotificacion(usuario_id=usuario_id, por_email=False, por_sms=False, por_push=False))
+            await db.commit()
+        despacho.invalidar_contacto(usuario_id)
+        notificacion_id = await _crear_notificacion(usuario_id, "sms")
+        await _despachar_todo(_CanalAlEnviar())
+        return await _fila(notificacion_id)
+
+    fila = cliente.portal.call(escenario)
+    assert (fila.estado, fila.medio) == ("enviada", "sms")
@@ -0,0 +1,108 @@
+"""
+Rendimiento del despacho de notificaciones contra una pasarela push simulada
+(http.server en un hilo, con unos ms de latencia por mensaje): envíos de uno en
+uno frente a la concurrencia configurada (NOTIF_CONCURRENCIA, con las conexiones
+reutilizadas del pool del canal).
+"""
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+from sqlalchemy import insert, select, func
+from config import settings
+from DB.conexion import AsyncSessionLocal
+from models.modelsDB import Notificacion
+from utils import despacho
+from utils.canales import CanalHTTP, CanalRegistro
+from conftest import nombre_unico
+
+NOTIFICACIONES = 200
+LATENCIA_PASARELA_S = 0.005
+
+
+class _Pasarela(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    recibidos = 0
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers["Content-Length"]))
+        time.sleep(LATENCIA_PASARELA_S)
+        type(self).recibidos += 1
+        self.send_response(200)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture(scope="module")
+def pasarela():
+    servidor = ThreadingHTTPServer(("127.0.0.1", 0), _Pasarela)
+    servidor.daemon_threads = True
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{servidor.server_address[1]}/push"
+    servidor.shutdown()
+    servidor.server_close()
+
+
+def _despachar(cliente, url: str, usuario_id: int, concurrencia: int) -> dict:
+    ronda_id = nombre_unico("despacho")
+
+    async def ronda():
+        canales = {
+            "push": CanalHTTP("push", url, concurrencia),
+            "email": CanalRegistro("email", concurrencia),
+            "sms": CanalRegistro("sms", concurrencia),
+        }
+        async with AsyncSessionLocal() as db:
+            await db.execute(insert(Notificacion), [
+                {"usuario_id": usuario_id, "tipo": "recuperacion", "medio": "push", "mensaje": f"{ronda_id} {i}", "estado": "pendiente"}
+                for i in range(NOTIFICACIONES)
+            ])
+            await db.commit()
+
+        anterior = despacho._canales
+        despacho._canales = canales
+        try:
+            inicio = time.perf_counter()
+            while await despacho.despachar_lote():
+                pass
+            duracion = time.perf_counter() - inicio
+        finally:
+            despacho._canales = anterior
+            for canal in canales.values():
+                canal.cerrar()
+
+        async with AsyncSessionLocal() as db:
+            enviadas = await db.scalar(select(func.count(Notificacion.id)).filter(
+                Notificacion.usuario_id == usuario_id,
+                Notificacion.mensaje.startswith(ronda_id),
+                Notificacion.estado == "enviada",
+                Notificacion.medio == "push"
+            ))
+        return enviadas, duracion
+
+    recibidos = _Pasarela.recibidos
+    enviadas, duracion = cliente.portal.call(ronda)
+    return {
+        "enviadas": enviadas,
+        "recibidas_pasarela": _Pasarela.recibidos - recibidos,
+        "por_segundo": round(NOTIFICACIONES / duracion, 1),
+    }
+
+
+@pytest.mark.benchmark
+def test_despacho_concurrente_contra_pasarela(cliente, usuario, pasarela):
+    usuario_id = cliente.get("/usuarios/me", headers=usuario["cabeceras"]).json()["id"]
+
+    serie = _despachar(cliente, pasarela, usuario_id, 1)
+    concurrente = _despachar(cliente, pasarela, usuario_id, settings.NOTIF_CONCURRENCIA)
+
+    print(f"\n{NOTIFICACIONES} notificaciones push: de una en una {serie}, concurrentes {concurrente}")
+    print(f"Estadísticas del despacho: {despacho.estadisticas()}")
+    # La pasarela también recibe las pendientes que hayan dejado otras pruebas
+    for ronda in (serie, concurrente):
+        assert ronda["enviadas"] == NOTIFICACIONES
+        assert ronda["recibidas_pasarela"] >= NOTIFICACIONES
+    assert concurrente["por_segundo"] > serie["por_segundo"]
@@ -0,0 +1,57 @@
+"""
+Detector de N+1 (DB/instrumentacion.py) en modo "raise": una petición que repite
+la misma sentencia o excede el presupuesto de su ruta responde 500 con el reporte.
+"""
+import pytest
+from fastapi import Depends
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from DB.conexion import get_read_db
+from DB.instrumentacion import presupuesto_consultas
+from models.modelsDB import Cuenta, Categoria
+from config import settings
+from conftest import crear_transacciones, consultas
+
+
+@pytest.fixture(scope="module", autouse=True)
+def rutas_de_prueba(app):
+    async def por_fila(db: AsyncSession = Depends(get_read_db)):
+        # Forma típica de N+1: una consulta por cada fila de un listado
+        return [await db.scalar(select(Cuenta.nombre).filter(Cuenta.id == i)) for i in range(settings.SQL_MAX_REPETICIONES + 5)]
+
+    async def dos_consultas(db: AsyncSession = Depends(get_read_db)):
+        await db.scalar(select(Cuenta.id).limit(1))
+        await db.scalar(select(Categoria.id).limit(1))
+        return {}
+
+    app.add_api_route("/pruebas/n1", por_fila)
+    app.add_api_route("/pruebas/presupuesto", dos_consultas, dependencies=[Depends(presupuesto_consultas(1))])
+
+
+def test_consulta_repetida_responde_500(cliente):
+    respuesta = cliente.get("/pruebas/n1")
+
+    assert respuesta.status_code == 500
+    reporte = respuesta.json()["reporte"]
+    assert reporte["ruta"] == "GET /pruebas/n1"
+    assert reporte["repetidas"][0]["veces"] == settings.SQL_MAX_REPETICIONES + 5
+
+
+def test_presupuesto_de_la_ruta_excedido_responde_500(cliente):
+    respuesta = cliente.get("/pruebas/presupuesto")
+
+    assert respuesta.status_code == 500
+    reporte = respuesta.json()["reporte"]
+    assert reporte["presupuesto"] == 1
+    assert reporte["consultas"] == 2
+
+
+def test_listar_transacciones_dentro_de_su_presupuesto(cliente, usuario, cuenta_y_categoria):
+    # 30 filas con cuenta y categoría anidadas: el número de consultas no depende de las filas
+    crear_transacciones(cliente, usuario["cabeceras"], *cuenta_y_categoria, cantidad=30)
+
+    respuesta = cliente.get("/transacciones/?limit=100", headers=usuario["cabeceras"])
+
+    assert respuesta.status_code == 200
+    assert len(respuesta.json()["items"]) == 30
+    assert consultas(respuesta) <= 5
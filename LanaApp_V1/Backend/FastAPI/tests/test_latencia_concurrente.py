@@ -0,0 +1,83 @@
+"""
+Latencia con 200 clientes concurrentes mientras otra petición ejecuta una
+consulta lenta. "antes" reproduce el acceso anterior (Session síncrona dentro de
+un endpoint async, que bloquea el event loop); "después" es la misma consulta
+con AsyncSession, como los routers actuales.
+"""
+import asyncio
+import statistics
+import time
+import httpx
+import pytest
+from fastapi import Depends
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+from DB.conexion import Session, get_read_db
+
+CLIENTES = 200
+# Unos segundos de CPU en SQLite, más que lo que tardan los 200 clientes
+CONSULTA_LENTA = text(
+    "WITH RECURSIVE n(x) AS (SELECT 1 UNION ALL SELECT x + 1 FROM n WHERE x < 6000000) SELECT count(*) FROM n"
+)
+
+
+@pytest.fixture(scope="module", autouse=True)
+def rutas_lentas(app):
+    async def lenta_sincrona():
+        db = Session()
+        try:
+            return {"filas": db.execute(CONSULTA_LENTA).scalar()}
+        finally:
+            db.close()
+
+    async def lenta_asincrona(db: AsyncSession = Depends(get_read_db)):
+        return {"filas": (await db.execute(CONSULTA_LENTA)).scalar()}
+
+    app.add_api_route("/pruebas/lenta-sincrona", lenta_sincrona)
+    app.add_api_route("/pruebas/lenta-asincrona", lenta_asincrona)
+
+
+def _percentil(valores, p):
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(len(ordenados) * p))]
+
+
+def _medir(cliente, app, cabeceras, ruta_lenta: str) -> dict:
+    async def carga():
+        transporte = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transporte, base_url="http://pruebas") as http:
+            async def rapida():
+                respuesta = await http.get("/cuentas/", headers=cabeceras)
+                assert respuesta.status_code == 200
+                return time.perf_counter()
+
+            async def lenta():
+                respuesta = await http.get(ruta_lenta)
+                assert respuesta.status_code == 200
+                return time.perf_counter()
+
+            # Todos llegan a la vez, la lenta primero; la latencia se mide desde
+            # ese instante, no desde que el event loop llega a atender a cada uno
+            llegada = time.perf_counter()
+            fin_lenta, *fines = await asyncio.gather(lenta(), *(rapida() for _ in range(CLIENTES)))
+            return llegada, fines, fin_lenta
+
+    llegada, fines, fin_lenta = cliente.portal.call(carga)
+    latencias = [fin - llegada for fin in fines]
+    return {
+        "p50_ms": round(statistics.median(latencias) * 1000, 1),
+        "p99_ms": round(_percentil(latencias, 0.99) * 1000, 1),
+        "antes_que_la_lenta": sum(fin < fin_lenta for fin in fines),
+    }
+
+
+@pytest.mark.benchmark
+def test_consulta_lenta_no_bloquea_a_los_demas(cliente, app, usuario):
+    antes = _medir(cliente, app, usuario["cabeceras"], "/pruebas/lenta-sincrona")
+    despues = _medir(cliente, app, usuario["cabeceras"], "/pruebas/lenta-asincrona")
+
+    print(f"\n{CLIENTES} clientes con una consulta lenta en curso:\n  antes   {antes}\n  después {despues}")
+    # Con la Session síncrona el event loop queda parado hasta que acaba la lenta
+    assert antes["antes_que_la_lenta"] == 0
+    assert despues["antes_que_la_lenta"] == CLIENTES
+    assert despues["p99_ms"] < antes["p99_ms"]
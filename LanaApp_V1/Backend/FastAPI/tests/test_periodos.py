@@ -0,0 +1,65 @@
+"""
+Filtros de periodo sargables (utils/periodos.py): EXPLAIN QUERY PLAN confirma
+que SQLite recorre un rango del índice en lugar de todo el historial del usuario.
+"""
+from datetime import date
+import pytest
+from sqlalchemy import select, func, extract
+from models.modelsDB import Transaccion
+from utils.periodos import rango_mes, rango_ano, rango_periodo, rango_fechas, filtro_periodo
+
+
+@pytest.fixture(scope="module")
+def plan(app):
+    from DB.conexion import engine
+
+    def _plan(query) -> str:
+        sql = query.compile(engine, compile_kwargs={"literal_binds": True})
+        with engine.connect() as conexion:
+            return "\n".join(fila[-1] for fila in conexion.exec_driver_sql(f"EXPLAIN QUERY PLAN {sql}"))
+    return _plan
+
+
+def test_rangos_semiabiertos():
+    assert rango_mes(2024, 12) == (date(2024, 12, 1), date(2025, 1, 1))
+    assert rango_ano(2025) == (date(2025, 1, 1), date(2026, 1, 1))
+    assert rango_periodo(2025, 3) == rango_mes(2025, 3)
+    assert rango_periodo(None, 3) is None
+    # fecha_fin de la API es inclusiva
+    assert rango_fechas(date(2025, 1, 1), date(2025, 1, 31)) == (date(2025, 1, 1), date(2025, 2, 1))
+
+
+def test_periodo_del_usuario_usa_rango_del_indice(plan):
+    query = select(func.sum(Transaccion.monto)).filter(
+        Transaccion.usuario_id == 1,
+        filtro_periodo(Transaccion.fecha, *rango_mes(2025, 3))
+    )
+
+    detalle = plan(query)
+
+    assert "ix_transacciones_usuario_fecha (usuario_id=? AND fecha>? AND fecha<?)" in detalle
+
+
+def test_periodo_de_una_categoria_usa_rango_del_indice(plan):
+    query = select(Transaccion.id, Transaccion.monto).filter(
+        Transaccion.usuario_id == 1,
+        Transaccion.categoria_id == 2,
+        filtro_periodo(Transaccion.fecha, *rango_ano(2025))
+    )
+
+    detalle = plan(query)
+
+    assert "ix_transacciones_usuario_categoria_fecha (usuario_id=? AND categoria_id=? AND fecha>? AND fecha<?)" in detalle
+
+
+def test_extract_no_acota_la_fecha(plan):
+    # El predicado anterior: el índice solo sirve para usuario_id y se revisa todo su historial
+    query = select(func.sum(Transaccion.monto)).filter(
+        Transaccion.usuario_id == 1,
+        extract("year", Transaccion.fecha) == 2025,
+        extract("month", Transaccion.fecha) == 3
+    )
+
+    detalle = plan(query)
+
+    assert "fecha>?" not in detalle
@@ -0,0 +1,55 @@
+"""
+Tormenta de logins: con más peticiones simultáneas que BCRYPT_WORKERS +
+BCRYPT_COLA_MAX, las que no caben reciben 503 con Retry-After al momento en vez
+de esperar en cola, y las admitidas terminan bien.
+
+La cola se reduce para la prueba: con los valores por defecto el pool de
+conexiones de escritura (el login lee el usuario antes de bcrypt) ya limita a
+menos de BCRYPT_WORKERS + BCRYPT_COLA_MAX los logins simultáneos.
+"""
+import asyncio
+import time
+import httpx
+import pytest
+from config import settings
+from utils import hashing
+from conftest import registrar
+
+COLA = 4
+EXCESO = 10
+
+
+@pytest.fixture
+def usuario_costoso(cliente, monkeypatch):
+    # Un hash más caro que el de las pruebas (BCRYPT_ROUNDS=4) para que la cola llegue a llenarse
+    monkeypatch.setattr(hashing, "_rounds", 10)
+    monkeypatch.setattr(settings, "BCRYPT_COLA_MAX", COLA)
+    return registrar(cliente)
+
+
+@pytest.mark.benchmark
+def test_logins_que_no_caben_reciben_503(cliente, app, usuario_costoso):
+    admitidos = settings.BCRYPT_WORKERS + settings.BCRYPT_COLA_MAX
+    formulario = {"username": usuario_costoso["email"], "password": usuario_costoso["password"]}
+
+    async def tormenta():
+        transporte = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transporte, base_url="http://pruebas") as http:
+            async def login():
+                inicio = time.perf_counter()
+                respuesta = await http.post("/api/auth/login", data=formulario)
+                return respuesta, time.perf_counter() - inicio
+            return await asyncio.gather(*(login() for _ in range(admitidos + EXCESO)))
+
+    resultados = cliente.portal.call(tormenta)
+    exitos = [duracion for respuesta, duracion in resultados if respuesta.status_code == 200]
+    rechazos = [(respuesta, duracion) for respuesta, duracion in resultados if respuesta.status_code == 503]
+
+    print(
+        f"\n{len(resultados)} logins simultáneos: {len(exitos)} ok (máx. {max(exitos) * 1000:.0f} ms), "
+        f"{len(rechazos)} rechazados (máx. {max(d for _, d in rechazos) * 1000:.0f} ms)"
+    )
+    assert len(exitos) + len(rechazos) == len(resultados)
+    assert len(rechazos) >= EXCESO
+    assert exitos
+    assert all(respuesta.headers.get("retry-after") == "1" for respuesta, _ in rechazos)
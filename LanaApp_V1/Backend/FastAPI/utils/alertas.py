@@ -0,0 +1,145 @@
+"""
+Evaluación de alertas de presupuesto fuera de la petición.
+
+crear_transaccion y procesar_pagos_pendientes registran (usuario, categoría, mes)
+en alertas_pendientes dentro de su propia transacción y, después del commit, lo
+encolan aquí. Un único worker toma lotes de la cola, junta las claves repetidas y
+evalúa cada una una sola vez. Una evaluación que falla se reintenta desde el mismo
+worker con espera exponencial (ALERTAS_REINTENTO_BASE_S hasta ALERTAS_REINTENTO_MAX_S);
+su fila sigue en la tabla mientras tanto. Al arrancar se vuelven a encolar las
+filas que quedaron, así que un reinicio no pierde alertas.
+"""
+import asyncio
+import logging
+import time
+from datetime import date
+from sqlalchemy import select, delete
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from config import settings
+from DB.conexion import AsyncSessionLocal
+from models.modelsDB import AlertaPendiente
+from routers.notificaciones import verificar_presupuestos
+
+logger = logging.getLogger("lana.alertas")
+
+_cola = None
+_worker = None
+# Claves en la cola y aún sin evaluar: no se encolan dos veces
+_encoladas = set()
+# Evaluaciones fallidas: clave -> (intentos, instante monotónico del próximo reintento)
+_reintentos = {}
+
+
+async def registrar_alerta(db: AsyncSession, usuario_id: int, categoria_id: int, fecha: date):
+    """
+    Añade la clave al outbox. No hace commit: va en la transacción del alta.
+    """
+    if not settings.ALERTAS_POR_TRANSACCION or usuario_id is None or categoria_id is None or fecha is None:
+        return
+    await db.execute(sqlite_insert(AlertaPendiente).values(
+        usuario_id=usuario_id,
+        categoria_id=categoria_id,
+        ano=fecha.year,
+        mes=fecha.month
+    ).on_conflict_do_nothing())
+
+
+def encolar_alerta(usuario_id: int, categoria_id: int, fecha: date):
+    """
+    Llamar después del commit. Sin worker (scripts) la fila espera en el outbox.
+    """
+    if _cola is None or not settings.ALERTAS_POR_TRANSACCION or usuario_id is None or categoria_id is None or fecha is None:
+        return
+    clave = (usuario_id, categoria_id, fecha.year, fecha.month)
+    if clave not in _encoladas:
+        _encoladas.add(clave)
+        _cola.put_nowait(clave)
+
+
+async def _evaluar(clave: tuple):
+    usuario_id, categoria_id, ano, mes = clave
+    async with AsyncSessionLocal() as db:
+        await db.execute(delete(AlertaPendiente).where(
+            AlertaPendiente.usuario_id == usuario_id,
+            AlertaPendiente.categoria_id == categoria_id,
+            AlertaPendiente.ano == ano,
+            AlertaPendiente.mes == mes
+        ))
+        # Si crea la notificación, su commit incluye el borrado del outbox
+        await verificar_presupuestos(db, usuario_id, categoria_id, ano, mes)
+        await db.commit()
+
+
+def _espera_reintento():
+    if not _reintentos:
+        return None
+    return max(min(vence for _, vence in _reintentos.values()) - time.monotonic(), 0)
+
+
+def _reintentos_vencidos() -> set:
+    ahora = time.monotonic()
+    return {clave for clave, (_, vence) in _reintentos.items() if vence <= ahora}
+
+
+async def _consumir():
+    terminar = False
+    while not terminar:
+        try:
+            # Sin reintentos pendientes espera sin límite a la siguiente clave
+            lote = {await asyncio.wait_for(_cola.get(), _espera_reintento())}
+        except asyncio.TimeoutError:
+            lote = set()
+        else:
+            # Pequeña espera para juntar las escrituras de una ráfaga en el mismo lote
+            await asyncio.sleep(settings.ALERTAS_ESPERA_LOTE_S)
+            while not _cola.empty() and len(lote) < settings.ALERTAS_LOTE_MAX:
+                lote.add(_cola.get_nowait())
+        if None in lote:
+            lote.discard(None)
+            terminar = True
+        lote |= _reintentos_vencidos()
+
+        for clave in lote:
+            # Antes de evaluar: una escritura posterior vuelve a encolar la clave
+            _encoladas.discard(clave)
+            try:
+                await _evaluar(clave)
+                _reintentos.pop(clave, None)
+            except Exception:
+                # La fila sigue en alertas_pendientes hasta que una evaluación termine
+                intentos = _reintentos.get(clave, (0, None))[0] + 1
+                espera = min(settings.ALERTAS_REINTENTO_BASE_S * 2 ** (intentos - 1), settings.ALERTAS_REINTENTO_MAX_S)
+                _reintentos[clave] = (intentos, time.monotonic() + espera)
+                logger.exception("Error al evaluar presupuesto %s (intento %s, reintento en %.1f s)", clave, intentos, espera)
+
+
+async def iniciar_alertas():
+    global _cola, _worker
+    _cola = asyncio.Queue()
+    async with AsyncSessionLocal() as db:
+        pendientes = (await db.execute(select(
+            AlertaPendiente.usuario_id, AlertaPendiente.categoria_id, AlertaPendiente.ano, AlertaPendiente.mes
+        ))).all()
+    for clave in pendientes:
+        _encoladas.add(tuple(clave))
+        _cola.put_nowait(tuple(clave))
+    if pendientes:
+        logger.info("alertas_pendientes: %s evaluaciones recuperadas", len(pendientes))
+    _worker = asyncio.create_task(_consumir())
+
+
+async def detener_alertas():
+    """
+    Evalúa lo que queda en la cola y detiene el worker.
+    """
+    global _cola, _worker
+    if _worker is None:
+        return
+    # El centinela va detrás de lo ya encolado
+    _cola.put_nowait(None)
+    await _worker
+    _cola = _worker = None
+    _encoladas.clear()
+    # Sus filas siguen en alertas_pendientes: el próximo arranque las recupera
+    _reintentos.clear()
@@ -0,0 +1,133 @@
+"""
+Barrido de alertas de presupuesto de todos los usuarios en bloque.
+
+Alternativa a la evaluación por transacción (utils/alertas.py): una sola
+sentencia UPDATE compara el gastado de cada presupuesto del periodo (que se
+mantiene en cada alta y baja, utils/presupuestos.py) con su límite, reclama el
+nivel de alerta que corresponde (nivel_alertado solo sube) y devuelve con
+RETURNING los presupuestos que deben avisar. Las notificaciones se insertan después con un único executemany. Como el
+reclamo es el mismo UPDATE condicional, barrido y worker nunca duplican una alerta.
+
+Uso como script (desde el directorio del backend):
+    python -m utils.barrido_presupuestos [--ano AAAA --mes MM]
+
+Con ALERTAS_BARRIDO_INTERVALO_S > 0 también corre periódicamente desde el lifespan.
+"""
+import argparse
+import asyncio
+import logging
+import sys
+import time
+from datetime import date
+from sqlalchemy import select, insert, update, func, case, and_
+from sqlalchemy.ext.asyncio import AsyncSession
+from config import settings
+from DB.conexion import AsyncSessionLocal, async_engine
+from models.modelsDB import Presupuesto, Categoria, Notificacion
+from utils.versiones import registrar_cambio
+from utils.despacho import despertar
+
+logger = logging.getLogger("lana.alertas")
+
+
+async def barrer_presupuestos(db: AsyncSession, ano: int, mes: int) -> dict:
+    """
+    Evalúa todos los presupuestos del periodo y crea las alertas pendientes.
+    Hace commit. Devuelve presupuestos evaluados, alertas creadas y duración.
+    """
+    inicio = time.perf_counter()
+
+    evaluados = await db.scalar(select(func.count(Presupuesto.id)).filter(
+        Presupuesto.ano == ano,
+        Presupuesto.mes == mes
+    ))
+
+    # Mismo criterio que verificar_presupuestos: el mayor umbral alcanzado,
+    # con alerta activa y aún no enviado
+    nivel = case(
+        (and_(Presupuesto.alerta_100, Presupuesto.gastado >= Presupuesto.limite, Presupuesto.nivel_alertado < 100), 100),
+        (and_(Presupuesto.alerta_80, Presupuesto.gastado >= Presupuesto.limite * 0.8, Presupuesto.nivel_alertado < 80), 80),
+    )
+
+    reclamados = (await db.execute(update(Presupuesto).where(
+        Presupuesto.ano == ano,
+        Presupuesto.mes == mes,
+        Presupuesto.limite > 0,
+        nivel.isnot(None)
+    ).values(nivel_alertado=nivel).returning(
+        Presupuesto.usuario_id, Presupuesto.categoria_id, Presupuesto.nivel_alertado
+    ).execution_options(synchronize_session=False))).all()
+
+    if reclamados:
+        nombres = dict((await db.execute(select(Categoria.id, Categoria.nombre).filter(
+            Categoria.id.in_({r.categoria_id for r in reclamados})
+        ))).all())
+        await db.execute(insert(Notificacion), [
+            {
+                "usuario_id": r.usuario_id,
+                "tipo": "presupuesto_excedido",
+                "mensaje": (
+                    f"Presupuesto excedido al 100% para {nombres.get(r.categoria_id)}"
+                    if r.nivel_alertado == 100 else
+                    f"Presupuesto alcanzó el 80% para {nombres.get(r.categoria_id)}"
+                ),
+                "datos_extra": {"nivel": f"{r.nivel_alertado}%", "categoria_id": r.categoria_id},
+                "estado": "pendiente",
+            }
+            for r in reclamados
+        ])
+        for usuario_id in {r.usuario_id for r in reclamados}:
+            registrar_cambio(db, "presupuestos", usuario_id)
+            registrar_cambio(db, "notificaciones", usuario_id)
+    await db.commit()
+    if reclamados:
+        despertar()
+
+    return {
+        "ano": ano,
+        "mes": mes,
+        "evaluados": evaluados,
+        "alertas": len(reclamados),
+        "duracion_ms": round((time.perf_counter() - inicio) * 1000, 1),
+    }
+
+
+async def _barrer_periodo_actual() -> dict:
+    hoy = date.today()
+    async with AsyncSessionLocal() as db:
+        resultado = await barrer_presupuestos(db, hoy.year, hoy.month)
+    logger.info(
+        "Barrido de presupuestos %s-%02d: %s evaluados, %s alertas en %s ms",
+        resultado["ano"], resultado["mes"], resultado["evaluados"], resultado["alertas"], resultado["duracion_ms"]
+    )
+    return resultado
+
+
+async def barrer_periodicamente():
+    while True:
+        await asyncio.sleep(settings.ALERTAS_BARRIDO_INTERVALO_S)
+        try:
+            await _barrer_periodo_actual()
+        except Exception:
+            logger.exception("Error en el barrido de presupuestos")
+
+
+async def _main(args) -> int:
+    hoy = date.today()
+    try:
+        async with AsyncSessionLocal() as db:
+            resultado = await barrer_presupuestos(db, args.ano or hoy.year, args.mes or hoy.month)
+        print(
+            f"{resultado['evaluados']} presupuestos evaluados, {resultado['alertas']} alertas "
+            f"creadas en {resultado['duracion_ms']} ms"
+        )
+        return 0
+    finally:
+        await async_engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Barrido de alertas de presupuesto")
+    parser.add_argument("--ano", type=int, default=None, help="Año del periodo (por defecto el actual)")
+    parser.add_argument("--mes", type=int, default=None, help="Mes del periodo (por defecto el actual)")
+    sys.exit(asyncio.run(_main(parser.parse_args())))
@@ -0,0 +1,98 @@
+import time
+from collections import OrderedDict
+from functools import wraps
+from config import settings
+from utils.versiones import version_datos
+
+
+class CacheLRU:
+    """
+    Cache LRU con TTL y número máximo de entradas, con contadores de uso.
+    Sin locks: solo se usa desde el event loop.
+    """
+
+    def __init__(self, max_entradas: int, ttl_segundos: float):
+        self.max_entradas = max_entradas
+        self.ttl_segundos = ttl_segundos
+        self._entradas = OrderedDict()
+        self.aciertos = 0
+        self.fallos = 0
+        self.expulsiones = 0
+        self.expiradas = 0
+
+    def obtener(self, clave):
+        entrada = self._entradas.get(clave)
+        if entrada is None:
+            self.fallos += 1
+            return None
+        expira, valor = entrada
+        if expira < time.monotonic():
+            del self._entradas[clave]
+            self.expiradas += 1
+            self.fallos += 1
+            return None
+        self._entradas.move_to_end(clave)
+        self.aciertos += 1
+        return valor
+
+    def guardar(self, clave, valor, ttl: float = None):
+        # ttl propio para entradas con caducidad conocida (p. ej. el exp de un JWT)
+        ttl = self.ttl_segundos if ttl is None else min(ttl, self.ttl_segundos)
+        self._entradas[clave] = (time.monotonic() + ttl, valor)
+        self._entradas.move_to_end(clave)
+        while len(self._entradas) > self.max_entradas:
+            self._entradas.popitem(last=False)
+            self.expulsiones += 1
+
+    def invalidar(self, clave):
+        self._entradas.pop(clave, None)
+
+    def estadisticas(self) -> dict:
+        consultas = self.aciertos + self.fallos
+        return {
+            "entradas": len(self._entradas),
+            "max_entradas": self.max_entradas,
+            "ttl_segundos": self.ttl_segundos,
+            "aciertos": self.aciertos,
+            "fallos": self.fallos,
+            "expulsiones": self.expulsiones,
+            "expiradas": self.expiradas,
+            "tasa_aciertos": round(self.aciertos / consultas, 4) if consultas else None,
+        }
+
+
+cache_analitica = CacheLRU(settings.CACHE_ANALITICA_MAX_ENTRADAS, settings.CACHE_ANALITICA_TTL_S)
+
+# Dominios de los que dependen las gráficas (ver utils/versiones.py)
+DOMINIOS_ANALITICA = ("finanzas", "categorias")
+
+
+def cacheado(endpoint: str):
+    """
+    Decorador para endpoints de gráficas. La clave es (usuario, endpoint, parámetros,
+    versión de los datos en versiones_datos): cualquier escritura del usuario, desde
+    cualquier worker, cambia la versión. Se lee antes de calcular, así que lo guardado
+    nunca es anterior a la versión de su clave.
+    El endpoint debe recibir `current_user` y `db` como parámetros con nombre.
+    """
+    def decorador(funcion):
+        if not settings.CACHE_ANALITICA:
+            return funcion
+
+        @wraps(funcion)
+        async def envoltura(**kwargs):
+            usuario_id = kwargs["current_user"].id
+            parametros = tuple(sorted(
+                (nombre, valor) for nombre, valor in kwargs.items()
+                if nombre not in ("current_user", "db")
+            ))
+            version = await version_datos(kwargs["db"], usuario_id, *DOMINIOS_ANALITICA)
+            clave = (usuario_id, endpoint, parametros, version)
+
+            valor = cache_analitica.obtener(clave)
+            if valor is None:
+                valor = await funcion(**kwargs)
+                cache_analitica.guardar(clave, valor)
+            return valor
+        return envoltura
+    return decorador
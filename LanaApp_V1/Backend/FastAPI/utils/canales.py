@@ -0,0 +1,191 @@
+"""
+Canales de envío de notificaciones (email, sms, push).
+
+Solo con la biblioteca estándar: smtplib y http.client corren en hilos
+(asyncio.to_thread) y reutilizan conexiones abiertas de un pool por canal, así
+que un lote no abre una conexión por mensaje. La concurrencia de cada canal la
+limita su semáforo.
+
+Un canal sin configurar (SMTP_HOST, SMS_URL o PUSH_URL vacíos) solo registra el
+mensaje en el log: sirve para desarrollo.
+"""
+import asyncio
+import http.client
+import json
+import logging
+import queue
+import smtplib
+from email.message import EmailMessage
+from urllib.parse import urlsplit
+from config import settings
+
+logger = logging.getLogger("lana.notificaciones")
+
+
+# Dato de contacto del usuario que usa cada canal
+CAMPO_DESTINO = {"email": "email", "sms": "telefono", "push": "usuario_id"}
+
+
+class ErrorEnvio(Exception):
+    pass
+
+
+class _PoolConexiones:
+    """
+    Conexiones bloqueantes reutilizables; una conexión que falla se descarta.
+    """
+
+    def __init__(self, crear, maximo: int):
+        self._crear = crear
+        self._libres = queue.LifoQueue(maxsize=maximo)
+
+    def usar(self, funcion):
+        try:
+            conexion = self._libres.get_nowait()
+            reutilizada = True
+        except queue.Empty:
+            conexion = self._crear()
+            reutilizada = False
+        try:
+            resultado = funcion(conexion)
+        except Exception:
+            self._cerrar(conexion)
+            if not reutilizada:
+                raise
+            # El servidor pudo cerrar la conexión inactiva: un intento con una nueva
+            conexion = self._crear()
+            try:
+                resultado = funcion(conexion)
+            except Exception:
+                self._cerrar(conexion)
+                raise
+        try:
+            self._libres.put_nowait(conexion)
+        except queue.Full:
+            self._cerrar(conexion)
+        return resultado
+
+    def cerrar(self):
+        while True:
+            try:
+                self._cerrar(self._libres.get_nowait())
+            except queue.Empty:
+                return
+
+    @staticmethod
+    def _cerrar(conexion):
+        try:
+            conexion.close()
+        except Exception:
+            pass
+
+
+class Canal:
+    nombre = None
+
+    def __init__(self, concurrencia: int):
+        self._semaforo = asyncio.Semaphore(concurrencia)
+
+    def destino(self, contacto: dict):
+        """
+        Dirección del usuario en este canal, o None si no tiene.
+        """
+        return contacto[CAMPO_DESTINO[self.nombre]]
+
+    async def enviar(self, destino, notificacion: dict):
+        async with self._semaforo:
+            await self._enviar(destino, notificacion)
+
+    async def _enviar(self, destino, notificacion: dict):
+        raise NotImplementedError
+
+    def cerrar(self):
+        pass
+
+
+class CanalRegistro(Canal):
+    def __init__(self, nombre: str, concurrencia: int):
+        super().__init__(concurrencia)
+        self.nombre = nombre
+
+    async def _enviar(self, destino, notificacion: dict):
+        logger.info("[%s] %s: %s", self.nombre, destino, notificacion["mensaje"])
+
+
+class CanalSMTP(Canal):
+    nombre = "email"
+
+    def __init__(self, concurrencia: int):
+        super().__init__(concurrencia)
+        self._pool = _PoolConexiones(self._conectar, settings.SMTP_CONEXIONES)
+
+    def _conectar(self):
+        conexion = smtplib.SMTP(settings.SMTP_HOST, settings.SMTP_PORT, timeout=settings.NOTIF_TIMEOUT_S)
+        if settings.SMTP_STARTTLS:
+            conexion.starttls()
+        if settings.SMTP_USUARIO:
+            conexion.login(settings.SMTP_USUARIO, settings.SMTP_PASSWORD)
+        return conexion
+
+    async def _enviar(self, destino, notificacion: dict):
+        mensaje = EmailMessage()
+        mensaje["From"] = settings.SMTP_REMITENTE
+        mensaje["To"] = destino
+        mensaje["Subject"] = "Lana App"
+        mensaje.set_content(notificacion["mensaje"] or "")
+        try:
+            await asyncio.to_thread(self._pool.usar, lambda conexion: conexion.send_message(mensaje))
+        except (smtplib.SMTPException, OSError) as error:
+            raise ErrorEnvio(str(error)) from error
+
+    def cerrar(self):
+        self._pool.cerrar()
+
+
+class CanalHTTP(Canal):
+    """
+    POST JSON a una pasarela (proveedor de SMS o servicio de push).
+    """
+
+    def __init__(self, nombre: str, url: str, concurrencia: int):
+        super().__init__(concurrencia)
+        self.nombre = nombre
+        partes = urlsplit(url)
+        self._ruta = partes.path or "/"
+        clase = http.client.HTTPSConnection if partes.scheme == "https" else http.client.HTTPConnection
+        self._pool = _PoolConexiones(
+            lambda: clase(partes.hostname, partes.port, timeout=settings.NOTIF_TIMEOUT_S),
+            settings.NOTIF_HTTP_CONEXIONES
+        )
+
+    def _post(self, conexion, cuerpo: bytes) -> int:
+        conexion.request("POST", self._ruta, body=cuerpo, headers={"Content-Type": "application/json"})
+        respuesta = conexion.getresponse()
+        # Leer el cuerpo completo para poder reutilizar la conexión
+        respuesta.read()
+        return respuesta.status
+
+    async def _enviar(self, destino, notificacion: dict):
+        cuerpo = json.dumps({
+            "destino": destino,
+            "tipo": notificacion["tipo"],
+            "mensaje": notificacion["mensaje"],
+        }).encode()
+        try:
+            estado = await asyncio.to_thread(self._pool.usar, lambda conexion: self._post(conexion, cuerpo))
+        except (http.client.HTTPException, OSError) as error:
+            raise ErrorEnvio(str(error)) from error
+        if estado >= 300:
+            raise ErrorEnvio(f"HTTP {estado}")
+
+    def cerrar(self):
+        self._pool.cerrar()
+
+
+def crear_canales() -> dict:
+    concurrencia = settings.NOTIF_CONCURRENCIA
+    return {
+        "email": CanalSMTP(concurrencia) if settings.SMTP_HOST else CanalRegistro("email", concurrencia),
+        "sms": CanalHTTP("sms", settings.SMS_URL, concurrencia) if settings.SMS_URL else CanalRegistro("sms", concurrencia),
+        "push": CanalHTTP("push", settings.PUSH_URL, concurrencia) if settings.PUSH_URL else CanalRegistro("push", concurrencia),
+    }
@@ -0,0 +1,220 @@
+"""
+Despacho de notificaciones pendientes por email, sms o push.
+
+Un worker reclama lotes de notificaciones vencidas con un solo UPDATE ...
+RETURNING que les pone un lease (bloqueada_hasta): otro proceso no las toma
+mientras dure, y si este muere antes de terminar vuelven a estar disponibles.
+Cada notificación sale por un solo canal: su `medio` si el usuario lo tiene
+activo o, si no, el primero activo en sus preferencias. Los envíos del lote van
+en paralelo y el resultado se guarda con un UPDATE en bloque por estado, solo
+en las que siguen pendientes (el usuario pudo leerlas durante el envío).
+
+Un fallo se reintenta con espera exponencial (NOTIF_BACKOFF_BASE_S * 2^intentos)
+hasta NOTIF_MAX_INTENTOS; después la notificación queda "fallida".
+"""
+import asyncio
+import logging
+import time
+from datetime import datetime, timedelta
+from sqlalchemy import select, update, or_, bindparam
+from config import settings
+from DB.conexion import AsyncSessionLocal
+from models.modelsDB import Notificacion, Usuario, PreferenciaNotificacion
+from utils.cache import CacheLRU
+from utils.canales import crear_canales
+from utils.versiones import registrar_cambio
+
+logger = logging.getLogger("lana.notificaciones")
+
+# Orden en que se prueban los canales cuando la notificación no fija un medio
+ORDEN_CANALES = ("push", "email", "sms")
+PREFERENCIA_CANAL = {"email": "por_email", "sms": "por_sms", "push": "por_push"}
+
+# Preferencias y datos de contacto por usuario (los valores por defecto del modelo si no tiene fila)
+_contactos = CacheLRU(settings.NOTIF_CACHE_CONTACTOS_MAX, settings.NOTIF_CACHE_CONTACTOS_TTL_S)
+_canales = None
+_despertador = None
+_estadisticas = {"lotes": 0, "enviadas": 0, "reintentos": 0, "fallidas": 0, "segundos_envio": 0.0}
+
+
+def invalidar_contacto(usuario_id: int):
+    """
+    Llamar después del commit que cambia el email, el teléfono o las preferencias.
+    """
+    _contactos.invalidar(usuario_id)
+
+
+def despertar():
+    """
+    Avisa al worker de que hay notificaciones nuevas, sin esperar al siguiente sondeo.
+    """
+    if _despertador is not None:
+        _despertador.set()
+
+
+def estadisticas() -> dict:
+    segundos = _estadisticas["segundos_envio"]
+    return {
+        **_estadisticas,
+        "segundos_envio": round(segundos, 3),
+        "por_segundo": round(_estadisticas["enviadas"] / segundos, 1) if segundos else None,
+        "cache_contactos": _contactos.estadisticas(),
+    }
+
+
+async def _cargar_contactos(db, usuario_ids: set) -> dict:
+    contactos = {}
+    faltantes = set()
+    for usuario_id in usuario_ids:
+        contacto = _contactos.obtener(usuario_id)
+        if contacto is None:
+            faltantes.add(usuario_id)
+        else:
+            contactos[usuario_id] = contacto
+
+    if faltantes:
+        filas = (await db.execute(select(
+            Usuario.id, Usuario.email, Usuario.telefono,
+            PreferenciaNotificacion.por_email, PreferenciaNotificacion.por_sms, PreferenciaNotificacion.por_push
+        ).outerjoin(
+            PreferenciaNotificacion, PreferenciaNotificacion.usuario_id == Usuario.id
+        ).filter(Usuario.id.in_(faltantes)))).all()
+        for f in filas:
+            contacto = {
+                "usuario_id": f.id,
+                "email": f.email,
+                "telefono": f.telefono,
+                # Sin fila de preferencias: los valores por defecto de PreferenciaNotificacion
+                "por_email": True if f.por_email is None else f.por_email,
+                "por_sms": False if f.por_sms is None else f.por_sms,
+                "por_push": True if f.por_push is None else f.por_push,
+            }
+            _contactos.guardar(f.id, contacto)
+            contactos[f.id] = contacto
+    return contactos
+
+
+def _elegir_canal(notificacion, contacto: dict):
+    """
+    (medio, destino) por el que sale la notificación, o (None, None) si el
+    usuario no tiene ningún canal activo con dato de contacto.
+    """
+    if contacto is None:
+        return None, None
+    candidatos = ORDEN_CANALES
+    if notificacion.medio in ORDEN_CANALES:
+        candidatos = (notificacion.medio,) + tuple(c for c in ORDEN_CANALES if c != notificacion.medio)
+    for medio in candidatos:
+        if contacto[PREFERENCIA_CANAL[medio]]:
+            destino = _canales[medio].destino(contacto)
+            if destino:
+                return medio, destino
+    return None, None
+
+
+async def _enviar(notificacion, medio, destino):
+    try:
+        await _canales[medio].enviar(destino, {"tipo": notificacion.tipo, "mensaje": notificacion.mensaje})
+        return True
+    except Exception as error:
+        logger.warning("Envío %s de la notificación %s falló: %s", medio, notificacion.id, error)
+        return False
+
+
+async def despachar_lote() -> int:
+    """
+    Reclama y envía un lote. Devuelve cuántas notificaciones reclamó.
+    """
+    ahora = datetime.utcnow()
+    async with AsyncSessionLocal() as db:
+        disponibles = select(Notificacion.id).filter(
+            Notificacion.estado == "pendiente",
+            or_(Notificacion.bloqueada_hasta.is_(None), Notificacion.bloqueada_hasta <= ahora),
+            or_(Notificacion.programada_para.is_(None), Notificacion.programada_para <= ahora)
+        ).order_by(Notificacion.id).limit(settings.NOTIF_LOTE)
+
+        reclamadas = (await db.execute(update(Notificacion).where(
+            Notificacion.id.in_(disponibles.scalar_subquery())
+        ).values(
+            bloqueada_hasta=ahora + timedelta(seconds=settings.NOTIF_LEASE_S)
+        ).returning(
+            Notificacion.id, Notificacion.usuario_id, Notificacion.tipo, Notificacion.medio,
+            Notificacion.mensaje, Notificacion.intentos
+        ).execution_options(synchronize_session=False))).all()
+        # El lease queda confirmado antes de los envíos, que pueden tardar
+        await db.commit()
+        if not reclamadas:
+            return 0
+
+        inicio = time.perf_counter()
+        contactos = await _cargar_contactos(db, {n.usuario_id for n in reclamadas if n.usuario_id is not None})
+        envios = [(n, *_elegir_canal(n, contactos.get(n.usuario_id))) for n in reclamadas]
+        resultados = await asyncio.gather(*(
+            _enviar(n, medio, destino) for n, medio, destino in envios if medio is not None
+        ))
+        duracion = time.perf_counter() - inicio
+
+        enviado = datetime.utcnow()
+        exitos, sin_canal, reintentos, fallidas = [], [], [], []
+        resultados = iter(resultados)
+        for n, medio, destino in envios:
+            if medio is None:
+                # Sin canal externo: queda solo en la app, con el medio que pidió
+                sin_canal.append({"b_id": n.id, "estado": "enviada", "enviada_en": enviado, "bloqueada_hasta": None})
+            elif next(resultados):
+                exitos.append({"b_id": n.id, "estado": "enviada", "medio": medio, "enviada_en": enviado, "bloqueada_hasta": None})
+            elif n.intentos + 1 >= settings.NOTIF_MAX_INTENTOS:
+                fallidas.append({"b_id": n.id, "estado": "fallida", "intentos": n.intentos + 1, "bloqueada_hasta": None})
+            else:
+                reintentos.append({
+                    "b_id": n.id,
+                    "intentos": n.intentos + 1,
+                    "bloqueada_hasta": enviado + timedelta(seconds=settings.NOTIF_BACKOFF_BASE_S * 2 ** n.intentos),
+                })
+
+        # Un executemany por forma de UPDATE. Solo las que siguen pendientes: el
+        # usuario pudo leerla mientras se enviaba y "leida" no debe perderse
+        tabla = Notificacion.__table__
+        sentencia = update(tabla).where(tabla.c.id == bindparam("b_id"), tabla.c.estado == "pendiente")
+        for filas in (exitos, sin_canal, reintentos, fallidas):
+            if filas:
+                await db.execute(sentencia, filas)
+        for usuario_id in {n.usuario_id for n in reclamadas if n.usuario_id is not None}:
+            registrar_cambio(db, "notificaciones", usuario_id)
+        await db.commit()
+
+    _estadisticas["lotes"] += 1
+    _estadisticas["enviadas"] += len(exitos) + len(sin_canal)
+    _estadisticas["reintentos"] += len(reintentos)
+    _estadisticas["fallidas"] += len(fallidas)
+    _estadisticas["segundos_envio"] += duracion
+    logger.info(
+        "Despacho: %s enviadas, %s a reintentar, %s fallidas en %.0f ms",
+        len(exitos) + len(sin_canal), len(reintentos), len(fallidas), duracion * 1000
+    )
+    return len(reclamadas)
+
+
+async def despachar_periodicamente():
+    global _canales, _despertador
+    _canales = crear_canales()
+    _despertador = asyncio.Event()
+    try:
+        while True:
+            try:
+                reclamadas = await despachar_lote()
+            except Exception:
+                logger.exception("Error al despachar notificaciones")
+                reclamadas = 0
+            if reclamadas >= settings.NOTIF_LOTE:
+                # Lote lleno: probablemente quedan más
+                continue
+            try:
+                await asyncio.wait_for(_despertador.wait(), settings.NOTIF_INTERVALO_S)
+            except asyncio.TimeoutError:
+                pass
+            _despertador.clear()
+    finally:
+        for canal in _canales.values():
+            canal.cerrar()
+        _canales = _despertador = None
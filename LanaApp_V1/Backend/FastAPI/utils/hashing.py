@@ -0,0 +1,103 @@
+"""
+bcrypt fuera del event loop.
+
+Cada hash/verificación cuesta cientos de ms de CPU; se ejecutan en un pool de
+procesos dedicado con concurrencia acotada. Si la cola de espera supera
+BCRYPT_COLA_MAX se responde 503 en lugar de acumular latencia.
+
+Las funciones que corren en el pool solo usan passlib.
+"""
+import asyncio
+import logging
+import time
+from concurrent.futures import ProcessPoolExecutor
+from passlib.hash import bcrypt as bcrypt_hash
+from fastapi import HTTPException, status
+from config import settings
+
+logger = logging.getLogger("lana.auth")
+
+# Factor de costo en uso: BCRYPT_ROUNDS o el calibrado al arrancar
+_rounds = settings.BCRYPT_ROUNDS or 12
+_pool = None
+_semaforo = None
+_en_espera = 0
+
+
+# Funciones que corren en los procesos del pool (deben poder serializarse con pickle)
+def _hash(password: str, rounds: int) -> str:
+    return bcrypt_hash.using(rounds=rounds).hash(password)
+
+
+def _verificar(password: str, hashed: str) -> bool:
+    try:
+        return bcrypt_hash.verify(password, hashed)
+    except (ValueError, TypeError):
+        return False
+
+
+def _medir(rounds: int) -> float:
+    inicio = time.perf_counter()
+    _hash("calibracion", rounds)
+    return (time.perf_counter() - inicio) * 1000
+
+
+async def iniciar_pool():
+    """
+    Crea el pool y, si BCRYPT_ROUNDS es 0, elige el mayor factor de costo cuyo
+    hash tarda como máximo BCRYPT_OBJETIVO_MS en este equipo.
+    """
+    global _pool, _semaforo, _rounds
+    _pool = ProcessPoolExecutor(max_workers=settings.BCRYPT_WORKERS)
+    _semaforo = asyncio.Semaphore(settings.BCRYPT_WORKERS)
+
+    if settings.BCRYPT_ROUNDS:
+        _rounds = settings.BCRYPT_ROUNDS
+    else:
+        loop = asyncio.get_running_loop()
+        rounds = settings.BCRYPT_ROUNDS_MIN
+        # Cada round duplica el costo: se mide uno y se sube mientras quepa el siguiente
+        duracion = await loop.run_in_executor(_pool, _medir, rounds)
+        while rounds < settings.BCRYPT_ROUNDS_MAX and duracion * 2 <= settings.BCRYPT_OBJETIVO_MS:
+            rounds += 1
+            duracion = await loop.run_in_executor(_pool, _medir, rounds)
+        _rounds = rounds
+        logger.info("bcrypt calibrado: rounds=%s (%.0f ms por hash)", _rounds, duracion)
+
+
+def cerrar_pool():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=True, cancel_futures=True)
+        _pool = None
+
+
+async def _ejecutar(funcion, *args):
+    global _en_espera
+    if _pool is None:
+        # Sin lifespan (scripts, consola): se usa el hilo por defecto del loop
+        return await asyncio.get_running_loop().run_in_executor(None, funcion, *args)
+
+    # _en_espera incluye los que ya ocupan un proceso del pool
+    if _en_espera >= settings.BCRYPT_WORKERS + settings.BCRYPT_COLA_MAX:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Servicio ocupado, intenta de nuevo en unos segundos",
+            headers={"Retry-After": "1"},
+        )
+    _en_espera += 1
+    try:
+        async with _semaforo:
+            return await asyncio.get_running_loop().run_in_executor(_pool, funcion, *args)
+    finally:
+        _en_espera -= 1
+
+
+async def hash_password(password: str) -> str:
+    return await _ejecutar(_hash, password, _rounds)
+
+
+async def verify_password(password: str, hashed: str) -> bool:
+    if not hashed:
+        return False
+    return await _ejecutar(_verificar, password, hashed)
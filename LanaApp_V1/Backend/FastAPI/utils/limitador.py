@@ -0,0 +1,191 @@
+"""
+Límite de intentos para login y recuperación de contraseña.
+
+Ventana deslizante aproximada: se cuentan los intentos de la ventana fija actual
+y de la anterior, y la anterior pesa en proporción a lo que aún queda de ella
+dentro de los últimos `ventana` segundos. Dos enteros por clave.
+
+El almacén es intercambiable (LIMITE_BACKEND):
+  - "memoria": por worker, sin E/S, como mucho LIMITE_MAX_CLAVES claves (LRU).
+  - "sqlite": archivo local compartido por todos los workers de la máquina.
+
+Detrás de un proxy la IP del cliente sale de LIMITE_CABECERA_IP, solo si la
+conexión viene de uno de LIMITE_PROXIES_CONFIABLES (si no, cualquiera podría
+elegir su IP y esquivar el límite).
+"""
+import asyncio
+import ipaddress
+import math
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from fastapi import HTTPException, Request, status
+from config import settings
+
+
+def _evaluar(inicio: float, actual: int, anterior: int, ahora: float, ventana: float, limite: int):
+    """
+    Devuelve (inicio, actual, anterior) de la ventana vigente y los segundos a
+    esperar (0 si el intento se admite; en ese caso ya está contado).
+    """
+    inicio_vigente = ahora - ahora % ventana
+    if inicio_vigente != inicio:
+        # Si la ventana guardada no es la inmediatamente anterior, ya no pesa
+        anterior = actual if inicio_vigente - inicio == ventana else 0
+        actual = 0
+        inicio = inicio_vigente
+
+    transcurrido = ahora - inicio
+    peso_anterior = 1 - transcurrido / ventana
+    if anterior * peso_anterior + actual + 1 <= limite:
+        return (inicio, actual + 1, anterior), 0.0
+
+    # Momento en que el peso de la ventana anterior deja sitio para un intento más
+    if actual + 1 <= limite:
+        espera = ventana * (1 - (limite - actual - 1) / anterior) - transcurrido
+    else:
+        # La ventana actual ya está llena: en la siguiente pasa a ser la anterior
+        espera = ventana - transcurrido + ventana * (1 - (limite - 1) / actual)
+    return (inicio, actual, anterior), max(espera, 1.0)
+
+
+class AlmacenMemoria:
+    """
+    LRU acotado: al pasar de max_claves se descarta la clave usada hace más
+    tiempo, en O(1) por intento.
+    """
+
+    def __init__(self, max_claves: int):
+        self.max_claves = max_claves
+        self._claves = OrderedDict()
+
+    async def intentar(self, clave: str, ventana: float, limite: int) -> float:
+        estado, espera = _evaluar(*self._claves.get(clave, (0.0, 0, 0)), time.time(), ventana, limite)
+        self._claves[clave] = estado
+        self._claves.move_to_end(clave)
+        while len(self._claves) > self.max_claves:
+            self._claves.popitem(last=False)
+        return espera
+
+    async def reiniciar(self, clave: str):
+        self._claves.pop(clave, None)
+
+
+class AlmacenSQLite:
+    """
+    Contadores en un archivo SQLite aparte de la base de la app. BEGIN IMMEDIATE
+    hace atómico el leer-evaluar-escribir entre procesos.
+    """
+
+    def __init__(self, ruta: str):
+        self._conexion = sqlite3.connect(ruta, isolation_level=None, check_same_thread=False, timeout=5)
+        self._conexion.execute("PRAGMA journal_mode=WAL")
+        self._conexion.execute("PRAGMA synchronous=NORMAL")
+        self._conexion.execute(
+            "CREATE TABLE IF NOT EXISTS limites ("
+            "clave TEXT PRIMARY KEY, inicio REAL NOT NULL, actual INTEGER NOT NULL, anterior INTEGER NOT NULL)"
+        )
+        self._lock = threading.Lock()
+
+    def _intentar(self, clave: str, ventana: float, limite: int) -> float:
+        with self._lock:
+            self._conexion.execute("BEGIN IMMEDIATE")
+            try:
+                fila = self._conexion.execute(
+                    "SELECT inicio, actual, anterior FROM limites WHERE clave = ?", (clave,)
+                ).fetchone()
+                estado, espera = _evaluar(*(fila or (0.0, 0, 0)), time.time(), ventana, limite)
+                self._conexion.execute(
+                    "INSERT OR REPLACE INTO limites (clave, inicio, actual, anterior) VALUES (?, ?, ?, ?)",
+                    (clave, *estado)
+                )
+                self._conexion.execute("COMMIT")
+            except BaseException:
+                self._conexion.execute("ROLLBACK")
+                raise
+            return espera
+
+    def _reiniciar(self, clave: str):
+        with self._lock:
+            self._conexion.execute("DELETE FROM limites WHERE clave = ?", (clave,))
+
+    async def intentar(self, clave: str, ventana: float, limite: int) -> float:
+        return await asyncio.to_thread(self._intentar, clave, ventana, limite)
+
+    async def reiniciar(self, clave: str):
+        await asyncio.to_thread(self._reiniciar, clave)
+
+
+def _crear_almacen():
+    if settings.LIMITE_BACKEND == "sqlite":
+        ruta = settings.LIMITE_SQLITE_PATH or os.path.join(
+            os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "DB", "limites.sqlite"
+        )
+        return AlmacenSQLite(ruta)
+    return AlmacenMemoria(settings.LIMITE_MAX_CLAVES)
+
+
+almacen = _crear_almacen()
+
+
+def _redes(valor: str) -> tuple:
+    return tuple(ipaddress.ip_network(red.strip(), strict=False) for red in valor.split(",") if red.strip())
+
+
+_proxies = _redes(settings.LIMITE_PROXIES_CONFIABLES)
+
+
+def _es_proxy(ip: str) -> bool:
+    try:
+        direccion = ipaddress.ip_address(ip)
+    except ValueError:
+        return False
+    return any(direccion in red for red in _proxies)
+
+
+def ip_cliente(request: Request) -> str:
+    """
+    IP del cliente. Si la conexión viene de un proxy confiable se recorre la
+    cabecera de derecha a izquierda y se toma la primera IP que no es de un proxy
+    (las de la izquierda las pone el propio cliente).
+    """
+    ip = request.client.host if request.client else "desconocida"
+    if not _proxies or not _es_proxy(ip):
+        return ip
+    cabecera = request.headers.get(settings.LIMITE_CABECERA_IP)
+    if not cabecera:
+        return ip
+    for salto in reversed([s.strip() for s in cabecera.split(",") if s.strip()]):
+        if not _es_proxy(salto):
+            return salto
+        ip = salto
+    return ip
+
+
+async def comprobar_limite(accion: str, ip: str, email: str, por_ip: int, por_email: int, ventana: float):
+    """
+    Cuenta un intento de `accion` para la IP y el email; si alguno supera su
+    límite responde 429 con Retry-After. Llamar antes de cualquier trabajo costoso.
+    """
+    if not settings.LIMITE_ACTIVO:
+        return
+    espera = max(
+        await almacen.intentar(f"{accion}:ip:{ip}", ventana, por_ip),
+        await almacen.intentar(f"{accion}:email:{email.strip().lower()}", ventana, por_email),
+    )
+    if espera:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Demasiados intentos, intenta de nuevo más tarde",
+            headers={"Retry-After": str(math.ceil(espera))},
+        )
+
+
+async def reiniciar_limite(accion: str, email: str):
+    """
+    Tras un login correcto el email vuelve a tener todos sus intentos.
+    """
+    if settings.LIMITE_ACTIVO:
+        await almacen.reiniciar(f"{accion}:email:{email.strip().lower()}")
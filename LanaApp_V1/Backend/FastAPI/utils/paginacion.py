@@ -0,0 +1,59 @@
+import base64
+import json
+from datetime import date, datetime
+from fastapi import HTTPException, status
+from sqlalchemy import select, func, tuple_
+
+
+def codificar_cursor(*valores) -> str:
+    """
+    Cursor opaco a partir de la clave de orden de la última fila devuelta.
+    """
+    serializables = [
+        v.isoformat() if isinstance(v, (date, datetime)) else v
+        for v in valores
+    ]
+    crudo = json.dumps(serializables, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(crudo).decode().rstrip("=")
+
+
+def decodificar_cursor(cursor: str, *conversores) -> list:
+    """
+    Inverso de codificar_cursor; cada conversor reconstruye un valor
+    (p. ej. date.fromisoformat, int).
+    """
+    try:
+        relleno = "=" * (-len(cursor) % 4)
+        valores = json.loads(base64.urlsafe_b64decode(cursor + relleno))
+        if len(valores) != len(conversores):
+            raise ValueError
+        return [
+            conversor(valor) if valor is not None else None
+            for conversor, valor in zip(conversores, valores)
+        ]
+    except (ValueError, TypeError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Cursor inválido"
+        )
+
+
+# Tope del conteo opcional: más allá de esto el cliente solo necesita saber "muchos"
+TOPE_TOTAL_APROXIMADO = 10000
+
+
+def filtro_cursor(columnas, valores, descendente=False):
+    """
+    Filas posteriores al cursor en el orden de `columnas` (comparación por fila,
+    que SQLite resuelve como un rango sobre el índice).
+    """
+    clave, cursor = tuple_(*columnas), tuple_(*valores)
+    return clave < cursor if descendente else clave > cursor
+
+
+async def contar_aproximado(db, query, tope: int = TOPE_TOTAL_APROXIMADO) -> int:
+    """
+    COUNT acotado a `tope` filas: su costo no crece con el historial del usuario.
+    """
+    acotada = query.order_by(None).limit(tope).subquery()
+    return await db.scalar(select(func.count()).select_from(acotada))
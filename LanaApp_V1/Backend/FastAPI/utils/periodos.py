@@ -0,0 +1,53 @@
+from datetime import date, timedelta
+from typing import Optional, Tuple
+from sqlalchemy import and_
+
+# Todos los rangos son semiabiertos: [inicio, fin)
+# Así "fecha >= inicio AND fecha < fin" puede usar los índices sobre fecha,
+# cosa que no ocurre con extract('month'/'year', fecha) == valor.
+Rango = Tuple[date, date]
+
+
+def rango_mes(ano: int, mes: int) -> Rango:
+    inicio = date(ano, mes, 1)
+    fin = date(ano + 1, 1, 1) if mes == 12 else date(ano, mes + 1, 1)
+    return inicio, fin
+
+
+def rango_ano(ano: int) -> Rango:
+    return date(ano, 1, 1), date(ano + 1, 1, 1)
+
+
+def rango_anos(ano_inicio: int, ano_fin: int) -> Rango:
+    return date(ano_inicio, 1, 1), date(ano_fin + 1, 1, 1)
+
+
+def rango_periodo(ano: Optional[int] = None, mes: Optional[int] = None) -> Optional[Rango]:
+    """
+    Rango del mes si se indican año y mes, del año si solo se indica el año.
+    Devuelve None si no hay año (sin filtro de periodo).
+    """
+    if ano and mes:
+        return rango_mes(ano, mes)
+    if ano:
+        return rango_ano(ano)
+    return None
+
+
+def rango_fechas(fecha_inicio: Optional[date] = None, fecha_fin: Optional[date] = None) -> Tuple[Optional[date], Optional[date]]:
+    """
+    Convierte un rango inclusivo de la API (fecha_fin incluida) a semiabierto.
+    """
+    return fecha_inicio, (fecha_fin + timedelta(days=1)) if fecha_fin else None
+
+
+def filtro_periodo(columna, inicio: Optional[date], fin: Optional[date]):
+    """
+    Predicado sargable "columna >= inicio AND columna < fin"; los extremos None se omiten.
+    """
+    condiciones = []
+    if inicio is not None:
+        condiciones.append(columna >= inicio)
+    if fin is not None:
+        condiciones.append(columna < fin)
+    return and_(True, *condiciones)
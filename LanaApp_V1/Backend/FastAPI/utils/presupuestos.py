@@ -0,0 +1,161 @@
+"""
+Mantenimiento de Presupuesto.gastado y del nivel de alerta ya enviado.
+
+gastado = suma de las transacciones del usuario en la categoría y el mes del
+presupuesto, si la categoría es de gasto (igual que en resumen_mensual).
+nivel_alertado (0, 80 o 100) solo sube: cada alerta se envía una vez por periodo.
+
+Uso como script (desde el directorio del backend):
+    python -m utils.presupuestos reconstruir [--usuario ID]
+    python -m utils.presupuestos verificar [--usuario ID]
+"""
+import argparse
+import asyncio
+import sys
+from collections import defaultdict
+from datetime import date
+from decimal import Decimal
+from sqlalchemy import select, update, and_
+from sqlalchemy.ext.asyncio import AsyncSession
+from DB.conexion import AsyncSessionLocal, async_engine
+from models.modelsDB import Presupuesto, Categoria, ResumenMensual
+from utils.versiones import registrar_cambio
+
+NIVELES = (100, 80)
+
+
+def nivel_alcanzado(gastado, limite) -> int:
+    if not limite:
+        return 0
+    porcentaje = Decimal(str(gastado or 0)) / Decimal(str(limite)) * 100
+    for nivel in NIVELES:
+        if porcentaje >= nivel:
+            return nivel
+    return 0
+
+
+async def acumular_gasto(db: AsyncSession, usuario_id: int, categoria_id: int, fecha: date, monto):
+    """
+    Suma `monto` al gastado del presupuesto del mes, si existe y la categoría es
+    de gasto, en un solo UPDATE. Para una baja se pasa el monto en negativo.
+    No hace commit: va en la transacción de quien lo llama.
+    """
+    if usuario_id is None or categoria_id is None or fecha is None or monto is None:
+        return
+
+    await db.execute(update(Presupuesto).where(
+        Presupuesto.usuario_id == usuario_id,
+        Presupuesto.categoria_id == categoria_id,
+        Presupuesto.ano == fecha.year,
+        Presupuesto.mes == fecha.month,
+        Presupuesto.categoria_id.in_(select(Categoria.id).where(Categoria.tipo == 'gasto'))
+    ).values(gastado=Presupuesto.gastado + monto))
+    # gastado sale en las respuestas de /presupuestos: invalida su ETag
+    registrar_cambio(db, "presupuestos", usuario_id)
+
+
+async def acumular_gastos(db: AsyncSession, transacciones, signo: int = 1):
+    """
+    acumular_gasto para varias transacciones, con un UPDATE por mes y categoría.
+    """
+    acumulado = defaultdict(int)
+    for t in transacciones:
+        if t.fecha is not None:
+            acumulado[(t.usuario_id, t.categoria_id, t.fecha.replace(day=1))] += t.monto * signo
+
+    for (usuario_id, categoria_id, fecha), monto in acumulado.items():
+        await acumular_gasto(db, usuario_id, categoria_id, fecha, monto)
+
+
+async def gasto_del_periodo(db: AsyncSession, usuario_id: int, categoria_id: int, ano: int, mes: int):
+    """
+    Gasto ya registrado en el periodo: una fila de resumen_mensual.
+    Para inicializar gastado al crear o mover un presupuesto.
+    """
+    return await db.scalar(select(
+        ResumenMensual.total
+    ).join(
+        Categoria, ResumenMensual.categoria_id == Categoria.id
+    ).filter(
+        ResumenMensual.usuario_id == usuario_id,
+        ResumenMensual.ano == ano,
+        ResumenMensual.mes == mes,
+        ResumenMensual.categoria_id == categoria_id,
+        Categoria.tipo == 'gasto'
+    )) or 0
+
+
+def _gastados_calculados(usuario_id: int = None):
+    query = select(
+        Presupuesto.id,
+        Presupuesto.gastado,
+        ResumenMensual.total.label('calculado')
+    ).outerjoin(
+        Categoria, and_(Presupuesto.categoria_id == Categoria.id, Categoria.tipo == 'gasto')
+    ).outerjoin(
+        ResumenMensual, and_(
+            ResumenMensual.usuario_id == Presupuesto.usuario_id,
+            ResumenMensual.ano == Presupuesto.ano,
+            ResumenMensual.mes == Presupuesto.mes,
+            ResumenMensual.categoria_id == Categoria.id
+        )
+    )
+    if usuario_id is not None:
+        query = query.filter(Presupuesto.usuario_id == usuario_id)
+    return query
+
+
+async def reconstruir_gastados(db: AsyncSession, usuario_id: int = None) -> int:
+    """
+    Recalcula gastado desde resumen_mensual (todos los presupuestos o los de un
+    usuario) y hace commit. nivel_alertado no cambia. Devuelve los presupuestos actualizados.
+    """
+    filas = (await db.execute(_gastados_calculados(usuario_id))).all()
+    if filas:
+        await db.execute(update(Presupuesto), [
+            {"id": f.id, "gastado": f.calculado or 0} for f in filas
+        ])
+        registrar_cambio(db, "presupuestos", usuario_id)
+    await db.commit()
+    return len(filas)
+
+
+async def verificar_gastados(db: AsyncSession, usuario_id: int = None) -> list:
+    """
+    Presupuestos cuyo gastado no coincide con el calculado desde resumen_mensual.
+    """
+    diferencias = []
+    for f in (await db.execute(_gastados_calculados(usuario_id))).all():
+        actual = Decimal(str(f.gastado or 0))
+        calculado = Decimal(str(f.calculado or 0))
+        if abs(actual - calculado) >= Decimal("0.01"):
+            diferencias.append({
+                "presupuesto_id": f.id,
+                "gastado": float(actual),
+                "calculado": float(calculado),
+            })
+    return diferencias
+
+
+async def _main(args) -> int:
+    try:
+        async with AsyncSessionLocal() as db:
+            if args.comando == "reconstruir":
+                presupuestos = await reconstruir_gastados(db, args.usuario)
+                print(f"gastado reconstruido en {presupuestos} presupuestos")
+                return 0
+
+            diferencias = await verificar_gastados(db, args.usuario)
+            for diferencia in diferencias:
+                print(diferencia)
+            print(f"{len(diferencias)} diferencias")
+            return 1 if diferencias else 0
+    finally:
+        await async_engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Mantenimiento de Presupuesto.gastado")
+    parser.add_argument("comando", choices=["reconstruir", "verificar"])
+    parser.add_argument("--usuario", type=int, default=None, help="Solo los presupuestos de este usuario")
+    sys.exit(asyncio.run(_main(parser.parse_args())))
@@ -0,0 +1,151 @@
+"""
+Programador de notificaciones con fecha futura (programada_para).
+
+En lugar de consultar la tabla cada segundo, las notificaciones pendientes de
+las próximas NOTIF_VENTANA_HORAS se cargan en un heap en memoria (una consulta
+por el índice (estado, programada_para)) y un temporizador despierta al
+despacho (utils/despacho.py) justo cuando vence la primera. Las que se insertan
+después entran al heap al hacer commit (eventos de sesión, como en
+utils/versiones.py) si caen dentro de la ventana; las demás se cargan al
+avanzar la ventana. Como mucho NOTIF_PROGRAMADAS_MAX entradas en memoria: si
+el cupo se llena, la ventana acaba en la última fila cargada según
+(programada_para, id), así que las que comparten instante con ella no se pierden.
+
+Las notificaciones con fecha futura las crea POST /notificaciones/.
+
+El despacho sigue siendo quien reclama las filas en la base: el heap solo
+decide cuándo despertarlo.
+"""
+import asyncio
+import heapq
+import logging
+import sys
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session
+from config import settings
+from DB.conexion import AsyncSessionLocal
+from models.modelsDB import Notificacion
+from utils.despacho import despertar
+from utils.paginacion import filtro_cursor
+
+logger = logging.getLogger("lana.notificaciones")
+
+# (programada_para, id) de las pendientes dentro de la ventana
+_heap = []
+_programadas = set()
+# Fin de la ventana cargada como (programada_para, id); None mientras el programador no corre
+_ventana_hasta = None
+_cambio = None
+
+
+def hora_utc(momento: datetime) -> datetime:
+    """
+    programada_para se guarda sin zona, en UTC (como utcnow en el despacho).
+    """
+    if momento.tzinfo is not None:
+        momento = momento.astimezone(timezone.utc).replace(tzinfo=None)
+    return momento
+
+
+def programar(notificacion_id: int, programada_para: datetime):
+    """
+    Añade una notificación al heap si cae dentro de la ventana cargada.
+    """
+    if _ventana_hasta is None or notificacion_id in _programadas:
+        return
+    momento = hora_utc(programada_para)
+    if (momento, notificacion_id) > _ventana_hasta or len(_programadas) >= settings.NOTIF_PROGRAMADAS_MAX:
+        return
+    primera = _heap[0][0] if _heap else None
+    heapq.heappush(_heap, (momento, notificacion_id))
+    _programadas.add(notificacion_id)
+    if primera is None or momento < primera:
+        # Vence antes que la que espera el temporizador
+        _cambio.set()
+
+
+async def _cargar_ventana(ahora: datetime):
+    """
+    Carga las pendientes desde el fin de la ventana anterior hasta ahora + NOTIF_VENTANA_HORAS.
+    """
+    global _ventana_hasta
+    desde = _ventana_hasta or (ahora, sys.maxsize)
+    hasta = ahora + timedelta(hours=settings.NOTIF_VENTANA_HORAS)
+    espacio = settings.NOTIF_PROGRAMADAS_MAX - len(_programadas)
+    if espacio <= 0:
+        return
+
+    async with AsyncSessionLocal() as db:
+        filas = (await db.execute(select(
+            Notificacion.programada_para, Notificacion.id
+        ).filter(
+            Notificacion.estado == "pendiente",
+            filtro_cursor((Notificacion.programada_para, Notificacion.id), desde),
+            Notificacion.programada_para <= hasta
+        ).order_by(Notificacion.programada_para, Notificacion.id).limit(espacio))).all()
+
+    for momento, notificacion_id in filas:
+        if notificacion_id not in _programadas:
+            heapq.heappush(_heap, (momento, notificacion_id))
+            _programadas.add(notificacion_id)
+    # Si se llenó el cupo, la ventana acaba en la última cargada
+    _ventana_hasta = tuple(filas[-1]) if len(filas) == espacio else (hasta, sys.maxsize)
+    logger.info("Programador: %s notificaciones hasta %s", len(_programadas), _ventana_hasta[0].isoformat())
+
+
+async def programar_periodicamente():
+    global _ventana_hasta, _cambio
+    _cambio = asyncio.Event()
+    _heap.clear()
+    _programadas.clear()
+    try:
+        while True:
+            ahora = datetime.utcnow()
+            # Se avanza la ventana a mitad de camino para no quedarse sin entradas
+            recarga = (_ventana_hasta[0] - timedelta(hours=settings.NOTIF_VENTANA_HORAS / 2)) if _ventana_hasta else ahora
+            if ahora >= recarga:
+                try:
+                    await _cargar_ventana(ahora)
+                except Exception:
+                    logger.exception("Error al cargar notificaciones programadas")
+                recarga = ahora + timedelta(hours=settings.NOTIF_VENTANA_HORAS / 2)
+
+            vencidas = 0
+            while _heap and _heap[0][0] <= ahora:
+                _programadas.discard(heapq.heappop(_heap)[1])
+                vencidas += 1
+            if vencidas:
+                despertar()
+
+            siguiente = min(_heap[0][0], recarga) if _heap else recarga
+            _cambio.clear()
+            try:
+                await asyncio.wait_for(_cambio.wait(), max((siguiente - datetime.utcnow()).total_seconds(), 0))
+            except asyncio.TimeoutError:
+                pass
+    finally:
+        _ventana_hasta = _cambio = None
+        _heap.clear()
+        _programadas.clear()
+
+
+def _registrar_programadas(session, flush_context):
+    # Después del flush ya tienen id; session.new aún las incluye
+    for obj in session.new:
+        if isinstance(obj, Notificacion) and obj.programada_para is not None:
+            session.info.setdefault("notificaciones_programadas", []).append((obj.id, obj.programada_para))
+
+
+def _publicar_programadas(session):
+    for notificacion_id, programada_para in session.info.pop("notificaciones_programadas", ()):
+        programar(notificacion_id, programada_para)
+
+
+def _descartar_programadas(session):
+    session.info.pop("notificaciones_programadas", None)
+
+
+event.listen(Session, "after_flush", _registrar_programadas)
+event.listen(Session, "after_commit", _publicar_programadas)
+event.listen(Session, "after_rollback", _descartar_programadas)
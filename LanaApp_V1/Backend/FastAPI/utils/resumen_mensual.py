@@ -0,0 +1,177 @@
+"""
+Mantenimiento de la tabla resumen_mensual.
+
+Uso como script (desde el directorio del backend):
+    python -m utils.resumen_mensual reconstruir [--usuario ID]
+    python -m utils.resumen_mensual verificar [--usuario ID]
+"""
+import argparse
+import asyncio
+import sys
+from collections import defaultdict
+from datetime import date
+from decimal import Decimal
+from sqlalchemy import select, delete, insert, func, extract
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from DB.conexion import AsyncSessionLocal, async_engine
+from models.modelsDB import ResumenMensual, Transaccion
+from utils.versiones import registrar_cambio
+
+CLAVE = ("usuario_id", "ano", "mes", "categoria_id")
+
+
+async def acumular_resumen(
+    db: AsyncSession,
+    usuario_id: int,
+    categoria_id: int,
+    fecha: date,
+    monto,
+    cantidad: int = 1
+):
+    """
+    Suma `monto` y `cantidad` a la fila del mes (upsert). Para una baja se pasan
+    ambos en negativo. No hace commit: va en la transacción de quien lo llama.
+    """
+    if usuario_id is None or categoria_id is None or fecha is None:
+        return
+
+    stmt = sqlite_insert(ResumenMensual).values(
+        usuario_id=usuario_id,
+        ano=fecha.year,
+        mes=fecha.month,
+        categoria_id=categoria_id,
+        total=monto,
+        cantidad=cantidad
+    )
+    await db.execute(stmt.on_conflict_do_update(
+        index_elements=CLAVE,
+        set_={
+            "total": ResumenMensual.total + stmt.excluded.total,
+            "cantidad": ResumenMensual.cantidad + stmt.excluded.cantidad
+        }
+    ))
+    # Las gráficas leen resumen_mensual: su cache depende de la versión de finanzas
+    registrar_cambio(db, "finanzas", usuario_id)
+
+    if cantidad < 0:
+        # Un mes sin transacciones no deja fila: las gráficas no lo distinguen de uno vacío
+        await db.execute(delete(ResumenMensual).where(
+            ResumenMensual.usuario_id == usuario_id,
+            ResumenMensual.ano == fecha.year,
+            ResumenMensual.mes == fecha.month,
+            ResumenMensual.categoria_id == categoria_id,
+            ResumenMensual.cantidad <= 0
+        ))
+
+
+async def acumular_transacciones(db: AsyncSession, transacciones, signo: int = 1):
+    """
+    acumular_resumen para varias transacciones, con un solo upsert por mes y categoría.
+    """
+    acumulado = defaultdict(lambda: [0, 0])
+    for t in transacciones:
+        if t.fecha is None:
+            continue
+        clave = (t.usuario_id, t.categoria_id, t.fecha.replace(day=1))
+        acumulado[clave][0] += t.monto * signo
+        acumulado[clave][1] += signo
+
+    for (usuario_id, categoria_id, fecha), (monto, cantidad) in acumulado.items():
+        await acumular_resumen(db, usuario_id, categoria_id, fecha, monto, cantidad)
+
+
+def _agregado_transacciones(usuario_id: int = None):
+    ano_col = extract('year', Transaccion.fecha)
+    mes_col = extract('month', Transaccion.fecha)
+    query = select(
+        Transaccion.usuario_id,
+        ano_col.label('ano'),
+        mes_col.label('mes'),
+        Transaccion.categoria_id,
+        func.sum(Transaccion.monto).label('total'),
+        func.count(Transaccion.id).label('cantidad')
+    ).filter(
+        Transaccion.usuario_id.is_not(None),
+        Transaccion.categoria_id.is_not(None),
+        Transaccion.fecha.is_not(None)
+    )
+    if usuario_id is not None:
+        query = query.filter(Transaccion.usuario_id == usuario_id)
+    return query.group_by(Transaccion.usuario_id, ano_col, mes_col, Transaccion.categoria_id)
+
+
+async def reconstruir_resumenes(db: AsyncSession, usuario_id: int = None) -> int:
+    """
+    Recalcula resumen_mensual desde transacciones (todo o un usuario) y hace commit.
+    Devuelve el número de filas escritas.
+    """
+    borrar = delete(ResumenMensual)
+    if usuario_id is not None:
+        borrar = borrar.where(ResumenMensual.usuario_id == usuario_id)
+    await db.execute(borrar)
+
+    resultado = await db.execute(
+        insert(ResumenMensual).from_select(
+            ["usuario_id", "ano", "mes", "categoria_id", "total", "cantidad"],
+            _agregado_transacciones(usuario_id)
+        )
+    )
+    registrar_cambio(db, "finanzas", usuario_id)
+    await db.commit()
+    return resultado.rowcount
+
+
+async def verificar_resumenes(db: AsyncSession, usuario_id: int = None) -> list:
+    """
+    Compara resumen_mensual con el agregado de transacciones.
+    Devuelve las diferencias (lista vacía = consistente).
+    """
+    esperado = {
+        (f.usuario_id, int(f.ano), int(f.mes), f.categoria_id): (Decimal(str(f.total or 0)), f.cantidad)
+        for f in (await db.execute(_agregado_transacciones(usuario_id))).all()
+    }
+
+    query = select(ResumenMensual)
+    if usuario_id is not None:
+        query = query.filter(ResumenMensual.usuario_id == usuario_id)
+    actual = {
+        (r.usuario_id, r.ano, r.mes, r.categoria_id): (Decimal(str(r.total or 0)), r.cantidad)
+        for r in (await db.scalars(query)).all()
+    }
+
+    diferencias = []
+    for clave in sorted(esperado.keys() | actual.keys()):
+        total_esperado, cantidad_esperada = esperado.get(clave, (Decimal(0), 0))
+        total_actual, cantidad_actual = actual.get(clave, (Decimal(0), 0))
+        if cantidad_esperada != cantidad_actual or abs(total_esperado - total_actual) >= Decimal("0.01"):
+            diferencias.append({
+                **dict(zip(CLAVE, clave)),
+                "esperado": {"total": float(total_esperado), "cantidad": cantidad_esperada},
+                "resumen": {"total": float(total_actual), "cantidad": cantidad_actual},
+            })
+    return diferencias
+
+
+async def _main(args) -> int:
+    try:
+        async with AsyncSessionLocal() as db:
+            if args.comando == "reconstruir":
+                filas = await reconstruir_resumenes(db, args.usuario)
+                print(f"resumen_mensual reconstruido: {filas} filas")
+                return 0
+
+            diferencias = await verificar_resumenes(db, args.usuario)
+            for diferencia in diferencias:
+                print(diferencia)
+            print(f"{len(diferencias)} diferencias")
+            return 1 if diferencias else 0
+    finally:
+        await async_engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Mantenimiento de resumen_mensual")
+    parser.add_argument("comando", choices=["reconstruir", "verificar"])
+    parser.add_argument("--usuario", type=int, default=None, help="Solo este usuario")
+    sys.exit(asyncio.run(_main(parser.parse_args())))
@@ -0,0 +1,104 @@
+"""
+Revocación de access tokens sin consultar la base en cada petición.
+
+Los jti revocados se guardan en auth_tokens (tipo "revocado") para que todos los
+workers los conozcan, y en memoria: un filtro de Bloom descarta en O(1) los
+tokens que seguro no están revocados (casi todos) y solo los positivos se
+confirman en el conjunto exacto.
+
+La tarea purgar_periodicamente (arrancada en el lifespan) borra los tokens
+caducados y recarga las revocaciones de otros workers.
+"""
+import asyncio
+import hashlib
+import logging
+from datetime import datetime
+from sqlalchemy import select, delete
+from sqlalchemy.ext.asyncio import AsyncSession
+from config import settings
+from DB.conexion import AsyncSessionLocal
+from models.modelsDB import AuthToken
+
+logger = logging.getLogger("lana.auth")
+
+
+class FiltroBloom:
+    """
+    Pertenencia aproximada: sin falsos negativos, falsos positivos acotados.
+    No admite borrados; se reconstruye al purgar.
+    """
+
+    def __init__(self, bits: int, funciones: int):
+        self.bits = bits
+        self.funciones = funciones
+        self._arreglo = bytearray((bits + 7) // 8)
+
+    def _posiciones(self, valor: str):
+        digest = hashlib.blake2b(valor.encode(), digest_size=8 * self.funciones).digest()
+        for i in range(self.funciones):
+            yield int.from_bytes(digest[i * 8:(i + 1) * 8], "big") % self.bits
+
+    def agregar(self, valor: str):
+        for posicion in self._posiciones(valor):
+            self._arreglo[posicion // 8] |= 1 << (posicion % 8)
+
+    def puede_contener(self, valor: str) -> bool:
+        return all(
+            self._arreglo[posicion // 8] & (1 << (posicion % 8))
+            for posicion in self._posiciones(valor)
+        )
+
+
+_filtro = FiltroBloom(settings.AUTH_BLOOM_BITS, settings.AUTH_BLOOM_FUNCIONES)
+# jti -> expiración del access token revocado
+_revocados = {}
+
+
+def _recordar(jti: str, expira: datetime):
+    _revocados[jti] = expira
+    _filtro.agregar(jti)
+
+
+def esta_revocado(jti: str) -> bool:
+    return _filtro.puede_contener(jti) and jti in _revocados
+
+
+async def revocar_access_token(db: AsyncSession, jti: str, expira: datetime):
+    """
+    Revoca un access token hasta su expiración. Hace commit.
+    """
+    _recordar(jti, expira)
+    db.add(AuthToken(token=jti, tipo="revocado", expires_at=expira))
+    await db.commit()
+
+
+async def purgar_y_recargar():
+    """
+    Borra de auth_tokens los tokens caducados (refresh y revocados) y reconstruye
+    el conjunto de revocados y su filtro con los vigentes.
+    """
+    global _filtro
+    ahora = datetime.utcnow()
+    async with AsyncSessionLocal() as db:
+        borrados = await db.execute(delete(AuthToken).where(AuthToken.expires_at < ahora))
+        await db.commit()
+        vigentes = (await db.execute(select(AuthToken.token, AuthToken.expires_at).filter(
+            AuthToken.tipo == "revocado"
+        ))).all()
+
+    _filtro = FiltroBloom(settings.AUTH_BLOOM_BITS, settings.AUTH_BLOOM_FUNCIONES)
+    _revocados.clear()
+    for jti, expira in vigentes:
+        _recordar(jti, expira)
+
+    if borrados.rowcount:
+        logger.info("auth_tokens: %s tokens caducados eliminados", borrados.rowcount)
+
+
+async def purgar_periodicamente():
+    while True:
+        try:
+            await purgar_y_recargar()
+        except Exception:
+            logger.exception("Error al purgar auth_tokens")
+        await asyncio.sleep(settings.AUTH_PURGA_INTERVALO_S)
@@ -0,0 +1,134 @@
+"""
+Mantenimiento de Cuenta.saldo_actual.
+
+saldo_actual = saldo_inicial + ingresos - gastos de las transacciones de la cuenta
+(el signo lo da Categoria.tipo; sin categoría cuenta como gasto, igual que en las gráficas).
+
+Uso como script (desde el directorio del backend):
+    python -m utils.saldos reconstruir [--usuario ID]
+    python -m utils.saldos verificar [--usuario ID]
+"""
+import argparse
+import asyncio
+import sys
+from collections import defaultdict
+from decimal import Decimal
+from sqlalchemy import select, update, func, case
+from sqlalchemy.ext.asyncio import AsyncSession
+from DB.conexion import AsyncSessionLocal, async_engine
+from models.modelsDB import Cuenta, Categoria, Transaccion
+from utils.versiones import registrar_cambio
+
+
+def _monto_con_signo(monto_col, tipo_col):
+    return case((tipo_col == 'ingreso', monto_col), else_=-monto_col)
+
+
+async def aplicar_movimiento(db: AsyncSession, usuario_id: int, cuenta_id: int, categoria_id: int, monto):
+    """
+    Suma al saldo de la cuenta el monto con el signo de su categoría, en un solo
+    UPDATE (sin leer y reescribir el saldo). Para una baja se pasa el monto en negativo.
+    Solo toca cuentas de usuario_id. No hace commit: va en la transacción de quien lo llama.
+    """
+    if cuenta_id is None or monto is None:
+        return
+
+    signado = select(
+        _monto_con_signo(monto, Categoria.tipo)
+    ).where(Categoria.id == categoria_id).scalar_subquery()
+
+    await db.execute(update(Cuenta).where(
+        Cuenta.id == cuenta_id,
+        Cuenta.usuario_id == usuario_id
+    ).values(
+        saldo_actual=func.coalesce(Cuenta.saldo_actual, 0) + func.coalesce(signado, -monto)
+    ))
+    registrar_cambio(db, "finanzas", usuario_id)
+
+
+async def aplicar_transacciones(db: AsyncSession, transacciones, signo: int = 1):
+    """
+    aplicar_movimiento para varias transacciones, con un UPDATE por cuenta y categoría.
+    """
+    acumulado = defaultdict(int)
+    for t in transacciones:
+        acumulado[(t.usuario_id, t.cuenta_id, t.categoria_id)] += t.monto * signo
+
+    for (usuario_id, cuenta_id, categoria_id), monto in acumulado.items():
+        await aplicar_movimiento(db, usuario_id, cuenta_id, categoria_id, monto)
+
+
+def _saldos_calculados(usuario_id: int = None):
+    movimientos = select(
+        Transaccion.cuenta_id,
+        func.sum(_monto_con_signo(Transaccion.monto, Categoria.tipo)).label('neto')
+    ).outerjoin(
+        Categoria, Transaccion.categoria_id == Categoria.id
+    ).group_by(Transaccion.cuenta_id).subquery()
+
+    query = select(
+        Cuenta.id,
+        Cuenta.saldo_actual,
+        (func.coalesce(Cuenta.saldo_inicial, 0) + func.coalesce(movimientos.c.neto, 0)).label('calculado')
+    ).outerjoin(
+        movimientos, movimientos.c.cuenta_id == Cuenta.id
+    )
+    if usuario_id is not None:
+        query = query.filter(Cuenta.usuario_id == usuario_id)
+    return query
+
+
+async def reconstruir_saldos(db: AsyncSession, usuario_id: int = None) -> int:
+    """
+    Recalcula saldo_actual desde las transacciones (todas las cuentas o las de un usuario)
+    y hace commit. Devuelve el número de cuentas actualizadas.
+    """
+    filas = (await db.execute(_saldos_calculados(usuario_id))).all()
+    if filas:
+        await db.execute(update(Cuenta), [
+            {"id": f.id, "saldo_actual": f.calculado} for f in filas
+        ])
+        registrar_cambio(db, "finanzas", usuario_id)
+    await db.commit()
+    return len(filas)
+
+
+async def verificar_saldos(db: AsyncSession, usuario_id: int = None) -> list:
+    """
+    Cuentas cuyo saldo_actual no coincide con el calculado desde las transacciones.
+    """
+    diferencias = []
+    for f in (await db.execute(_saldos_calculados(usuario_id))).all():
+        actual = Decimal(str(f.saldo_actual or 0))
+        calculado = Decimal(str(f.calculado or 0))
+        if abs(actual - calculado) >= Decimal("0.01"):
+            diferencias.append({
+                "cuenta_id": f.id,
+                "saldo_actual": float(actual),
+                "calculado": float(calculado),
+            })
+    return diferencias
+
+
+async def _main(args) -> int:
+    try:
+        async with AsyncSessionLocal() as db:
+            if args.comando == "reconstruir":
+                cuentas = await reconstruir_saldos(db, args.usuario)
+                print(f"saldo_actual reconstruido en {cuentas} cuentas")
+                return 0
+
+            diferencias = await verificar_saldos(db, args.usuario)
+            for diferencia in diferencias:
+                print(diferencia)
+            print(f"{len(diferencias)} diferencias")
+            return 1 if diferencias else 0
+    finally:
+        await async_engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Mantenimiento de Cuenta.saldo_actual")
+    parser.add_argument("comando", choices=["reconstruir", "verificar"])
+    parser.add_argument("--usuario", type=int, default=None, help="Solo las cuentas de este usuario")
+    sys.exit(asyncio.run(_main(parser.parse_args())))
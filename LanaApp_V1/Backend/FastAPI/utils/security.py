@@ -1,26 +1,24 @@
+import time
+import hashlib
+import secrets
 from datetime import datetime, timedelta
 from jose import jwt
-from passlib.context import CryptContext
 from config import settings
-from models.modelsDB import Usuario
-from sqlalchemy.orm import Session
+from models.modelsDB import Usuario, AuthToken
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select
+from utils.cache import CacheLRU
+from utils import hashing
 
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-
-def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return pwd_context.verify(plain_password, hashed_password)
-
-def get_password_hash(password: str) -> str:
-    return pwd_context.hash(password)
-
 def create_access_token(data: dict, expires_delta: timedelta = None) -> str:
     to_encode = data.copy()
     if expires_delta:
         expire = datetime.utcnow() + expires_delta
     else:
         expire = datetime.utcnow() + timedelta(minutes=15)
-    to_encode.update({"exp": expire})
+    # jti identifica el token para poder revocarlo (utils/revocacion.py)
+    to_encode.update({"exp": expire, "jti": secrets.token_urlsafe(12)})
     encoded_jwt = jwt.encode(to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
     return encoded_jwt
 
@@ -30,12 +28,45 @@ def verify_token(token: str):
         return payload
     except jwt.JWTError:
         return None
+
+# Un token firmado no cambia: basta verificarlo una vez y recordarlo hasta su exp
+_tokens_verificados = CacheLRU(settings.AUTH_CACHE_TOKENS_MAX, settings.ACCESS_TOKEN_EXPIRE_MINUTES * 60)
+
+def verify_token_cached(token: str):
+    payload = _tokens_verificados.obtener(token)
+    if payload is not None:
+        return payload
+    payload = verify_token(token)
+    if payload is not None:
+        restante = payload.get("exp", 0) - time.time()
+        if restante > 0:
+            _tokens_verificados.guardar(token, payload, ttl=restante)
+    return payload
+    
+def hash_refresh_token(refresh_token: str) -> str:
+    # Token aleatorio de 256 bits: basta SHA-256, no hace falta bcrypt
+    return hashlib.sha256(refresh_token.encode()).hexdigest()
+
+async def create_refresh_token(db: AsyncSession, usuario_id: int, familia: str = None) -> str:
+    """
+    Crea un refresh token y guarda su hash en auth_tokens (sin commit).
+    Sin familia (un login) empieza una nueva; al rotar se pasa la del token usado.
+    """
+    refresh_token = secrets.token_urlsafe(32)
+    db.add(AuthToken(
+        usuario_id=usuario_id,
+        token=hash_refresh_token(refresh_token),
+        tipo="refresh",
+        familia=familia or secrets.token_hex(16),
+        expires_at=datetime.utcnow() + timedelta(days=settings.REFRESH_TOKEN_EXPIRE_DAYS)
+    ))
+    return refresh_token
     
-def authenticate_user(db: Session, email: str, password: str):
-    user = db.query(Usuario).filter(Usuario.email == email).first()
+async def authenticate_user(db: AsyncSession, email: str, password: str):
+    user = await db.scalar(select(Usuario).filter(Usuario.email == email))
     if not user:
         return None
-    if not verify_password(password, user.password):
+    if not await hashing.verify_password(password, user.password):
         return None
     return user
 
@@ -0,0 +1,94 @@
+"""
+Versión de los datos por usuario, para invalidar caches y calcular ETags.
+
+Cada tabla pertenece a un dominio. Cuando una sesión hace commit de cambios ORM
+(altas, modificaciones o bajas) en un dominio, su contador en versiones_datos
+sube para el usuario dueño de las filas, dentro de la misma transacción; las
+tablas sin usuario_id (categorias) usan el contador global (usuario_id 0).
+
+Como la versión está en la base, todos los workers ven la misma y un rollback
+la deshace junto con el cambio.
+"""
+from sqlalchemy import event, select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from models.modelsDB import VersionDatos
+
+# tabla -> dominio. Las escrituras en bloque (Core) no pasan por aquí: quien
+# las hace llama a registrar_cambio con el usuario dueño de las filas.
+DOMINIOS = {
+    "transacciones": "finanzas",
+    "cuentas": "finanzas",
+    "pagos_programados": "finanzas",
+    "categorias": "categorias",
+    "presupuestos": "presupuestos",
+    "notificaciones": "notificaciones",
+}
+
+# Contador de todo el dominio (datos globales o cambios de todos los usuarios)
+GLOBAL = 0
+
+
+async def version_datos(db: AsyncSession, usuario_id: int, *dominios: str) -> tuple:
+    """
+    Versión actual de los dominios para el usuario (una consulta por clave primaria):
+    cambia con cada commit que los toque.
+    """
+    filas = (await db.execute(select(
+        VersionDatos.dominio, VersionDatos.usuario_id, VersionDatos.version
+    ).filter(
+        VersionDatos.dominio.in_(dominios),
+        VersionDatos.usuario_id.in_((usuario_id, GLOBAL))
+    ))).all()
+    versiones = {(f.dominio, f.usuario_id): f.version for f in filas}
+    return tuple(
+        (versiones.get((dominio, GLOBAL), 0), versiones.get((dominio, usuario_id), 0))
+        for dominio in dominios
+    )
+
+
+def registrar_cambio(session, dominio: str, usuario_id: int = None):
+    """
+    Para escrituras en bloque (Core): la versión sube con el commit de la sesión,
+    igual que con los cambios ORM. Sin usuario_id sube la de todos los usuarios.
+    """
+    session.info.setdefault("versiones_pendientes", set()).add(
+        (dominio, GLOBAL if usuario_id is None else usuario_id)
+    )
+
+
+def _registrar_cambios(session, flush_context, instances):
+    pendientes = session.info.setdefault("versiones_pendientes", set())
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        dominio = DOMINIOS.get(getattr(obj, "__tablename__", None))
+        if dominio:
+            usuario_id = getattr(obj, "usuario_id", None)
+            pendientes.add((dominio, GLOBAL if usuario_id is None else usuario_id))
+
+
+def _guardar_cambios(session):
+    # Antes del commit, en su misma transacción. El flush final del commit llega
+    # después de este evento, así que se adelanta para registrar sus cambios.
+    session.flush()
+    pendientes = session.info.pop("versiones_pendientes", None)
+    if not pendientes:
+        return
+    insercion = sqlite_insert(VersionDatos).values([
+        {"dominio": dominio, "usuario_id": usuario_id, "version": 1}
+        for dominio, usuario_id in sorted(pendientes)
+    ])
+    session.execute(insercion.on_conflict_do_update(
+        index_elements=[VersionDatos.dominio, VersionDatos.usuario_id],
+        set_={"version": VersionDatos.version + 1}
+    ))
+
+
+def _descartar_cambios(session):
+    session.info.pop("versiones_pendientes", None)
+
+
+# AsyncSession delega en Session, así que basta con escuchar la clase base
+event.listen(Session, "before_flush", _registrar_cambios)
+event.listen(Session, "before_commit", _guardar_cambios)
+event.listen(Session, "after_rollback", _descartar_cambios)